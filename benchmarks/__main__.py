@@ -0,0 +1,47 @@
+import argparse
+import json
+import sys
+
+from benchmarks import suite
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=suite.__doc__.splitlines()[0]
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="results of a previous --output")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="slowdown accepted before failing, 0.25 is 25%% (default)",
+    )
+    parser.add_argument(
+        "--only", nargs="*", help="run the cases whose name contains any word"
+    )
+    args = parser.parse_args()
+
+    benchmarks = suite.Suite()
+    try:
+        results = benchmarks.run(args.only)
+    finally:
+        benchmarks.close()
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(suite.document(results), output, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            before = json.load(baseline)["results"]
+        regressions = suite.compare(results, before, args.tolerance)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old * 1e6:.1f} -> {new * 1e6:.1f} us/op")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import timeit
+
+from rsa import encrypt, generate_key
+
+secret_key = generate_key("benchmark")
+
+private_key = secret_key.exportKey("PEM")
+public_key = secret_key.publickey().exportKey("PEM")
+
+
+def measure(fn, number=50, repeat=5):
+    """Best-of-`repeat` seconds per call of `fn`."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def encrypted_chunk(plaintext="benchmark/secret"):
+    return encrypt(plaintext, public_key).decode("ascii")
+
+
+def report(name, seconds):
+    print(f"{name:<40} {seconds * 1e6:>12.1f} us/op")
@@ -0,0 +1,40 @@
+"""Chunk decryption cost: PEM parsed per chunk vs parsed once, and serial vs
+process pool decryption of a large `/pass list` payload.
+
+    poetry run python -m benchmarks.decrypt
+"""
+
+from rsa import decrypt
+
+from benchmarks.common import encrypted_chunk, measure, private_key, report
+from crypto import Decryptor
+
+
+def main():
+    chunk = encrypted_chunk()
+    serial = Decryptor(private_key, workers=0)
+
+    before = measure(lambda: decrypt(chunk, private_key))
+    after = measure(lambda: serial.decrypt(chunk))
+
+    report("rsa.decrypt (PEM parsed per chunk)", before)
+    report("Decryptor.decrypt (parsed once)", after)
+    print(f"speedup: {before / after:.2f}x")
+
+    payload = chunk * 128
+    parallel = Decryptor(private_key, workers=4, threshold=0)
+    parallel.decrypt_chunks(payload)  # warm up the pool
+
+    report(
+        "decrypt_chunks 128 chunks (serial)",
+        measure(lambda: serial.decrypt_chunks(payload), number=5),
+    )
+    report(
+        "decrypt_chunks 128 chunks (4 workers)",
+        measure(lambda: parallel.decrypt_chunks(payload), number=5),
+    )
+    parallel.shutdown()
+
+
+if __name__ == "__main__":
+    main()
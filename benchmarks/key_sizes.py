@@ -0,0 +1,45 @@
+"""Decrypt throughput per supported key size.
+
+    poetry run python -m benchmarks.key_sizes [--derive]
+
+Keys are random unless --derive is given, in which case the deterministic
+BIP39 derivation used by the server is timed as well (slow for 4096 bits).
+"""
+
+import sys
+import time
+
+from Crypto.PublicKey import RSA
+from rsa import encrypt
+
+from benchmarks.common import measure
+from crypto import Decryptor
+from keys import KEY_SIZES, generate_key
+
+OAEP_OVERHEAD = 42  # 2 * SHA-1 digest size + 2
+
+
+def main(derive=False):
+    print(
+        f"{'bits':>6} {'derive s':>9} {'chunk':>6} {'us/chunk':>10} "
+        f"{'plaintext KB/s':>15}"
+    )
+    for bits in KEY_SIZES:
+        start = time.perf_counter()
+        key = generate_key("benchmark", bits) if derive else RSA.generate(bits)
+        derive_time = time.perf_counter() - start
+
+        decryptor = Decryptor(key.export_key("PEM"), workers=0)
+        plaintext = "x" * (key.size_in_bytes() - OAEP_OVERHEAD)
+        chunk = encrypt(plaintext, key.publickey().export_key("PEM"))
+
+        seconds = measure(lambda: decryptor.decrypt(chunk), number=20)
+        throughput = len(plaintext) / seconds / 1024
+        print(
+            f"{bits:>6} {derive_time if derive else float('nan'):>9.2f} "
+            f"{decryptor.chunk_size:>6} {seconds * 1e6:>10.1f} {throughput:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(derive="--derive" in sys.argv)
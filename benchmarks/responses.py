@@ -0,0 +1,56 @@
+"""Slack response rendering: jsonify of the full payload (previous
+behaviour) vs the pre-serialized templates, for every response type.
+
+    poetry run python -m benchmarks.responses
+"""
+
+from flask import Flask, jsonify
+
+import slack_command
+import utils
+from benchmarks.common import measure, report
+
+DIR_LS = "\n".join(f"├─ app{i}" for i in range(50))
+CASES = {
+    "help": (slack_command.HELP, {}),
+    "already configured": (
+        slack_command.ALREADY_CONFIGURED,
+        {"url": "https://pass.example.com"},
+    ),
+    "configure menu": (
+        slack_command.CONFIGURE_MENU,
+        {"msg": "What type of server do you want to use?", "color": "good"},
+    ),
+    "list": (
+        slack_command.PASSWORD_STORE,
+        {"dir_ls": DIR_LS, "text": f"Password Store\n{DIR_LS}"},
+    ),
+    "insert": (
+        slack_command.INSERT_EDITOR,
+        {"msg": "Adding password for *app*", "url": "https://x.co/insert/ABC123"},
+    ),
+    "show": (
+        slack_command.SECRET_LINK,
+        {"fallback": "Password: link", "text": "Password for *app*", "url": "link"},
+    ),
+    "warning": (utils._COLORED_MSG, {"msg": "*app* is not here", "color": "warning"}),
+}
+
+
+def payload(template, values):
+    """Rebuilds the plain dict the template was made from."""
+    return template.render(**values).get_json()
+
+
+def main():
+    with Flask(__name__).app_context():
+        for name, (template, values) in CASES.items():
+            data = payload(template, values)
+            before = measure(lambda: jsonify(data), number=2000)
+            after = measure(lambda: template.render(**values), number=2000)
+            report(f"{name} (jsonify)", before)
+            report(f"{name} (template)", after)
+
+
+if __name__ == "__main__":
+    main()
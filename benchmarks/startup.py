@@ -0,0 +1,33 @@
+"""Worker startup cost of obtaining the server key: deterministic
+derivation from the BIP39 phrase vs loading the protected key file.
+
+    poetry run python -m benchmarks.startup
+"""
+
+import os
+import tempfile
+import time
+
+from keys import KEY_SIZES, load_key
+
+SEED = "bip39 recovery phrase used for the startup benchmark only"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'bits':>6} {'derive s':>10} {'key file s':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for bits in KEY_SIZES:
+            path = os.path.join(directory, f"{bits}.pem")
+            derive = timed(lambda: load_key(SEED, bits, path))  # stores the file
+            cached = timed(lambda: load_key(SEED, bits, path))
+            print(f"{bits:>6} {derive:>10.3f} {cached:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Hot paths of the proxy measured end to end and offline: SQLite in
+memory, the in-memory cache backend and the password server emulator on a
+local port.
+
+    poetry run python -m benchmarks [--output results.json]
+        [--baseline baseline.json] [--tolerance 0.25] [--only list]
+
+Every result is the best-of-5 seconds per operation. With --baseline the
+results are compared with a previous --output and the run fails when any
+case is slower than the tolerance allows.
+"""
+
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+
+from benchmarks.common import measure, report
+
+ENVIRONMENT = {
+    "BIP39": "benchmark suite seed, never used for real secrets",
+    "CACHE_BACKEND": "memory",
+    "DATABASE_URL": "sqlite://",
+    "KEY_FILE": os.path.join(tempfile.gettempdir(), "slashpass-benchmark.pem"),
+    "SIGNING_SECRET": "benchmark-signing-secret",
+    "SLACK_SERVER": "http://localhost:5000",
+}
+LIST_SIZES = (10, 100, 1000)
+TEAM_ID = "TBENCHMARK"
+CHANNEL = "C00000001"  # the channel with 100 secrets
+VERBS = {
+    "help": "help",
+    "configure": "configure",
+    "list": "list",
+    "show": "show secret1",
+    "insert": "insert new-secret",
+    "remove": "remove missing-secret",
+}
+
+
+def offline():
+    """Configures the application for the suite, it must run before the
+    first import of the application modules. Values set in the shell are
+    overridden, the suite creates tables and a team in its database."""
+    if "server" in sys.modules:
+        raise RuntimeError("The application was imported before offline()")
+    for key, value in ENVIRONMENT.items():
+        os.environ[key] = value
+
+
+def start_emulator(public_key):
+    from werkzeug.serving import make_server
+
+    from emulator import create_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = create_app(proxy_key=public_key)
+    for channel, size in enumerate(LIST_SIZES):
+        for i in range(size):
+            app.store.secrets[f"C{channel:08d}/secret{i}"] = "s" * 32
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Suite(object):
+    def cases(self):
+        """Name and function of every measured operation."""
+        cmd = self.server.cmd
+        team = self.team
+
+        for channel, size in enumerate(LIST_SIZES):
+            yield f"list {size} secrets", lambda c=f"C{channel:08d}": cmd.list(team, c)
+        yield "show", lambda: cmd.show(team, "C00000000", "secret1")
+        yield "generate_insert_token", lambda: cmd.generate_insert_token(
+            team, "C00000000", "new-secret"
+        )
+        token = cmd.generate_insert_token(team, "C00000000", "new-secret")
+        yield "insert redirect", lambda: self.client.get(f"/insert/{token}")
+        # signed here, the timestamp has to be recent when it is measured
+        _, body, headers = self.signed(self.entry("help"), self.secret)
+        yield "valid_slack_request", lambda: self.verify_signature(body, headers)
+        yield "team lookup", lambda: self.teams.get(team_id=TEAM_ID)
+        for verb, text in VERBS.items():
+            yield f"slack_command {verb}", lambda text=text: self.command(text)
+
+    def entry(self, text):
+        return {
+            "kind": "command",
+            "verb": text.split()[0],
+            "text": text,
+            "team_id": TEAM_ID,
+            "team_domain": "benchmark",
+            "channel_id": CHANNEL,
+        }
+
+    def command(self, text):
+        path, body, headers = self.signed(self.entry(text), self.secret)
+        response = self.client.post(path, data=body, headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    def verify_signature(self, body, headers):
+        with self.server.server.test_request_context(
+            "/slack/command",
+            method="POST",
+            data=body,
+            headers=headers,
+            content_type="application/x-www-form-urlencoded",
+        ) as context:
+            assert self.valid_slack_request(context.request)
+
+    def run(self, only=None):
+        results = {}
+        for name, fn in self.cases():
+            if only and not any(word in name for word in only):
+                continue
+            fn()  # warm up connections and caches
+            results[name] = measure(fn, number=20)
+            report(name, results[name])
+        return results
+
+    def close(self):
+        self.context.pop()
+        self.emulator.shutdown()
+
+    def __init__(self):
+        offline()
+
+        import routes
+        import server
+        from loadgen import signed
+        from team_cache import teams
+        from utils import valid_slack_request
+
+        self.server = server
+        self.teams = teams
+        self.signed = signed
+        self.valid_slack_request = valid_slack_request
+        self.secret = os.environ["SIGNING_SECRET"]
+        self.emulator = start_emulator(server.public_key)
+        self.client = routes.server.test_client()
+        self.context = server.server.app_context()
+        self.context.push()
+
+        server.db.create_all()
+        team = server.Team(
+            "token", "U1", "B1", None, None, False, "commands", TEAM_ID, "benchmark"
+        )
+        team.url = f"http://127.0.0.1:{self.emulator.server_port}"
+        server.db.session.add(team)
+        server.db.session.commit()
+        self.team = teams.get(team_id=TEAM_ID)
+
+
+def compare(results, baseline, tolerance):
+    """Cases slower than `baseline` by more than `tolerance`, as
+    `(name, before, after)`."""
+    return [
+        (name, baseline[name], seconds)
+        for name, seconds in sorted(results.items())
+        if name in baseline and seconds > baseline[name] * (1 + tolerance)
+    ]
+
+
+def document(results):
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
@@ -0,0 +1,340 @@
+import abc
+import heapq
+import logging
+import threading
+import time
+
+import redis
+from redis.backoff import ExponentialBackoff
+from redis.cluster import ClusterNode, RedisCluster
+from redis.retry import Retry
+from redis.sentinel import Sentinel
+
+from environ import (
+    CACHE_BACKEND,
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_HOST,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_MODE,
+    REDIS_NODES,
+    REDIS_PORT,
+    REDIS_RETRIES,
+    REDIS_SENTINEL_SERVICE,
+    REDIS_SOCKET,
+    REDIS_TIMEOUT,
+)
+from metrics import redis as latency
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# KEYS: key, guard  ARGV: value, expected guard value, time to live or ''
+SET_IF = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[2] then
+    return 0
+end
+if ARGV[3] == '' then
+    redis.call('SET', KEYS[1], ARGV[1])
+else
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+end
+return 1
+"""
+
+
+class CacheBackend(abc.ABC):
+    """Key/value operations used by the server, values are bytes and `ex`
+    is a time to live in seconds."""
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Value of `key`, None when it is missing or expired."""
+
+    @abc.abstractmethod
+    def set(self, key, value, ex=None, nx=False):
+        """Returns True when the value was stored."""
+
+    @abc.abstractmethod
+    def set_if(self, key, value, guard, expected, ex=None):
+        """Stores the value only while the `guard` key holds `expected`, a
+        missing guard holds "". The check and the write are atomic, both
+        keys must share a Redis Cluster hash tag."""
+
+    @abc.abstractmethod
+    def set_many(self, items, ex=None, nx=False):
+        """Stores every `(key, value)` pair, returns whether each one was
+        stored."""
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """Removes `key`, missing keys are ignored."""
+
+    @abc.abstractmethod
+    def publish(self, channel, message):
+        """Delivers `message` to the current subscribers of `channel`."""
+
+    @abc.abstractmethod
+    def subscribe(self, channel, callback, on_error=None):
+        """Calls `callback(message)` for every message published on
+        `channel` from now on, `on_error()` when messages may have been
+        lost."""
+
+    @abc.abstractmethod
+    def stats(self):
+        """`hits`, `misses` and `expired` key counts, a count is None when
+        the backend can not tell."""
+
+
+class RedisBackend(CacheBackend):
+    def get(self, key):
+        with latency.labels("get").time(), span("redis.get"):
+            value = self.redis.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ex=None, nx=False):
+        with latency.labels("set").time(), span("redis.set"):
+            return bool(self.redis.set(key, value, ex=ex, nx=nx))
+
+    def set_if(self, key, value, guard, expected, ex=None):
+        with latency.labels("set_if").time(), span("redis.set_if"):
+            stored = self._set_if(keys=[key, guard], args=[value, expected, ex or ""])
+        return bool(stored)
+
+    def set_many(self, items, ex=None, nx=False):
+        pipe = self.redis.pipeline(transaction=False)
+        for key, value in items:
+            pipe.set(key, value, ex=ex, nx=nx)
+        with latency.labels("set_many").time(), span("redis.set_many"):
+            return [bool(stored) for stored in pipe.execute()]
+
+    def delete(self, key):
+        with latency.labels("delete").time(), span("redis.delete"):
+            self.redis.delete(key)
+
+    def publish(self, channel, message):
+        with latency.labels("publish").time(), span("redis.publish"):
+            self.redis.publish(channel, message)
+
+    def subscribe(self, channel, callback, on_error=None):
+        thread = threading.Thread(
+            target=self._listen, args=(channel, callback, on_error), daemon=True
+        )
+        thread.start()
+
+    def stats(self):
+        with self._lock:
+            stats = {"hits": self.hits, "misses": self.misses, "expired": None}
+        stats["connections"] = self.connections()
+        try:
+            info = self.redis.info("stats")
+        except redis.exceptions.RedisError:
+            return stats
+        if isinstance(self.redis, RedisCluster):
+            # one INFO reply per primary node
+            stats["expired"] = sum(node["expired_keys"] for node in info.values())
+        else:
+            stats["expired"] = info["expired_keys"]
+        return stats
+
+    def connections(self):
+        """Connection pool usage summed over every node, `saturation` close
+        to 1 means requests are about to fail with "Too many connections"."""
+        totals = {"max": 0, "created": 0, "in_use": 0, "available": 0}
+        for pool in self._pools():
+            totals["max"] += pool.max_connections
+            usage = _usage(pool)
+            if usage is None:
+                return dict(
+                    totals, created=None, in_use=None, available=None, saturation=None
+                )
+            totals["created"] += usage[0]
+            totals["in_use"] += usage[1]
+            totals["available"] += usage[2]
+        totals["saturation"] = (
+            totals["in_use"] / totals["max"] if totals["max"] else 0.0
+        )
+        return totals
+
+    def _pools(self):
+        if isinstance(self.redis, RedisCluster):
+            return [
+                node.redis_connection.connection_pool
+                for node in self.redis.get_nodes()
+                if node.redis_connection is not None
+            ]
+        return [self.redis.connection_pool]
+
+    def _listen(self, channel, callback, on_error):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                while True:
+                    # polling keeps idle subscriptions clear of socket timeouts
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        callback(message["data"])
+            except Exception:
+                logger.exception(f"Subscription to {channel} failed")
+                if on_error is not None:
+                    on_error()
+                time.sleep(1)
+
+    def __init__(self, client):
+        self.redis = client
+        self._set_if = client.register_script(SET_IF)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+
+def _usage(pool):
+    """Created, in use and available connections of a redis-py pool. They
+    are only kept in private attributes, None when a release renames them."""
+    created = getattr(pool, "_created_connections", None)
+    in_use = getattr(pool, "_in_use_connections", None)
+    available = getattr(pool, "_available_connections", None)
+    if created is None or in_use is None or available is None:
+        return None
+    return created, len(in_use), len(available)
+
+
+class MemoryBackend(CacheBackend):
+    """In-process cache for single node deployments and benchmarks, expired
+    keys are purged from a heap ordered by expiry time."""
+
+    def get(self, key):
+        with self._lock:
+            self._expire()
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            self._expire()
+            if nx and key in self._data:
+                return False
+            self._store(key, value, ex)
+            return True
+
+    def set_if(self, key, value, guard, expected, ex=None):
+        with self._lock:
+            self._expire()
+            current = self._data.get(guard, (b"", None))[0]
+            if current != _encode(expected):
+                return False
+            self._store(key, value, ex)
+            return True
+
+    def set_many(self, items, ex=None, nx=False):
+        return [self.set(key, value, ex=ex, nx=nx) for key, value in items]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def publish(self, channel, message):
+        for callback in list(self._subscribers.get(channel, ())):
+            callback(message)
+
+    def subscribe(self, channel, callback, on_error=None):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def stats(self):
+        with self._lock:
+            self._expire()
+            return {"hits": self.hits, "misses": self.misses, "expired": self.expired}
+
+    def _store(self, key, value, ex):
+        expires = time.monotonic() + ex if ex else None
+        self._data[key] = (_encode(value), expires)
+        if expires is not None:
+            heapq.heappush(self._expiry, (expires, key))
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, key = heapq.heappop(self._expiry)
+            entry = self._data.get(key)
+            # the key may have been overwritten or deleted since
+            if entry is not None and entry[1] == expires:
+                del self._data[key]
+                self.expired += 1
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._data = {}
+        self._expiry = []
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+
+def _encode(value):
+    # what redis-py sends for the value
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+def nodes(value):
+    """Parses a comma separated `host:port` list."""
+    for node in filter(None, (node.strip() for node in value.split(","))):
+        host, _, port = node.rpartition(":")
+        yield host, int(port)
+
+
+def redis_client(
+    mode=REDIS_MODE,
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    socket=REDIS_SOCKET,
+    startup_nodes=REDIS_NODES,
+    service=REDIS_SENTINEL_SERVICE,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+    retries=REDIS_RETRIES,
+    timeout=REDIS_TIMEOUT,
+):
+    options = {
+        "max_connections": max_connections,
+        "health_check_interval": health_check_interval,
+        "socket_timeout": timeout,
+        "socket_connect_timeout": timeout,
+        "retry": Retry(ExponentialBackoff(cap=1, base=0.05), retries),
+    }
+    if mode == "standalone":
+        if socket:
+            return redis.StrictRedis(unix_socket_path=socket, **options)
+        return redis.StrictRedis(host=host, port=port, **options)
+    if mode == "sentinel":
+        sentinel = Sentinel(
+            list(nodes(startup_nodes)),
+            socket_timeout=timeout,
+            sentinel_kwargs={"socket_timeout": timeout},
+        )
+        return sentinel.master_for(service, **options)
+    if mode == "cluster":
+        return RedisCluster(
+            startup_nodes=[ClusterNode(*node) for node in nodes(startup_nodes)],
+            **options,
+        )
+    raise ValueError(f"Unknown redis mode {mode}, use standalone, sentinel or cluster")
+
+
+def create_cache(backend=CACHE_BACKEND, **options):
+    if backend == "memory":
+        return MemoryBackend()
+    if backend == "redis":
+        return RedisBackend(redis_client(**options))
+    raise ValueError(f"Unknown cache backend {backend}, use redis or memory")
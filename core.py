@@ -1,9 +1,20 @@
-import pickle
-import random
-import string
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import requests
-from rsa import decrypt
+
+from crypto import Decryptor, SecretBox
+from environ import (
+    BATCH_CONCURRENCY,
+    LIST_CACHE_STALE,
+    LIST_CACHE_TTL,
+    LIST_COALESCING,
+    LIST_STREAMING,
+)
+from listing_cache import ListingCache
+from singleflight import FlightTimeout, SingleFlight
+from tokens import TokenStore
+from tracing import span, traced
+from upstream import client
 
 ERRMSG = "Communication problem with the remote server"
 
@@ -14,79 +25,188 @@ class SlashpassError(Exception):
 
 
 class SlashpassCMD(object):
+    @traced("cmd.list")
     def list(self, team, channel):
+        url = team.api(f"list/{channel}")
+        if self.listings is None:
+            msg = self._load_list(team.id, channel, url)
+        else:
+            msg = self._cached_list(team.id, channel, url)
+
+        if msg == b"":
+            return ""
+
+        with span("list.format"):
+            item_list = msg.decode("utf-8")
+            n = item_list.count(channel)
+            # formatting response
+            return item_list.replace(f"{channel}/", "├─ ", n - 1).replace(
+                f"{channel}/", "└─ "
+            )
+
+    def _cached_list(self, team_id, channel, url):
+        cached = self.listings.get(team_id, channel)
+        if cached is None:
+            generation = self.listings.generation(team_id, channel)
+            msg = self._load_list(team_id, channel, url, generation)
+            self.listings.set(team_id, channel, msg, generation)
+            return msg
+
+        msg, fresh = cached
+        if not fresh and self.listings.claim(team_id, channel):
+            # stale while revalidate, the url is resolved here so the
+            # refresh never touches the team outside of the request
+            self.pool.submit(self._refresh_list, team_id, channel, url)
+        return msg
+
+    def _refresh_list(self, team_id, channel, url):
         try:
-            response = requests.post(team.api(f"list/{channel}"))
-        except requests.exceptions.ConnectionError as e:
+            generation = self.listings.generation(team_id, channel)
+            msg = self._load_list(team_id, channel, url, generation)
+            self.listings.set(team_id, channel, msg, generation)
+        except SlashpassError:
+            pass
+        finally:
+            self.listings.release(team_id, channel)
+
+    def _load_list(self, team_id, channel, url, generation=None):
+        if self.flights is None:
+            return self._fetch_list(team_id, url)
+        # concurrent lists of a channel share one upstream call, show is
+        # never coalesced because every onetime link is for one user. A
+        # flight started before an invalidation is not joined after it.
+        key = f"list:{team_id}:{channel}"
+        if generation:
+            key = f"{key}:{generation}"
+        try:
+            return self.flights.do(key, lambda: self._fetch_list(team_id, url))
+        except FlightTimeout as e:
             raise SlashpassError(f"Timeout: {ERRMSG}") from e
-        size = 344  # assuming 2048 bits key
 
-        msg = b""
-        for i in range(0, len(response.text), size):
-            partial_msg = decrypt(response.text[i : i + size], self.private_key)
-            if partial_msg is None:
-                raise SlashpassError("Decryption error")
-            msg += partial_msg
+    def _fetch_list(self, team_id, url):
+        try:
+            if self.streaming:
+                msg = self._stream_list(team_id, url)
+            else:
+                msg = self.decryptor.decrypt_chunks(self._post(team_id, url).text)
+        except requests.exceptions.RequestException as e:
+            raise SlashpassError(f"Timeout: {ERRMSG}") from e
 
-        if msg == b"":
-            return ""
+        if msg is None:
+            raise SlashpassError("Decryption error")
+        return msg
 
-        item_list = msg.decode("utf-8")
-        n = item_list.count(channel)
-        # formatting response
-        return item_list.replace(f"{channel}/", "├─ ", n - 1).replace(
-            f"{channel}/", "└─ "
-        )
+    def _stream_list(self, team_id, url):
+        # decrypts every key sized block while the rest of the body is
+        # still in transit, the full ciphertext is never held in memory
+        with client.stream("post", url, team_id=team_id) as blocks:
+            return self.decryptor.decrypt_stream(blocks)
 
-    def generate_insert_token(self, team, channel, app):
-        token = "".join(
-            random.SystemRandom().choice(string.ascii_uppercase + string.digits)
-            for _ in range(6)
-        )
+    def _post(self, team_id, url, **kwargs):
+        try:
+            return client.post(url, team_id=team_id, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise SlashpassError(f"Timeout: {ERRMSG}") from e
 
-        self.cache.set(
-            token,
-            pickle.dumps(
-                {
-                    "path": f"{channel}/{app}",
-                    "team_id": team.id,
-                    "url": team.api("insert"),
-                }
-            ),
-            900,
-        )  # expires in 15 minutes
+    def generate_insert_token(self, team, channel, app):
+        return self.tokens.create(team, channel, app)
 
-        return token
+    def generate_insert_tokens(self, team, channel, apps):
+        return self.tokens.create_many(team, channel, apps)
 
+    @traced("cmd.insert")
     def insert(self, token, secret):
-        obj = pickle.loads(self.cache[token])
-        path = obj["path"]
-        url = obj["url"]
-        response = requests.post(url, data={"path": path, "secret": secret})
+        obj = self.tokens.get(token)
+        if obj is None:
+            raise SlashpassError("Invalid or expired token")
+
+        response = self._post(
+            obj.team_id, obj.url, data={"path": obj.path, "secret": secret}
+        )
 
         if response.status_code != requests.codes.ok:
             raise SlashpassError(f"Error {response.status_code}: {ERRMSG}")
 
-        self.cache.delete(token)
+        self.tokens.delete(token)
+        if self.listings is not None:
+            self.listings.invalidate(obj.team_id, obj.path.split("/", 1)[0])
 
+    @traced("cmd.remove")
     def remove(self, team, channel, app):
-        response = requests.post(
-            team.api("remove"), data={"channel": channel, "app": app}
+        response = self._post(
+            team.id, team.api("remove"), data={"channel": channel, "app": app}
         )
-        return response.status_code == requests.codes.ok
+        removed = response.status_code == requests.codes.ok
+        if removed and self.listings is not None:
+            self.listings.invalidate(team.id, channel)
+        return removed
 
+    @traced("cmd.show")
     def show(self, team, channel, app):
-        response = requests.post(
-            team.api("onetime_link"), data={"secret": f"{channel}/{app}"}
+        response = self._post(
+            team.id, team.api("onetime_link"), data={"secret": f"{channel}/{app}"}
         )
 
         if response.status_code == requests.codes.ok:
-            return decrypt(response.text, self.private_key).decode("utf-8")
+            return self.decryptor.decrypt(response.text).decode("utf-8")
         elif response.status_code == requests.codes.not_found:
             return None
 
         raise SlashpassError("Unexpected error")
 
-    def __init__(self, cache, private_key):
+    def remove_many(self, team, channel, apps):
+        return self._fan_out(self.remove, team, channel, apps)
+
+    def show_many(self, team, channel, apps):
+        return self._fan_out(self.show, team, channel, apps)
+
+    def _fan_out(self, fn, team, channel, apps):
+        """Calls `fn` for every app concurrently, a SlashpassError takes the
+        place of the result of the calls that fail or are still pending
+        after `batch_timeout` seconds."""
+
+        def call(app):
+            try:
+                return fn(team, channel, app)
+            except SlashpassError as e:
+                return e
+
+        futures = [self.pool.submit(call, app) for app in apps]
+        done, pending = wait(futures, timeout=self.batch_timeout)
+        for future in pending:
+            # the running ones end with their own upstream deadline
+            future.cancel()
+        return [
+            future.result() if future in done else SlashpassError(f"Timeout: {ERRMSG}")
+            for future in futures
+        ]
+
+    def __init__(
+        self,
+        cache,
+        private_key,
+        streaming=LIST_STREAMING,
+        concurrency=BATCH_CONCURRENCY,
+        coalescing=LIST_COALESCING,
+        listing_ttl=LIST_CACHE_TTL,
+        listing_stale=LIST_CACHE_STALE,
+    ):
         self.cache = cache
-        self.private_key = private_key
+        self.tokens = TokenStore(cache)
+        self.decryptor = Decryptor(private_key)
+        self.box = SecretBox(self.decryptor.private_key)
+        self.streaming = streaming
+        self.pool = ThreadPoolExecutor(
+            concurrency, thread_name_prefix="slashpass-batch"
+        )
+        # a whole batch answers within one upstream deadline, however many
+        # secrets wait for a thread
+        self.batch_timeout = client.timeout
+        self.flights = None
+        if coalescing:
+            # followers give up with the leader's upstream deadline and time
+            # out rather than calling the server again while it decrypts
+            self.flights = SingleFlight(cache, self.box, timeout=client.timeout)
+        self.listings = None
+        if listing_ttl:
+            self.listings = ListingCache(cache, self.box, listing_ttl, listing_stale)
@@ -0,0 +1,147 @@
+import base64
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from Crypto.Cipher import AES, PKCS1_OAEP
+from Crypto.Hash import HMAC, SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
+
+import metrics
+from environ import DECRYPT_PARALLEL_THRESHOLD, DECRYPT_WORKERS
+from keys import chunk_size
+from tracing import span
+
+_worker_cipher = None
+
+
+def _decrypt(cipher, encrypted_message):
+    try:
+        return cipher.decrypt(base64.b64decode(encrypted_message))
+    except ValueError:
+        return None
+
+
+def _init_worker(private_key):
+    global _worker_cipher
+    _worker_cipher = PKCS1_OAEP.new(RSA.importKey(private_key))
+
+
+def _decrypt_batch(chunks):
+    parts = []
+    for chunk in chunks:
+        part = _decrypt(_worker_cipher, chunk)
+        if part is None:
+            return None
+        parts.append(part)
+    return b"".join(parts)
+
+
+class Decryptor(object):
+    def decrypt(self, encrypted_message):
+        with metrics.decrypt.labels("block").time(), span("decrypt.block"):
+            return _decrypt(self.cipher, encrypted_message)
+
+    def decrypt_chunks(self, text):
+        """Decrypts a concatenation of fixed size ciphertext chunks, returns
+        None if any of them fails."""
+        size = self.chunk_size
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+
+        with metrics.decrypt.labels("chunks").time(), span("decrypt"):
+            if self.workers > 1 and len(text) >= self.threshold:
+                step = -(-len(chunks) // self.workers)
+                batches = [chunks[i : i + step] for i in range(0, len(chunks), step)]
+                parts = list(self.pool().map(_decrypt_batch, batches))
+            else:
+                parts = [self.decrypt(chunk) for chunk in chunks]
+
+        if None in parts:
+            return None
+        return b"".join(parts)
+
+    def decrypt_stream(self, blocks):
+        """Like `decrypt_chunks` but consumes an iterable of ciphertext
+        blocks, decrypting every chunk as soon as it is complete."""
+        size = self.chunk_size
+        parts = []
+        buffer = b""
+        for block in blocks:
+            buffer += block
+            offset = 0
+            while len(buffer) - offset >= size:
+                part = self.decrypt(buffer[offset : offset + size])
+                if part is None:
+                    return None
+                parts.append(part)
+                offset += size
+            buffer = buffer[offset:]
+
+        if buffer:
+            part = self.decrypt(buffer)
+            if part is None:
+                return None
+            parts.append(part)
+        return b"".join(parts)
+
+    def pool(self):
+        # created on first use so every gunicorn worker owns its own pool
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=_init_worker,
+                initargs=(self.private_key.export_key("PEM"),),
+            )
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown()
+        self._pool = None
+
+    def __init__(
+        self,
+        private_key,
+        workers=DECRYPT_WORKERS,
+        threshold=DECRYPT_PARALLEL_THRESHOLD,
+    ):
+        # the key is parsed once, the RsaKey object keeps the CRT
+        # components (dp, dq, u) precomputed for every decryption
+        self.private_key = RSA.importKey(private_key)
+        self.cipher = PKCS1_OAEP.new(self.private_key)
+        self.chunk_size = chunk_size(self.private_key)
+        self.workers = workers
+        self.threshold = threshold
+        self._pool = None
+        self._pool_pid = None
+
+
+class SecretBox(object):
+    """AES-GCM for plaintext kept in the shared cache, the key is derived
+    from the server's RSA key and `context` (usually the cache key) is
+    authenticated so an entry can not be moved to another key."""
+
+    def seal(self, plaintext, context):
+        nonce = get_random_bytes(12)
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(context.encode("utf-8"))
+        ciphertext, tag = cipher.encrypt_and_digest(plaintext)
+        return nonce + tag + ciphertext
+
+    def open(self, data, context):
+        """Plaintext of a sealed value, None if it was tampered with."""
+        if data is None or len(data) < 28:
+            return None
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=data[:12])
+        cipher.update(context.encode("utf-8"))
+        try:
+            return cipher.decrypt_and_verify(data[28:], data[12:28])
+        except ValueError:
+            return None
+
+    def __init__(self, private_key):
+        der = private_key.export_key("DER")
+        self.key = HMAC.new(der, b"slashpass cache", SHA256).digest()
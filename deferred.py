@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import current_app
+
+from cache_backend import RedisBackend
+from environ import (
+    DEFERRED_BACKEND,
+    DEFERRED_QUEUE_SIZE,
+    DEFERRED_RESPONSES,
+    DEFERRED_WORKERS,
+    UPSTREAM_TIMEOUT,
+)
+from jobs import JobQueue
+from server import cache
+
+FAILURE_MSG = "Something went wrong processing your command, please try again."
+FAILURE_BODY = json.dumps(
+    {"attachments": [{"fallback": FAILURE_MSG, "text": FAILURE_MSG, "color": "danger"}]}
+)
+
+
+def post_response(response_url, body):
+    return requests.post(
+        response_url,
+        data=body,
+        headers={"Content-Type": "application/json"},
+        timeout=UPSTREAM_TIMEOUT,
+    )
+
+
+class DeferredExecutor(object):
+    """Runs slow commands on a bounded thread pool and posts the resulting
+    Slack message to the command's `response_url`."""
+
+    def submit(self, response_url, team, fn, *args):
+        """Schedules `fn(*args)`, which must return a Flask response, returns
+        False when the queue is full so the caller can run it inline."""
+        with self._lock:
+            if self.pending >= self.queue_size:
+                self.rejected += 1
+                return False
+            self.pending += 1
+
+        app = current_app._get_current_object()
+        self._pool().submit(self._run, app, response_url, time.monotonic(), fn, args)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self.pending - self.running,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_time": self.wait_time,
+                "execution_time": self.execution_time,
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._executor = self._executor, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _run(self, app, response_url, enqueued, fn, args):
+        started = time.monotonic()
+        with self._lock:
+            self.running += 1
+            self.wait_time += started - enqueued
+
+        failed = False
+        try:
+            with app.app_context():
+                body = fn(*args).get_data()
+        except Exception:
+            failed = True
+            app.logger.exception("Deferred command failed")
+            body = FAILURE_BODY
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.running -= 1
+                self.execution_time += time.monotonic() - started
+
+        try:
+            post_response(response_url, body)
+        except requests.exceptions.RequestException:
+            failed = True
+            app.logger.exception("Unable to post to response_url")
+
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="deferred"
+                )
+            return self._executor
+
+    def __init__(
+        self,
+        enabled=DEFERRED_RESPONSES,
+        workers=DEFERRED_WORKERS,
+        queue_size=DEFERRED_QUEUE_SIZE,
+    ):
+        self.enabled = enabled
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.execution_time = 0.0
+        self._executor = None
+        self._lock = threading.Lock()
+
+
+if DEFERRED_BACKEND == "redis":
+    if not isinstance(cache, RedisBackend):
+        raise RuntimeError("DEFERRED_BACKEND=redis requires CACHE_BACKEND=redis")
+    # commands are executed by the standalone worker process (worker.py)
+    executor = JobQueue(cache.redis, enabled=DEFERRED_RESPONSES)
+else:
+    executor = DeferredExecutor()
@@ -0,0 +1,201 @@
+"""Stand-in for a team's password server, for integration and load tests.
+
+    poetry run python emulator.py --proxy http://localhost:5000 \
+        --channels 100 --secrets 20 --latency 0.05 --error-rate 0.01
+
+Implements the endpoints the proxy calls (`public_key`, `list/<channel>`,
+`insert`, `remove` and `onetime_link`) with the listing and the onetime
+links encrypted for the proxy's `/public_key`, plus the insert editor and
+the onetime link pages opened by the users. Secrets are kept in memory.
+"""
+
+import argparse
+import base64
+import html
+import random
+import secrets
+import threading
+import time
+
+import requests
+from Crypto.Cipher import PKCS1_OAEP
+from Crypto.PublicKey import RSA
+from flask import Flask, abort, request
+
+OAEP_OVERHEAD = 42  # 2 * SHA-1 digest size + 2
+
+EDITOR = """<!doctype html>
+<form method="post"><p>{path}</p>
+<textarea name="secret"></textarea><button type="submit">Save</button></form>
+"""
+
+
+def encrypt(plaintext, public_key):
+    """Ciphertext in the format expected by the proxy, one base64 OAEP block
+    per key sized piece of the plaintext."""
+    cipher = PKCS1_OAEP.new(public_key)
+    size = public_key.size_in_bytes() - OAEP_OVERHEAD
+    return b"".join(
+        base64.b64encode(cipher.encrypt(plaintext[i : i + size]))
+        for i in range(0, len(plaintext), size)
+    )
+
+
+class Store(object):
+    """Secrets by `channel/app` path and the pending onetime links."""
+
+    def populate(self, channels, per_channel, size=32):
+        for i in range(channels):
+            for j in range(per_channel):
+                self.secrets[f"C{i:08d}/secret{j}"] = secrets.token_urlsafe(size)
+
+    def list(self, channel):
+        prefix = f"{channel}/"
+        with self._lock:
+            paths = sorted(path for path in self.secrets if path.startswith(prefix))
+        return "\n".join(paths)
+
+    def insert(self, path, secret):
+        with self._lock:
+            self.secrets[path] = secret
+
+    def remove(self, path):
+        with self._lock:
+            return self.secrets.pop(path, None) is not None
+
+    def onetime_link(self, path):
+        with self._lock:
+            if path not in self.secrets:
+                return None
+            link = secrets.token_urlsafe(16)
+            self.links[link] = self.secrets[path]
+        return link
+
+    def open_link(self, link):
+        with self._lock:
+            return self.links.pop(link, None)
+
+    def __init__(self):
+        self.secrets = {}
+        self.links = {}
+        self._lock = threading.Lock()
+
+
+def create_app(
+    proxy_url=None,
+    proxy_key=None,
+    latency=0.0,
+    jitter=0.0,
+    error_rate=0.0,
+    channels=0,
+    per_channel=0,
+    seed=None,
+):
+    """`proxy_key` is the proxy's public key in PEM, fetched from
+    `proxy_url` on first use when not given."""
+    app = Flask(__name__)
+    app.store = Store()
+    app.store.populate(channels, per_channel)
+    key = RSA.generate(2048)
+    chance = random.Random(seed)
+    proxy = {"key": RSA.importKey(proxy_key) if proxy_key else None}
+
+    def proxy_public_key():
+        if proxy["key"] is None:
+            response = requests.get(f"{proxy_url}/public_key", timeout=5)
+            response.raise_for_status()
+            proxy["key"] = RSA.importKey(response.text)
+        return proxy["key"]
+
+    @app.before_request
+    def emulate_network():
+        # only the calls made by the proxy are slowed down or failed
+        if request.method != "POST" or request.endpoint == "editor":
+            return None
+        if latency or jitter:
+            time.sleep(latency + chance.uniform(0, jitter))
+        if chance.random() < error_rate:
+            return "Emulated failure", 500
+        return None
+
+    @app.route("/public_key", methods=["GET"])
+    def public_key():
+        return key.publickey().export_key("PEM")
+
+    @app.route("/list/<channel>", methods=["POST"])
+    def list_secrets(channel):
+        return encrypt(app.store.list(channel).encode("utf-8"), proxy_public_key())
+
+    @app.route("/insert", methods=["POST"])
+    def insert():
+        app.store.insert(request.form["path"], request.form["secret"])
+        return ""
+
+    @app.route("/insert/<token>", methods=["GET", "POST"], endpoint="editor")
+    def editor(token):
+        response = requests.get(f"{proxy_url}/t/{token}", timeout=5)
+        if response.status_code != requests.codes.ok:
+            abort(404)
+        if request.method == "GET":
+            return EDITOR.format(path=html.escape(response.text))
+        app.store.insert(response.text, request.form["secret"])
+        return "Saved"
+
+    @app.route("/remove", methods=["POST"])
+    def remove():
+        path = f"{request.form['channel']}/{request.form['app']}"
+        if not app.store.remove(path):
+            abort(404)
+        return ""
+
+    @app.route("/onetime_link", methods=["POST"])
+    def onetime_link():
+        link = app.store.onetime_link(request.form["secret"])
+        if link is None:
+            abort(404)
+        url = f"{request.host_url}onetime/{link}"
+        return encrypt(url.encode("utf-8"), proxy_public_key())
+
+    @app.route("/onetime/<link>", methods=["GET"])
+    def open_link(link):
+        secret = app.store.open_link(link)
+        if secret is None:
+            abort(404)
+        return secret
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--proxy", default="http://localhost:5000")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every call"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="random extra seconds, up to"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction of calls failing"
+    )
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--secrets", type=int, default=10, help="per channel")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    app = create_app(
+        proxy_url=args.proxy,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        channels=args.channels,
+        per_channel=args.secrets,
+        seed=args.seed,
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
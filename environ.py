@@ -3,17 +3,73 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 4))
+BATCH_MAX_SECRETS = int(os.environ.get('BATCH_MAX_SECRETS', 10))
 BIP39 = os.environ.get('BIP39')
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis')
 CONFIGURATION_GUIDE_URL = os.environ.get(
   'CONFIGURATION_GUIDE_URL', 'https://slashpass.co/configure'
 )
 DATABASE_URL = os.environ.get('DATABASE_URL')
+DECRYPT_PARALLEL_THRESHOLD = int(
+  os.environ.get('DECRYPT_PARALLEL_THRESHOLD', 16384)
+)
+DECRYPT_WORKERS = int(os.environ.get('DECRYPT_WORKERS', 0))
+DEFERRED_BACKEND = os.environ.get('DEFERRED_BACKEND', 'thread')
+DEFERRED_QUEUE_SIZE = int(os.environ.get('DEFERRED_QUEUE_SIZE', 64))
+DEFERRED_RESPONSES = os.environ.get('DEFERRED_RESPONSES', '') == '1'
+DEFERRED_WORKERS = int(os.environ.get('DEFERRED_WORKERS', 8))
 DEMO_SERVER = os.environ.get('DEMO_SERVER', 'http://0.0.0.0:8090/')
+JOB_BACKOFF = float(os.environ.get('JOB_BACKOFF', 1))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_VISIBILITY_TIMEOUT = float(os.environ.get('JOB_VISIBILITY_TIMEOUT', 30))
+KEY_FILE = os.environ.get('KEY_FILE')
+KEY_SIZE = int(os.environ.get('KEY_SIZE', 2048))
+LIST_CACHE_STALE = int(os.environ.get('LIST_CACHE_STALE', 60))
+LIST_CACHE_TTL = int(os.environ.get('LIST_CACHE_TTL', 0))
+LIST_COALESCING = os.environ.get('LIST_COALESCING', '') == '1'
+LIST_STREAMING = os.environ.get('LIST_STREAMING', '') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+PROFILE_SAMPLE = float(os.environ.get('PROFILE_SAMPLE', 0))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+REDIS_HEALTH_CHECK_INTERVAL = int(
+  os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30)
+)
 REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 64))
+REDIS_MODE = os.environ.get('REDIS_MODE', 'standalone')
+REDIS_NODES = os.environ.get('REDIS_NODES', '')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+REDIS_RETRIES = int(os.environ.get('REDIS_RETRIES', 0))
+REDIS_SENTINEL_SERVICE = os.environ.get('REDIS_SENTINEL_SERVICE', 'mymaster')
+REDIS_SOCKET = os.environ.get('REDIS_SOCKET')
+REDIS_TIMEOUT = float(os.environ.get('REDIS_TIMEOUT', 5))
 SENTRY_DSN = os.environ.get('SENTRY_DSN')
 SIGNING_SECRET = os.environ.get('SIGNING_SECRET')
+SLACK_MAX_BODY = int(os.environ.get('SLACK_MAX_BODY', 131072))
+SLACK_MAX_REQUEST_AGE = int(os.environ.get('SLACK_MAX_REQUEST_AGE', 60))
 SLACK_SERVER = os.environ.get('SLACK_SERVER')
 SLACK_CLIENT_ID = os.environ.get('SLACK_CLIENT_ID')
 SLACK_CLIENT_SECRET = os.environ.get('SLACK_CLIENT_SECRET')
 HOMEPAGE = os.environ.get('HOMEPAGE', 'https://slashpass.co')
+TEAM_CACHE_SIZE = int(os.environ.get('TEAM_CACHE_SIZE', 4096))
+TEAM_CACHE_TTL = float(os.environ.get('TEAM_CACHE_TTL', 0))
+TRACE_FILE = os.environ.get('TRACE_FILE')
+TRACE_SAMPLE = float(os.environ.get('TRACE_SAMPLE', 0))
+TRACE_SLOW = float(os.environ.get('TRACE_SLOW', 1))
+TRAFFIC_RECORD_FILE = os.environ.get('TRAFFIC_RECORD_FILE')
+TRAFFIC_RECORD_SAMPLE = float(os.environ.get('TRAFFIC_RECORD_SAMPLE', 1))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 1))
+UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get('UPSTREAM_FAILURE_THRESHOLD', 5))
+UPSTREAM_IDLE_TIMEOUT = float(os.environ.get('UPSTREAM_IDLE_TIMEOUT', 60))
+UPSTREAM_MAX_HOSTS = int(os.environ.get('UPSTREAM_MAX_HOSTS', 256))
+UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 4))
+UPSTREAM_RESET_TIMEOUT = float(os.environ.get('UPSTREAM_RESET_TIMEOUT', 30))
+UPSTREAM_TIMEOUT = float(os.environ.get('UPSTREAM_TIMEOUT', 2.5))
+WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 0.1))
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 4))
 SUCCESS_PAGE = os.environ.get('SUCCESS_PAGE', 'https://slashpass.co')
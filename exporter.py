@@ -0,0 +1,25 @@
+import hmac
+
+from flask import Blueprint, Response, abort, request
+
+from environ import METRICS_TOKEN
+from metrics import registry
+from server import cache
+
+view = Blueprint("metrics", __name__)
+
+registry.collector(
+    "slashpass_cache_expired_keys",
+    "Keys expired by the cache, insert tokens included",
+    "counter",
+    lambda: cache.stats()["expired"],
+)
+
+
+@view.route("", methods=["GET"])
+def metrics():
+    if METRICS_TOKEN:
+        expected = f"Bearer {METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+            abort(403)
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
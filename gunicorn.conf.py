@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+
+# With GUNICORN_PRELOAD=1 the application (and the RSA key derivation in
+# server.py) is loaded once in the master and shared with every worker
+# through fork, pools and connections are created lazily by each worker.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "") == "1"
+
+# directory created for the samples of this run when METRICS_DIR is unset
+_metrics_dir = None
+
+
+def on_starting(server):
+    # the workers are forked from the master, importing the registry here
+    # hands them the directory whether or not the application is preloaded
+    global _metrics_dir
+    from metrics import registry
+
+    if registry.directory is None:
+        _metrics_dir = tempfile.mkdtemp(prefix="slashpass-metrics-")
+        registry.use(_metrics_dir)
+    # samples written by the workers of a previous run would be added to
+    # the counters of this one
+    registry.clear()
+
+
+def on_exit(server):
+    if _metrics_dir is not None:
+        shutil.rmtree(_metrics_dir, ignore_errors=True)
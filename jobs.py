@@ -0,0 +1,262 @@
+import json
+import threading
+import time
+import uuid
+
+import requests
+from redis.exceptions import RedisError
+
+from environ import (
+    JOB_BACKOFF,
+    JOB_MAX_ATTEMPTS,
+    JOB_VISIBILITY_TIMEOUT,
+    WORKER_POLL_INTERVAL,
+)
+
+# the hash tag keeps every queue key in one Redis Cluster slot, the scripts
+# below touch several of them at once
+PREFIX = "{slashpass:jobs}"
+TEAMS = f"{PREFIX}:teams"  # round robin of teams with ready jobs
+ACTIVE = f"{PREFIX}:active"  # set mirroring TEAMS for O(1) membership
+INFLIGHT = f"{PREFIX}:inflight"  # job id -> visibility deadline
+DELAYED = f"{PREFIX}:delayed"  # job id -> retry time
+
+handlers = {}
+
+# KEYS: data, ready, TEAMS, ACTIVE  ARGV: job id, payload, team
+ENQUEUE = """
+redis.call('SET', KEYS[1], ARGV[2])
+redis.call('RPUSH', KEYS[2], ARGV[1])
+if redis.call('SADD', KEYS[4], ARGV[3]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[3])
+end
+"""
+
+# the ready list of a team is only known once the team is read, it is
+# peeked by the caller and checked again here so every key is declared
+# KEYS: TEAMS, ACTIVE, INFLIGHT, ready list of the team
+# ARGV: team, visibility deadline
+DEQUEUE = """
+if redis.call('LINDEX', KEYS[1], 0) ~= ARGV[1] then
+    return nil
+end
+redis.call('LPOP', KEYS[1])
+local id = redis.call('LPOP', KEYS[4])
+if redis.call('LLEN', KEYS[4]) > 0 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+else
+    redis.call('SREM', KEYS[2], ARGV[1])
+end
+if id then
+    redis.call('ZADD', KEYS[3], ARGV[2], id)
+end
+return id
+"""
+
+# moves a due job from a sorted set (DELAYED or INFLIGHT) back to the ready
+# list of its team, unless another worker already did
+# KEYS: source, ready list of the team, TEAMS, ACTIVE  ARGV: job id, team
+PROMOTE = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+if redis.call('SADD', KEYS[4], ARGV[2]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[2])
+end
+return 1
+"""
+
+
+def register(name):
+    """Makes a function runnable by the worker under `name`."""
+
+    def decorator(fn):
+        handlers[name] = fn
+        fn.job_name = name
+        return fn
+
+    return decorator
+
+
+class JobQueue(object):
+    """Redis backed queue for deferred commands. Jobs are handed to
+    workers team by team (round robin) so one busy team cannot starve the
+    rest, stay invisible to other workers for `visibility_timeout` seconds
+    after being taken and are retried with exponential backoff.
+
+    Delivery is at least once: a job that fails, or outlives its
+    visibility timeout, runs again and posts its reply again."""
+
+    def submit(self, response_url, team, fn, *args):
+        job_id = uuid.uuid4().hex
+        payload = json.dumps(
+            {
+                "id": job_id,
+                "handler": fn.job_name,
+                "args": args,
+                "team": str(team),
+                "response_url": response_url,
+                "attempts": 0,
+            }
+        )
+        self._enqueue(
+            keys=[self._data(job_id), self._ready(team), TEAMS, ACTIVE],
+            args=[job_id, payload, str(team)],
+        )
+        return True
+
+    def take(self):
+        """Next job as a dict, or None when there is nothing to do."""
+        now = time.time()
+        self._promote_due(now)
+
+        while True:
+            team = self.redis.lindex(TEAMS, 0)
+            if team is None:
+                return None
+            team = team.decode()
+            job_id = self._dequeue(
+                keys=[TEAMS, ACTIVE, INFLIGHT, self._ready(team)],
+                args=[team, now + self.visibility_timeout],
+            )
+            if job_id is not None:
+                break
+            # another worker took the team first, or its list was empty
+
+        payload = self.redis.get(self._data(job_id.decode()))
+        if payload is None:
+            return None
+        return json.loads(payload)
+
+    def ack(self, job):
+        pipe = self.redis.pipeline()
+        pipe.zrem(INFLIGHT, job["id"])
+        pipe.delete(self._data(job["id"]))
+        pipe.execute()
+
+    def retry(self, job):
+        """Schedules the job again, returns False once it ran out of
+        attempts (the job is dropped)."""
+        job = dict(job, attempts=job["attempts"] + 1)
+        if job["attempts"] >= self.max_attempts:
+            self.ack(job)
+            return False
+
+        delay = self.backoff * 2 ** (job["attempts"] - 1)
+        pipe = self.redis.pipeline()
+        pipe.set(self._data(job["id"]), json.dumps(job))
+        pipe.zrem(INFLIGHT, job["id"])
+        pipe.zadd(DELAYED, {job["id"]: time.time() + delay})
+        pipe.execute()
+        return True
+
+    def stats(self):
+        pipe = self.redis.pipeline()
+        pipe.llen(TEAMS)
+        pipe.zcard(INFLIGHT)
+        pipe.zcard(DELAYED)
+        teams, inflight, delayed = pipe.execute()
+        return {"teams": teams, "inflight": inflight, "delayed": delayed}
+
+    def _promote_due(self, now):
+        pipe = self.redis.pipeline(transaction=False)
+        for source in (DELAYED, INFLIGHT):
+            pipe.zrangebyscore(source, "-inf", now, start=0, num=100)
+        due = [
+            (source, job_id.decode())
+            for source, ids in zip((DELAYED, INFLIGHT), pipe.execute())
+            for job_id in ids
+        ]
+        if not due:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        for _, job_id in due:
+            pipe.get(self._data(job_id))
+        for (source, job_id), payload in zip(due, pipe.execute()):
+            if payload is None:
+                # acknowledged in the meantime
+                self.redis.zrem(source, job_id)
+                continue
+            team = json.loads(payload)["team"]
+            self._promote(
+                keys=[source, self._ready(team), TEAMS, ACTIVE], args=[job_id, team]
+            )
+
+    def _data(self, job_id):
+        return f"{PREFIX}:data:{job_id}"
+
+    def _ready(self, team):
+        return f"{PREFIX}:ready:{team}"
+
+    def __init__(
+        self,
+        redis,
+        enabled=True,
+        visibility_timeout=JOB_VISIBILITY_TIMEOUT,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        backoff=JOB_BACKOFF,
+    ):
+        self.redis = redis
+        self.enabled = enabled
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._enqueue = redis.register_script(ENQUEUE)
+        self._dequeue = redis.register_script(DEQUEUE)
+        self._promote = redis.register_script(PROMOTE)
+
+
+class Worker(object):
+    def run(self):
+        # worker.py never restarts its threads, nothing may escape the loop
+        while not self.stopped.is_set():
+            try:
+                busy = self.run_once()
+            except RedisError:
+                self.app.logger.exception("Unable to update the job queue")
+                busy = False
+            if not busy:
+                self.stopped.wait(self.poll_interval)
+
+    def run_once(self):
+        try:
+            job = self.queue.take()
+        except RedisError:
+            self.app.logger.exception("Unable to take a job")
+            return False
+        if job is None:
+            return False
+
+        try:
+            with self.app.app_context():
+                body = handlers[job["handler"]](*job["args"]).get_data()
+        except Exception:
+            self.app.logger.exception(f"Job {job['id']} failed")
+            if not self.queue.retry(job):
+                self._post(job, self.failure_body)
+            return True
+
+        self.queue.ack(job)
+        self._post(job, body)
+        return True
+
+    def _post(self, job, body):
+        try:
+            self.post(job["response_url"], body)
+        except requests.exceptions.RequestException:
+            self.app.logger.exception(f"Unable to post the result of {job['id']}")
+
+    def stop(self):
+        self.stopped.set()
+
+    def __init__(
+        self, app, queue, post, failure_body, poll_interval=WORKER_POLL_INTERVAL
+    ):
+        self.app = app
+        self.queue = queue
+        self.post = post
+        self.failure_body = failure_body
+        self.poll_interval = poll_interval
+        self.stopped = threading.Event()
@@ -0,0 +1,94 @@
+import hashlib
+import hmac
+import logging
+import os
+import tempfile
+from struct import pack
+
+from Crypto.Hash import HMAC
+from Crypto.PublicKey import RSA
+
+KEY_SIZES = (2048, 3072, 4096)
+
+logger = logging.getLogger(__name__)
+
+
+class _PRNG(object):
+    def __call__(self, n):
+        while len(self.buffer) < n:
+            self.buffer += HMAC.new(self.seed + pack("<I", self.index)).digest()
+            self.index += 1
+        result, self.buffer = self.buffer[:n], self.buffer[n:]
+        return result
+
+    def __init__(self, seed):
+        self.index = 0
+        self.seed = seed
+        self.buffer = b""
+
+
+def generate_key(seed, bits=2048):
+    """Deterministic RSA key derived from `seed`, for 2048 bits this is the
+    same key `rsa.generate_key` produces."""
+    if bits not in KEY_SIZES:
+        raise ValueError(f"Unsupported key size {bits}, use one of {KEY_SIZES}")
+
+    # based on https://stackoverflow.com/questions/18264314/#answer-18266970
+    seed_128 = HMAC.new(
+        bytes(seed, "utf-8") + b"Application: 2nd key derivation"
+    ).digest()
+    return RSA.generate(bits, randfunc=_PRNG(seed_128))
+
+
+def chunk_size(key):
+    """Length of one base64 encoded ciphertext block for `key`."""
+    return 4 * -(-key.size_in_bytes() // 3)
+
+
+def fingerprint(seed, bits):
+    """Identifies the key derived from `seed` without revealing the seed."""
+    return hmac.new(
+        bytes(seed, "utf-8"), f"slashpass key {bits}".encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def load_key(seed, bits=2048, path=None):
+    """Derived key for `seed`, reusing the copy stored at `path` when its
+    fingerprint matches, otherwise the key is derived and stored there
+    readable only by the current user and encrypted with the seed. A path
+    that can not be written only costs the next boot another derivation."""
+    if not path:
+        return generate_key(seed, bits)
+
+    expected = fingerprint(seed, bits)
+    try:
+        with open(path, "rb") as f:
+            stored, pem = f.read().split(b"\n", 1)
+        if hmac.compare_digest(stored, expected.encode()):
+            return RSA.importKey(pem, passphrase=seed)
+    except (OSError, ValueError):
+        pass
+
+    key = generate_key(seed, bits)
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    except OSError:
+        logger.warning(f"Unable to store the derived key in {path}", exc_info=True)
+        return key
+    try:
+        # mkstemp creates the file with 0600 permissions
+        with os.fdopen(fd, "wb") as f:
+            f.write(expected.encode() + b"\n")
+            f.write(
+                key.exportKey(
+                    "PEM",
+                    passphrase=seed,
+                    pkcs=8,
+                    protection="PBKDF2WithHMAC-SHA256AndAES128-CBC",
+                )
+            )
+        os.replace(tmp, path)
+    except OSError:
+        logger.warning(f"Unable to store the derived key in {path}", exc_info=True)
+        os.unlink(tmp)
+    return key
@@ -0,0 +1,129 @@
+import secrets
+import struct
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+PREFIX = "slashpass:listing:"
+GENERATION_PREFIX = "slashpass:listing-generation:"
+
+_FETCHED = struct.Struct(">d")
+
+
+class ListingCache(object):
+    """Decrypted channel listings kept in the shared cache for `ttl`
+    seconds, sealed with `box` so the plaintext never reaches Redis. Entries
+    are kept `stale` seconds longer to be served while they are refreshed.
+
+    Every invalidation gives the entry a new generation. A listing is only
+    stored while the generation read ahead of its fetch is still current,
+    checked atomically with the write, so one fetched before an insert or
+    remove is never cached after it.
+    """
+
+    def get(self, team_id, channel):
+        """`(listing, fresh)` or None when there is no usable entry."""
+        key = self._key(team_id, channel)
+        try:
+            data = self.box.open(self.cache.get(key), key)
+        except RedisError:
+            data = None
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            (fetched,) = _FETCHED.unpack_from(data)
+            fresh = time.time() - fetched < self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        return data[_FETCHED.size :], fresh
+
+    def generation(self, team_id, channel):
+        """Generation of the entry, to be read before fetching the listing
+        passed to `set`. "" until the first invalidation, None when it can
+        not be read."""
+        try:
+            generation = self.cache.get(self._generation_key(team_id, channel))
+        except RedisError:
+            return None
+        return (generation or b"").decode()
+
+    def set(self, team_id, channel, listing, generation):
+        if generation is None:
+            return
+        key = self._key(team_id, channel)
+        data = _FETCHED.pack(time.time()) + listing
+        try:
+            # dropped when invalidated during the fetch, it may be outdated
+            self.cache.set_if(
+                key,
+                self.box.seal(data, key),
+                self._generation_key(team_id, channel),
+                generation,
+                ex=self.ttl + self.stale,
+            )
+        except RedisError:
+            pass
+
+    def invalidate(self, team_id, channel):
+        with self._lock:
+            self.invalidations += 1
+        try:
+            # random rather than counted, two invalidations never share one,
+            # written first so a concurrent `set` either fails or is deleted
+            self.cache.set(
+                self._generation_key(team_id, channel),
+                secrets.token_hex(8),
+                ex=self.ttl + self.stale,
+            )
+            self.cache.delete(self._key(team_id, channel))
+        except RedisError:
+            # the write succeeded, the entry expires on its own
+            pass
+
+    def claim(self, team_id, channel):
+        """Whether the caller may refresh the entry, only one refresh per
+        entry runs at a time in a process until it is `release`d."""
+        key = self._key(team_id, channel)
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def release(self, team_id, channel):
+        with self._lock:
+            self._refreshing.discard(self._key(team_id, channel))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+    # the hash tag keeps an entry and its generation in one Redis Cluster
+    # slot for `set_if`
+    def _key(self, team_id, channel):
+        return f"{PREFIX}{{{team_id}:{channel}}}"
+
+    def _generation_key(self, team_id, channel):
+        return f"{GENERATION_PREFIX}{{{team_id}:{channel}}}"
+
+    def __init__(self, cache, box, ttl, stale):
+        self.cache = cache
+        self.box = box
+        self.ttl = ttl
+        self.stale = stale
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
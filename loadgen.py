@@ -0,0 +1,213 @@
+"""Replays a JSONL corpus of signed Slack requests against the proxy.
+
+    poetry run python loadgen.py corpus.jsonl --url http://localhost:5000 \
+        --rate 50 --duration 60 --team T12345:acme
+
+The corpus format is described in `traffic.read`, production traffic is
+recorded into it by setting TRAFFIC_RECORD_FILE on the proxy. Requests are
+signed with SIGNING_SECRET and a fresh timestamp. With --rate requests are
+sent on a fixed schedule and latencies count from their scheduled time, so
+a slow proxy can not slow down the load; with --concurrency every worker
+sends its next request when the previous one is answered.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import secrets
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+import traffic
+from environ import SIGNING_SECRET
+from signature import sign
+
+PATHS = {"command": "/slack/command", "action": "/slack/action"}
+
+
+def signed(entry, secret, team=None):
+    """Path, body and headers of the request for a corpus entry."""
+    fields = traffic.form(entry)
+    # like Slack's, a unique trigger_id per request keeps identical entries
+    # signed in the same second from being rejected as replays
+    trigger_id = secrets.token_hex(8)
+    if entry["kind"] == "action":
+        payload = json.loads(fields["payload"])
+        payload["trigger_id"] = trigger_id
+        if team is not None:
+            payload["team"]["id"] = team[0]
+        fields["payload"] = json.dumps(payload)
+    else:
+        fields["trigger_id"] = trigger_id
+        if team is not None:
+            fields["team_id"], fields["team_domain"] = team
+    body = urlencode(fields).encode()
+    timestamp = str(int(time.time()))
+    headers = {
+        "Content-Type": "application/x-www-form-urlencoded",
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": sign(secret, timestamp, body),
+    }
+    return PATHS[entry["kind"]], body, headers
+
+
+def percentile(samples, fraction):
+    """Nearest rank percentile of sorted `samples`."""
+    if not samples:
+        return float("nan")
+    return samples[max(0, math.ceil(len(samples) * fraction) - 1)]
+
+
+class Results(object):
+    def add(self, verb, seconds, ok):
+        with self._lock:
+            self.latencies[verb].append(seconds)
+            if not ok:
+                self.errors[verb] += 1
+
+    def report(self, elapsed):
+        """One row per verb and a last one for every request."""
+        with self._lock:
+            groups = [(verb, self.latencies[verb]) for verb in sorted(self.latencies)]
+            groups.append(("total", [s for _, samples in groups for s in samples]))
+            errors = dict(self.errors, total=sum(self.errors.values()))
+            return [
+                self._row(verb, sorted(samples), errors.get(verb, 0), elapsed)
+                for verb, samples in groups
+            ]
+
+    def _row(self, verb, samples, errors, elapsed):
+        return {
+            "verb": verb,
+            "requests": len(samples),
+            "errors": errors,
+            "rps": len(samples) / elapsed if elapsed else 0.0,
+            "p50": percentile(samples, 0.50),
+            "p95": percentile(samples, 0.95),
+            "p99": percentile(samples, 0.99),
+        }
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+
+class LoadGenerator(object):
+    def run(self, entries, rate=None, concurrency=None, duration=None, total=None):
+        """Replays `entries` in a loop until `duration` seconds or `total`
+        requests, returns the Results and the elapsed seconds."""
+        results = Results()
+        sequence = itertools.cycle(entries)
+        if total is not None:
+            sequence = itertools.islice(sequence, total)
+        start = time.perf_counter()
+        deadline = start + duration if duration else float("inf")
+
+        if rate:
+            self._open_loop(sequence, rate, deadline, results)
+        else:
+            self._closed_loop(sequence, concurrency or 1, deadline, results)
+        return results, time.perf_counter() - start
+
+    def _open_loop(self, sequence, rate, deadline, results):
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            scheduled = time.perf_counter()
+            for entry in sequence:
+                if scheduled >= deadline:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, entry, scheduled, results)
+                scheduled += 1 / rate
+
+    def _closed_loop(self, sequence, concurrency, deadline, results):
+        lock = threading.Lock()
+
+        def worker():
+            while time.perf_counter() < deadline:
+                with lock:
+                    entry = next(sequence, None)
+                if entry is None:
+                    return
+                self._send(entry, time.perf_counter(), results)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _send(self, entry, started, results):
+        path, body, headers = signed(entry, self.secret, self.team)
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        try:
+            response = session.post(
+                self.url + path, data=body, headers=headers, timeout=self.timeout
+            )
+            ok = response.status_code == requests.codes.ok
+        except requests.exceptions.RequestException:
+            ok = False
+        results.add(entry["verb"], time.perf_counter() - started, ok)
+
+    def __init__(self, url, secret, team=None, timeout=10, max_workers=256):
+        self.url = url.rstrip("/")
+        self.secret = secret
+        self.team = team
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._local = threading.local()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus")
+    parser.add_argument("--url", default="http://localhost:5000")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rate", type=float, help="requests per second")
+    load.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--requests", type=int, help="stop after this many")
+    parser.add_argument(
+        "--team", help="team_id:team_domain sent instead of the recorded ones"
+    )
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    team = tuple(args.team.split(":", 1)) if args.team else None
+    generator = LoadGenerator(args.url, SIGNING_SECRET, team)
+    results, elapsed = generator.run(
+        traffic.read(args.corpus),
+        rate=args.rate,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        total=args.requests,
+    )
+
+    rows = results.report(elapsed)
+    print(
+        f"{'verb':<20} {'requests':>9} {'errors':>7} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for row in rows:
+        print(
+            f"{row['verb']:<20} {row['requests']:>9} {row['errors']:>7} "
+            f"{row['rps']:>8.1f} {row['p50'] * 1e3:>8.1f} {row['p95'] * 1e3:>8.1f} "
+            f"{row['p99'] * 1e3:>8.1f}"
+        )
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"elapsed": elapsed, "verbs": rows}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
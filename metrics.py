@@ -0,0 +1,335 @@
+"""Counters and histograms exposed at /metrics in the Prometheus text
+format.
+
+Every process keeps its samples in memory and, when METRICS_DIR is set
+(gunicorn.conf.py picks a directory of the run otherwise), writes them to
+`<METRICS_DIR>/<pid>-<start token>.json` every METRICS_FLUSH_INTERVAL
+seconds. A scrape merges the files of every process, which makes the totals
+correct whichever gunicorn worker answers it. The files of workers that
+already exited are added to `exited.json` first, so that counters never go
+backwards without keeping one file per worker ever started.
+"""
+
+import atexit
+import bisect
+import fcntl
+import glob
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from environ import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+LATENCY = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FAST = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1)
+EXITED = "exited.json"
+
+
+class _Timer(object):
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start)
+
+    def __init__(self, child):
+        self.child = child
+
+
+class _Child(object):
+    def inc(self, amount=1):
+        self.metric._add(self.key, amount)
+
+    def observe(self, value):
+        self.metric._observe(self.key, value)
+
+    def time(self):
+        return _Timer(self)
+
+    def __init__(self, metric, key):
+        self.metric = metric
+        self.key = key
+
+
+class Metric(object):
+    """Samples by label values, a counter keeps a number and a histogram a
+    list of cumulative bucket counts followed by the sum and the count."""
+
+    def labels(self, *values):
+        return _Child(self, tuple(str(value) for value in values))
+
+    def _add(self, key, amount):
+        registry.started()
+        with self._lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+    def _observe(self, key, value):
+        registry.started()
+        with self._lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = [0] * (len(self.buckets) + 2)
+            for i in range(bisect.bisect_left(self.buckets, value), len(self.buckets)):
+                sample[i] += 1
+            sample[-2] += value
+            sample[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                json.dumps(key): list(value) if self.kind == "histogram" else value
+                for key, value in self.samples.items()
+            }
+
+    def __init__(self, name, help, kind, labelnames, buckets=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.samples = {}
+        self._lock = threading.Lock()
+
+
+class Registry(object):
+    def counter(self, name, help, labelnames):
+        return self._add(Metric(name, help, "counter", labelnames))
+
+    def histogram(self, name, help, labelnames, buckets=LATENCY):
+        return self._add(Metric(name, help, "histogram", labelnames, buckets))
+
+    def collector(self, name, help, kind, collect):
+        """Value read by `collect()` in the scraping process only, for values
+        that are already global such as the Redis server counters."""
+        self.collectors.append((name, help, kind, collect))
+
+    def started(self):
+        # one flush thread per process, started on its first sample
+        if self.directory is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._flush_forever, daemon=True).start()
+
+    def use(self, directory):
+        """Writes the samples of this process, and of the ones forked from it,
+        to `directory` from now on."""
+        self.directory = directory or None
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        atexit.register(self.flush)
+        os.register_at_fork(after_in_child=self._forked)
+
+    def _forked(self):
+        # the samples of the parent are already in its own file, a new token
+        # keeps a reused pid from overwriting the file of an exited worker
+        self._token = secrets.token_hex(4)
+        self._lock = threading.Lock()
+        for metric in self.metrics:
+            metric.samples = {}
+            metric._lock = threading.Lock()
+
+    def flush(self):
+        if self.directory is None:
+            return
+        data = {metric.name: metric.snapshot() for metric in self.metrics}
+        self._write(f"{os.getpid()}-{self._token}.json", data)
+
+    def collect(self):
+        """Samples of every process, merged."""
+        if self.directory is None:
+            return {metric.name: metric.snapshot() for metric in self.metrics}
+
+        self.flush()
+        self._fold()
+        merged = {metric.name: {} for metric in self.metrics}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            snapshot = _load(path)
+            if snapshot is None:
+                continue
+            for name, samples in snapshot.items():
+                if name not in merged:
+                    continue
+                for key, value in samples.items():
+                    merged[name][key] = _merge(merged[name].get(key), value)
+        return merged
+
+    def render(self):
+        samples = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(samples[metric.name].items()):
+                labels = list(zip(metric.labelnames, json.loads(key)))
+                if metric.kind == "counter":
+                    lines.append(f"{metric.name}{_labels(labels)} {value}")
+                    continue
+                for le, count in zip(metric.buckets, value):
+                    bucket = _labels(labels + [("le", repr(float(le)))])
+                    lines.append(f"{metric.name}_bucket{bucket} {count}")
+                inf = _labels(labels + [("le", "+Inf")])
+                lines.append(f"{metric.name}_bucket{inf} {value[-1]}")
+                lines.append(f"{metric.name}_sum{_labels(labels)} {value[-2]}")
+                lines.append(f"{metric.name}_count{_labels(labels)} {value[-1]}")
+        for name, help, kind, collect in self.collectors:
+            value = collect()
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Removes the samples of previous runs, for the gunicorn master."""
+        if self.directory is None:
+            return
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            os.remove(path)
+
+    def _fold(self):
+        exited = [
+            path
+            for path in glob.glob(os.path.join(self.directory, "*-*.json"))
+            if _exited(path)
+        ]
+        if not exited:
+            return
+        # one scrape at a time, another one could add the same files again
+        with open(os.path.join(self.directory, "fold.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            totals = _load(os.path.join(self.directory, EXITED)) or {}
+            folded = []
+            for path in exited:
+                snapshot = _load(path)
+                if snapshot is None:
+                    continue
+                for name, samples in snapshot.items():
+                    merged = totals.setdefault(name, {})
+                    for key, value in samples.items():
+                        merged[key] = _merge(merged.get(key), value)
+                folded.append(path)
+            if not folded:
+                return
+            self._write(EXITED, totals)
+            for path in folded:
+                os.remove(path)
+
+    def _write(self, name, data):
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as output:
+            json.dump(data, output)
+        os.replace(path, os.path.join(self.directory, name))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def __init__(self, directory=METRICS_DIR, interval=METRICS_FLUSH_INTERVAL):
+        self.interval = interval
+        self.metrics = []
+        self.collectors = []
+        self._pid = None
+        self._token = secrets.token_hex(4)
+        self._lock = threading.Lock()
+        self.use(directory)
+
+
+def _merge(current, value):
+    if current is None:
+        return value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(current, value)]
+    return current + value
+
+
+def _load(path):
+    try:
+        with open(path) as data:
+            return json.load(data)
+    except (OSError, ValueError):
+        return None
+
+
+def _exited(path):
+    pid = os.path.basename(path).split("-", 1)[0]
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # alive, owned by another user
+        return False
+    return False
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+registry = Registry()
+
+commands = registry.histogram(
+    "slashpass_command_seconds", "Slash command handling time", ("verb",)
+)
+actions = registry.histogram(
+    "slashpass_action_seconds", "Interactive action handling time", ("action",)
+)
+upstream = registry.histogram(
+    "slashpass_upstream_seconds",
+    "Password server call time by server origin and HTTP status",
+    ("server", "status"),
+)
+decrypt = registry.histogram(
+    "slashpass_decrypt_seconds",
+    "RSA decryption time of one block or of a whole listing (chunks)",
+    ("operation",),
+    FAST,
+)
+redis = registry.histogram(
+    "slashpass_redis_seconds", "Redis command time", ("command",), FAST
+)
+database = registry.histogram(
+    "slashpass_database_seconds", "Database statement time", ("statement",), FAST
+)
+tokens = registry.counter(
+    "slashpass_insert_tokens_total",
+    "Insert token operations by result (created, hit, miss)",
+    ("result",),
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("slashpass_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    elapsed = time.perf_counter() - conn.info["slashpass_started"].pop()
+    verb = statement.split(None, 1)[0].lower() if statement.strip() else "unknown"
+    database.labels(verb).observe(elapsed)
@@ -0,0 +1,162 @@
+"""cProfile of single requests, for finding where a hot worker spends its
+time without restarting it.
+
+With PROFILE_DIR set a PROFILE_SAMPLE fraction of the requests, plus
+every request with a `X-Slashpass-Profile: <PROFILE_TOKEN>` header, is
+profiled and saved as `<time>-<pid>-<blueprint>-<verb>.prof`, the oldest
+files are removed beyond PROFILE_KEEP. They can be opened with `pstats` or
+aggregated by `GET /admin/profiles` (same token as a bearer):
+
+    curl -H "Authorization: Bearer $PROFILE_TOKEN" \
+        "https://slashpass.example.com/admin/profiles?verb=list&top=20"
+
+Only the request thread is profiled, the batch and refresh pools are not.
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import time
+
+from flask import Blueprint, Response, abort, g, request
+
+from environ import PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE, PROFILE_TOKEN
+
+HEADER = "X-Slashpass-Profile"
+SORT_KEYS = ("cumulative", "tottime", "calls")
+UNSAFE = re.compile(r"[^A-Za-z0-9_]")
+
+
+def _authorized(value, token):
+    return bool(token) and hmac.compare_digest(value or "", token)
+
+
+class Profiler(object):
+    """Per request profiles written to `directory`, keeping the newest
+    `keep` files."""
+
+    def selected(self, header):
+        if self.directory is None:
+            return False
+        return _authorized(header, self.token) or random.random() < self.sample
+
+    def start(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process
+            return None
+        return profile
+
+    def save(self, profile, blueprint, verb):
+        profile.disable()
+        tags = "-".join(UNSAFE.sub("_", tag or "none") for tag in (blueprint, verb))
+        name = f"{time.time_ns()}-{os.getpid()}-{tags}.prof"
+        profile.dump_stats(os.path.join(self.directory, name))
+        self._rotate()
+
+    def files(self, blueprint=None, verb=None):
+        """Saved profiles, oldest first, optionally only of a blueprint or
+        verb."""
+        paths = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".prof"):
+                continue
+            _, _, tagged_blueprint, tagged_verb = name[: -len(".prof")].split("-", 3)
+            if blueprint and tagged_blueprint != blueprint:
+                continue
+            if verb and tagged_verb != verb:
+                continue
+            paths.append(os.path.join(self.directory, name))
+        return paths
+
+    def report(self, top=20, sort="cumulative", blueprint=None, verb=None):
+        """`top` hottest functions of the matching profiles added up, as
+        printed by pstats."""
+        paths = self.files(blueprint, verb)
+        if not paths:
+            return "No profiles\n"
+        output = io.StringIO()
+        stats = pstats.Stats(stream=output)
+        loaded = 0
+        for path in paths:
+            try:
+                stats.add(path)
+            except (OSError, EOFError, ValueError):
+                # removed by another worker's rotation or still being written
+                continue
+            loaded += 1
+        output.write(f"{loaded} profiles\n")
+        stats.sort_stats(sort).print_stats(top)
+        return output.getvalue()
+
+    def _rotate(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".prof"))
+        for name in names[: max(0, len(names) - self.keep)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def __init__(
+        self,
+        directory=PROFILE_DIR,
+        sample=PROFILE_SAMPLE,
+        token=PROFILE_TOKEN,
+        keep=PROFILE_KEEP,
+    ):
+        self.directory = directory or None
+        self.sample = sample
+        self.token = token
+        self.keep = keep
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+
+profiler = Profiler()
+view = Blueprint("profiles", __name__)
+
+
+def tag(verb):
+    """Command verb or action name the current request is saved with."""
+    g.profile_verb = verb
+
+
+def install(app, profiler=profiler):
+    @app.before_request
+    def start_profile():
+        if profiler.selected(request.headers.get(HEADER)):
+            g.profile = profiler.start()
+
+    @app.teardown_request
+    def save_profile(exc):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profiler.save(profile, request.blueprint, g.get("profile_verb"))
+
+
+@view.route("", methods=["GET"])
+def report():
+    authorization = request.headers.get("Authorization", "")
+    if profiler.directory is None or not _authorized(
+        authorization, f"Bearer {profiler.token}" if profiler.token else None
+    ):
+        abort(404)
+
+    sort = request.args.get("sort", "cumulative")
+    if sort not in SORT_KEYS:
+        abort(400)
+    return Response(
+        profiler.report(
+            top=request.args.get("top", 20, type=int),
+            sort=sort,
+            blueprint=request.args.get("blueprint"),
+            verb=request.args.get("verb"),
+        ),
+        mimetype="text/plain",
+    )
@@ -0,0 +1,95 @@
+import re
+import threading
+import time
+
+TOKENS = re.compile(r"\s+")
+
+
+def tokenize(text):
+    return TOKENS.split(text.strip())
+
+
+class Command(object):
+    """Handler for one verb, `arity` is the accepted number of arguments
+    (None accepts any) and every call is timed and passed to `hooks`.
+    `needs_server` commands require a configured password server and
+    `calls_server` ones also wait for it."""
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        try:
+            return self.handler(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.calls += 1
+                self.seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+            for hook in self.hooks:
+                hook(self.name, elapsed)
+
+    def accepts(self, args):
+        return self.arity is None or len(args) in self.arity
+
+    def __init__(
+        self,
+        name,
+        handler,
+        arity=None,
+        usage=None,
+        needs_server=True,
+        calls_server=True,
+    ):
+        self.name = name
+        self.handler = handler
+        self.arity = arity
+        self.usage = usage
+        self.needs_server = needs_server
+        self.calls_server = calls_server
+        self.hooks = []
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self._lock = threading.Lock()
+
+
+class Router(object):
+    """Maps the first word of a slash command to its Command, words that
+    are not a registered verb go to the `default` command with the word as
+    its only argument."""
+
+    def command(self, *verbs, default=False, **kwargs):
+        def decorator(fn):
+            command = Command(verbs[0] if verbs else fn.__name__, fn, **kwargs)
+            for verb in verbs:
+                self.commands[verb] = command
+            if default:
+                self.default = command
+            return fn
+
+        return decorator
+
+    def resolve(self, words):
+        """Command and arguments for the tokenized `words`."""
+        command = self.commands.get(words[0])
+        if command is None:
+            return self.default, words[:1]
+        return command, words[1:]
+
+    def add_hook(self, hook):
+        for command in set(self.commands.values()):
+            command.hooks.append(hook)
+
+    def stats(self):
+        return {
+            command.name: {
+                "calls": command.calls,
+                "seconds": command.seconds,
+                "max_seconds": command.max_seconds,
+            }
+            for command in set(self.commands.values())
+        }
+
+    def __init__(self):
+        self.commands = {}
+        self.default = None
@@ -1,14 +1,21 @@
 from flask import render_template
 
 import api
+import exporter
+import profiling
 import public_key
 import slack_action
 import slack_command
 import slack_oauth
 import web
-from server import server
+from environ import SIGNING_SECRET
+from server import cache, server
+from signature import SlackSignatureMiddleware
+from tracing import TracingMiddleware, tracer
 
 server.register_blueprint(api.get_token_data, url_prefix="/t")
+server.register_blueprint(exporter.view, url_prefix="/metrics")
+server.register_blueprint(profiling.view, url_prefix="/admin/profiles")
 server.register_blueprint(public_key.view, url_prefix="/public_key")
 server.register_blueprint(slack_action.view, url_prefix="/slack/action")
 server.register_blueprint(slack_command.view, url_prefix="/slack/command")
@@ -16,6 +23,15 @@ server.register_blueprint(slack_oauth.view, url_prefix="/slack/oauth")
 server.register_blueprint(web.insert_view, url_prefix="/insert")
 server.register_blueprint(web.root_view, url_prefix="/")
 
+profiling.install(server)
+
+server.wsgi_app = TracingMiddleware(
+    SlackSignatureMiddleware(
+        server.wsgi_app, ["/slack/command", "/slack/action"], SIGNING_SECRET, cache
+    ),
+    tracer,
+)
+
 
 @server.errorhandler(404)
 def page_not_found(e):
@@ -2,17 +2,19 @@ import os
 from datetime import datetime, timezone
 from urllib.parse import urlparse, urlunparse
 
-import redis
 import requests
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from raven.contrib.flask import Sentry
-from rsa import generate_key
 
+from cache_backend import create_cache
 from core import SlashpassCMD
-from environ import BIP39, DATABASE_URL, REDIS_HOST, SENTRY_DSN
+from environ import BIP39, DATABASE_URL, KEY_FILE, KEY_SIZE, SENTRY_DSN
+from keys import load_key
+from tracing import traced
+from upstream import client
 
-secret_key = generate_key(BIP39)
+secret_key = load_key(BIP39, KEY_SIZE, KEY_FILE)
 private_key = secret_key.exportKey("PEM")
 public_key = secret_key.publickey().exportKey("PEM")
 
@@ -20,10 +22,11 @@ server = Flask(__name__)
 server.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 server.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-cache = redis.StrictRedis(host=REDIS_HOST, port=6379)
+cache = create_cache()
 sentry = Sentry(server, dsn=SENTRY_DSN)
 
 cmd = SlashpassCMD(cache, private_key)
+tokens = cmd.tokens
 db = SQLAlchemy(server)
 
 
@@ -42,11 +45,12 @@ class Team(db.Model):
     team_name = db.Column(db.String)
     url = db.Column(db.String, nullable=True)
 
+    @traced("team.register_server")
     def register_server(self, url):
         self.url = url
         try:
-            response = requests.get(self.api("public_key"))
-        except requests.exceptions.ConnectionError:
+            response = client.get(self.api("public_key"), team_id=self.id)
+        except requests.exceptions.RequestException:
             return False
 
         if response.status_code != requests.codes.ok:
@@ -0,0 +1,182 @@
+import math
+import os
+import secrets
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+PREFIX = "slashpass:flight:"
+CHANNEL = "slashpass:flights"
+# followers are woken by the leader's message, this only bounds how late
+# one published while the subscription (re)connects is noticed
+RECHECK_INTERVAL = 0.5
+
+
+class FlightTimeout(Exception):
+    """The leader of another process did not finish in time."""
+
+
+class _Call(object):
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Concurrent calls with the same key share the execution of the first
+    one. Inside a process followers wait for the leader's thread, across
+    processes the leader holds a lock in the cache and hands its result,
+    sealed with `box`, to the followers, who are notified on a pub/sub
+    channel when the flight lands.
+
+    A follower that is still waiting after `timeout` seconds raises
+    FlightTimeout rather than repeating the leader's call.
+
+    Only for idempotent reads that return bytes: every caller gets the same
+    result.
+    """
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self._count("waited")
+            return call.wait()
+
+        try:
+            call.result = self._shared(key, fn) if self.cache is not None else fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _shared(self, key, fn):
+        lock = PREFIX + key
+        deadline = time.monotonic() + self.timeout
+        ttl = math.ceil(self.timeout) + 1
+        try:
+            while time.monotonic() < deadline:
+                flight = secrets.token_hex(8)
+                if self.cache.set(lock, flight, ex=ttl, nx=True):
+                    return self._lead(lock, flight, ttl, fn)
+
+                flight = self.cache.get(lock)
+                if flight is None:
+                    continue
+                result = self._follow(lock, flight.decode(), deadline)
+                if result is not None:
+                    return result
+                # the leader failed, the next attempt may take over
+        except RedisError:
+            return fn()
+        raise FlightTimeout(f"No result for {key} after {self.timeout}s")
+
+    def _lead(self, lock, flight, ttl, fn):
+        key = f"{lock}:{flight}"
+        try:
+            result = fn()
+            self.cache.set(key, self.box.seal(result, key), ex=ttl)
+            self._count("led")
+            return result
+        except RedisError:
+            # the result was computed, only the followers have to fetch it
+            # on their own
+            return result
+        finally:
+            try:
+                # an expired lock may already belong to another leader,
+                # deleting it only costs one more upstream call
+                self.cache.delete(lock)
+                # followers check again, failed flights included
+                self.cache.publish(CHANNEL, key)
+            except RedisError:
+                pass
+
+    def _follow(self, lock, flight, deadline):
+        key = f"{lock}:{flight}"
+        self._listen()
+        landed = threading.Event()
+        with self._lock:
+            self._landings[key] = landed
+        try:
+            while True:
+                result = self.box.open(self.cache.get(key), key)
+                if result is not None:
+                    self._count("followed")
+                    return result
+                current = self.cache.get(lock)
+                if current is None or current.decode() != flight:
+                    # finished between both reads or failed
+                    result = self.box.open(self.cache.get(key), key)
+                    if result is not None:
+                        self._count("followed")
+                    return result
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise FlightTimeout(f"No result for {lock} after {self.timeout}s")
+                landed.wait(min(remaining, RECHECK_INTERVAL))
+                landed.clear()
+        finally:
+            with self._lock:
+                del self._landings[key]
+
+    def _listen(self):
+        # one subscription per process, started after the fork
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        self.cache.subscribe(CHANNEL, self._on_message, on_error=self._wake_all)
+
+    def _on_message(self, message):
+        if isinstance(message, bytes):
+            message = message.decode()
+        with self._lock:
+            landed = self._landings.get(message)
+        if landed is not None:
+            landed.set()
+
+    def _wake_all(self):
+        # messages may have been lost, every follower checks again
+        with self._lock:
+            landings = list(self._landings.values())
+        for landed in landings:
+            landed.set()
+
+    def stats(self):
+        """Calls that waited for a leader in the same process, that led a
+        flight across processes and that got the result of another
+        process."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def __init__(self, cache=None, box=None, timeout=5):
+        self.cache = cache
+        self.box = box
+        self.timeout = timeout
+        self._stats = {"waited": 0, "led": 0, "followed": 0}
+        self._calls = {}
+        self._landings = {}
+        self._listener_pid = None
+        self._lock = threading.Lock()
@@ -3,20 +3,28 @@ import json
 import validators
 from flask import Blueprint, abort, request
 
+import jobs
+import metrics
+import profiling
+import tracing
+from deferred import executor
 from environ import DEMO_SERVER
-from server import Team, db
+from team_cache import teams
+from traffic import recorder
 from utils import error, info, success, valid_slack_request
 
 view = Blueprint("slack_action", __name__)
 
+ACTIONS = ("no_configure", "no_reconfigure", "reconfigure_server", "use_demo_server")
+
 
 @view.route("", methods=["POST"])
 def action_api():
-    data = request.values.to_dict()
-    payload = json.loads(data["payload"])
     if not valid_slack_request(request):
         return abort(404)
 
+    payload = json.loads(request.values["payload"])
+
     if "actions" not in payload:
         return "not implemented"
 
@@ -25,6 +33,15 @@ def action_api():
 
     option = payload["actions"][0]
     action = option["name"]
+    recorder.action(action, payload)
+    tracing.annotate(action=action)
+    name = action if action in ACTIONS else "other"
+    profiling.tag(name)
+    with metrics.actions.labels(name).time():
+        return _dispatch(payload, action, option)
+
+
+def _dispatch(payload, action, option):
     if action == "no_configure":
         return success(
             "Sure! for more information on how the pass command "
@@ -35,12 +52,26 @@ def action_api():
     elif action == "no_reconfigure":
         return info("Password server unchanged.")
 
-    team = db.session.query(Team).filter_by(team_id=payload["team"]["id"]).first()
+    if action not in ["reconfigure_server", "use_demo_server"]:
+        return "not implemented"
 
-    if action == "reconfigure_server":
-        if not validators.url(option["value"]):
-            return error("Invalid URL format, use: https://<domain>")
+    if action == "reconfigure_server" and not validators.url(option["value"]):
+        return error("Invalid URL format, use: https://<domain>")
 
+    team_id = payload["team"]["id"]
+    if executor.enabled and "response_url" in payload:
+        args = (team_id, action, option)
+        if executor.submit(payload["response_url"], team_id, run_action, *args):
+            return info("Working on it :hourglass_flowing_sand:")
+
+    return run_action(team_id, action, option)
+
+
+@jobs.register("slack_action")
+def run_action(team_id, action, option):
+    team = teams.get(team_id=team_id)
+
+    if action == "reconfigure_server":
         return (
             success("Password server successfully updated!")
             if team.register_server(option["value"])
@@ -1,276 +1,531 @@
-import re
-
 import validators
-from flask import Blueprint, abort, jsonify, request
+from flask import Blueprint, abort, request
 
+import jobs
+import metrics
+import profiling
+import tracing
 from core import SlashpassError
-from environ import CONFIGURATION_GUIDE_URL, SLACK_SERVER
-from server import Team, cmd, db
-from utils import error, success, valid_slack_request, warning
+from deferred import executor
+from environ import BATCH_MAX_SECRETS, CONFIGURATION_GUIDE_URL, SLACK_SERVER
+from responses import Field, Template
+from router import Router, tokenize
+from server import cmd
+from team_cache import teams
+from traffic import recorder
+from utils import error, info, success, valid_slack_request, warning
 
 view = Blueprint("slack_command", __name__)
+router = Router()
 
+MAX_SECRETS = 20  # the links of more secrets overflow one attachment
+MAX_TEXT = 3000  # Slack truncates longer attachment texts
+MAX_BUTTONS = 5  # Slack shows at most 5 buttons per attachment
 
-@view.route("", methods=["POST"])
-def api():
-    data = request.values.to_dict()
-    try:
-        command = re.split("\s+", data["text"])
-        team_id = data["team_id"]
-        team_domain = data["team_domain"]
-        channel = data["channel_id"]
-    except KeyError:
-        abort(400)
 
-    # ensuring that the request comes from slack
-    if not valid_slack_request(request):
-        return abort(403)
+def _arity(max_secrets):
+    return tuple(range(1, max(1, min(max_secrets, MAX_SECRETS)) + 1))
 
-    team = db.session.query(Team).filter_by(team_id=team_id).first()
-    if not team:
-        return error(
-            "You are not registered in our proxy server, try removig the app "
-            "and adding it to slack again."
-        )
 
-    if command[0] == "help":
-        fields = [
-            {
-                "title": "`/pass` _or_ `/pass list`",
-                "value": "List the available passwords in the channel.",
-                "short": True,
-            },
+BATCH_ARITY = _arity(BATCH_MAX_SECRETS)
+
+HELP = Template(
+    {
+        "attachments": [
             {
-                "title": "`/pass <secret>` _or_ `/pass show <secret>`",
-                "value": (
-                    "Displays a one-time-use link containing the secret content. "
-                    "This link expires in 15 minutes."
-                ),
-                "short": True,
-            },
+                "fallback": ("_Usage:_ https://slashpass.co/configure"),
+                "text": "*_Usage:_*",
+                "fields": [
+                    {
+                        "title": "`/pass` _or_ `/pass list`",
+                        "value": "List the available passwords in the channel.",
+                        "short": True,
+                    },
+                    {
+                        "title": "`/pass <secret>` _or_ `/pass show <secret>`",
+                        "value": (
+                            "Displays a one-time-use link containing the secret "
+                            "content. This link expires in 15 minutes. "
+                            "`show` accepts several secrets."
+                        ),
+                        "short": True,
+                    },
+                    {
+                        "title": "`/pass insert <secret>`",
+                        "value": (
+                            "Displays a link to the editor for creating a new "
+                            "secret. This link expires in 15 minutes. "
+                            "Accepts several secrets."
+                        ),
+                        "short": True,
+                    },
+                    {
+                        "title": "`/pass remove <secret>`",
+                        "value": (
+                            "Deletes the secret from the channel. "
+                            "Accepts several secrets."
+                        ),
+                        "short": True,
+                    },
+                    {
+                        "title": (
+                            "`/pass configure <private_server_url>` _or_ "
+                            "`/pass configure`"
+                        ),
+                        "value": (
+                            "Configures the password server. "
+                            "This only needs to be executed once."
+                        ),
+                        "short": True,
+                    },
+                    {
+                        "title": "`/pass help`",
+                        "value": "Displays this dialog :robot_face:",
+                        "short": True,
+                    },
+                ],
+            }
+        ]
+    }
+)
+
+ALREADY_CONFIGURED = Template(
+    {
+        "attachments": [
             {
-                "title": "`/pass insert <secret>`",
-                "value": (
-                    "Displays a link to the editor for creating a new secret. "
-                    "This link expires in 15 minutes."
+                "fallback": "You already have a password server configured",
+                "text": (
+                    "You already have a password server configured, "
+                    "do you want to replace the current server?"
                 ),
-                "short": True,
-            },
+                "callback_id": "configure_password_server",
+                "color": "warning",
+                "actions": [
+                    {
+                        "name": "reconfigure_server",
+                        "text": "Yes",
+                        "type": "button",
+                        "value": Field("url"),
+                    },
+                    {
+                        "name": "no_reconfigure",
+                        "text": "No",
+                        "style": "danger",
+                        "type": "button",
+                        "value": "no",
+                    },
+                ],
+            }
+        ]
+    }
+)
+
+CONFIGURE_MENU = Template(
+    {
+        "attachments": [
             {
-                "title": "`/pass remove <secret>`",
-                "value": ("Deletes the secret from the channel."),
-                "short": True,
-            },
+                "fallback": Field("msg"),
+                "text": Field("msg"),
+                "color": Field("color"),
+                "callback_id": "configure_password_server",
+                "actions": [
+                    {
+                        "name": "use_demo_server",
+                        "text": "Use Test Server",
+                        "type": "button",
+                        "value": "no",
+                        "confirm": {
+                            "title": "Confirm",
+                            "text": (
+                                "You are choosing the TEST server. Any information "
+                                "stored on this server may be deleted at any time "
+                                "without prior notice."
+                            ),
+                            "ok_text": "I understand",
+                            "dismiss_text": "No",
+                        },
+                    },
+                    {
+                        "text": "Configure Private Server",
+                        "type": "button",
+                        "url": CONFIGURATION_GUIDE_URL,
+                    },
+                    {
+                        "name": "no_configure",
+                        "text": "Later",
+                        "type": "button",
+                        "value": "no",
+                    },
+                ],
+            }
+        ]
+    }
+)
+
+PASSWORD_STORE = Template(
+    {
+        "attachments": [
             {
-                "title": "`/pass configure <private_server_url>` _or_ `/pass configure`",
-                "value": (
-                    "Configures the password server. "
-                    "This only needs to be executed once."
+                "fallback": Field("dir_ls"),
+                "text": Field("text"),
+                "footer": (
+                    "Use the command `/pass <key_name>` to retrieve some of the keys"
                 ),
-                "short": True,
-            },
-            {
-                "title": "`/pass help`",
-                "value": "Displays this dialog :robot_face:",
-                "short": True,
-            },
+            }
         ]
-        return jsonify(
+    }
+)
+
+INSERT_EDITOR = Template(
+    {
+        "attachments": [
             {
-                "attachments": [
+                "fallback": Field("msg"),
+                "text": Field("msg"),
+                "footer": "This editor will be valid for 15 minutes",
+                "color": "good",
+                "actions": [
                     {
-                        "fallback": ("_Usage:_ https://slashpass.co/configure"),
-                        "text": "*_Usage:_*",
-                        "fields": fields,
+                        "text": "Open editor",
+                        "style": "primary",
+                        "type": "button",
+                        "url": Field("url"),
                     }
-                ]
+                ],
             }
-        )
+        ]
+    }
+)
 
-    if command[0] == "configure" and len(command) == 2:
-        url = command[1]
-        if not validators.url(url):
-            return error("Invalid URL format, use: https://<domain>")
-
-        if team.url:
-            msg = (
-                "You already have a password server configured, "
-                "do you want to replace the current server?"
-            )
-            return jsonify(
-                {
-                    "attachments": [
-                        {
-                            "fallback": "You already have a password server configured",
-                            "text": msg,
-                            "callback_id": "configure_password_server",
-                            "color": "warning",
-                            "actions": [
-                                {
-                                    "name": "reconfigure_server",
-                                    "text": "Yes",
-                                    "type": "button",
-                                    "value": url,
-                                },
-                                {
-                                    "name": "no_reconfigure",
-                                    "text": "No",
-                                    "style": "danger",
-                                    "type": "button",
-                                    "value": "no",
-                                },
-                            ],
-                        }
-                    ]
-                }
-            )
-
-        if not team.register_server(url):
-            return error("Unable to retrieve the _public_key_ from the server")
-
-        return success(f"{team_domain} team successfully configured!")
-
-    if command[0] == "configure" and len(command) == 1 or not team.url:
-        color = "warning"
-        if team.url:
-            msg = (
-                f"*{team.team_name}* team already have a server configured, if you want to "
-                f"swap select some of the options below"
-            )
-        elif command[0] == "configure":
-            color = "good"
-            msg = "What type of server do you want to use?"
-        else:
-            msg = (
-                f"*{team_domain}* team does not have a slashpass server configured, select "
-                f"one of the options below to start."
-            )
-
-        warning_msg = (
-            "You are choosing the TEST server. Any information stored on this server "
-            "may be deleted at any time without prior notice."
-        )
-        return jsonify(
+SECRET_LINK = Template(
+    {
+        "attachments": [
             {
-                "attachments": [
+                "fallback": Field("fallback"),
+                "text": Field("text"),
+                "footer": "This secret will be valid for 15 minutes",
+                "color": "good",
+                "actions": [
                     {
-                        "fallback": msg,
-                        "text": msg,
-                        "color": color,
-                        "callback_id": "configure_password_server",
-                        "actions": [
-                            {
-                                "name": "use_demo_server",
-                                "text": "Use Test Server",
-                                "type": "button",
-                                "value": "no",
-                                "confirm": {
-                                    "title": "Confirm",
-                                    "text": warning_msg,
-                                    "ok_text": "I understand",
-                                    "dismiss_text": "No",
-                                },
-                            },
-                            {
-                                "text": "Configure Private Server",
-                                "type": "button",
-                                "url": CONFIGURATION_GUIDE_URL,
-                            },
-                            {
-                                "name": "no_configure",
-                                "text": "Later",
-                                "type": "button",
-                                "value": "no",
-                            },
-                        ],
+                        "text": "Open secret",
+                        "style": "primary",
+                        "type": "button",
+                        "url": Field("url"),
                     }
-                ]
+                ],
             }
-        )
-    if command[0] in ["", "list"]:
-        try:
-            dir_ls = cmd.list(team, channel)
-        except SlashpassError as e:
-            return error(f"_{e.message}_")
-
-        if not dir_ls:
-            return warning(
-                "You have not created any passwords for this channel, use "
-                "`/pass insert <secret>` to create the first one!"
-            )
-
-        return jsonify(
+        ]
+    }
+)
+
+BATCH = Template(
+    {
+        "attachments": [
             {
-                "attachments": [
-                    {
-                        "fallback": dir_ls,
-                        "text": f"Password Store\n{dir_ls}",
-                        "footer": (
-                            "Use the command `/pass <key_name>` to retrieve "
-                            "some of the keys"
-                        ),
-                    }
-                ]
+                "fallback": Field("fallback"),
+                "text": Field("text"),
+                "footer": Field("footer"),
+                "color": Field("color"),
+                "actions": Field("actions"),
             }
+        ]
+    }
+)
+
+
+@view.route("", methods=["POST"])
+def api():
+    # ensuring that the request comes from slack
+    if not valid_slack_request(request):
+        return abort(403)
+
+    data = request.values.to_dict()
+    try:
+        command = tokenize(data["text"])
+        team_id = data["team_id"]
+        team_domain = data["team_domain"]
+        channel = data["channel_id"]
+    except KeyError:
+        abort(400)
+
+    handler, args = router.resolve(command)
+    recorder.command(handler.name, args, team_id, team_domain, channel)
+    tracing.annotate(verb=handler.name, team=team_id)
+    profiling.tag(handler.name)
+
+    with tracing.span("team.lookup"):
+        team = teams.get(team_id=team_id)
+    if not team:
+        return error(
+            "You are not registered in our proxy server, try removig the app "
+            "and adding it to slack again."
         )
 
-    if command[0] == "insert" and len(command) == 2:
-        app = command[1]
-        token = cmd.generate_insert_token(team, channel, app)
+    if executor.enabled and "response_url" in data and _is_slow(team, command):
+        args = (team.id, command, team_domain, channel)
+        if executor.submit(data["response_url"], team_id, run_command, *args):
+            return info("Working on it :hourglass_flowing_sand:")
 
-        msg = f"Adding password for *{app}* in this channel"
-        return jsonify(
-            {
-                "attachments": [
-                    {
-                        "fallback": msg,
-                        "text": msg,
-                        "footer": "This editor will be valid for 15 minutes",
-                        "color": "good",
-                        "actions": [
-                            {
-                                "text": "Open editor",
-                                "style": "primary",
-                                "type": "button",
-                                "url": f"{SLACK_SERVER}/insert/{token}",
-                            }
-                        ],
-                    }
-                ]
-            }
+    return _run(team, command, team_domain, channel)
+
+
+def _is_slow(team, command):
+    """Whether the command has to wait for the team's password server."""
+    handler, args = router.resolve(command)
+    if not handler.accepts(args):
+        return False
+    if handler.name == "configure":
+        return len(args) == 1 and not team.url
+    return handler.needs_server and handler.calls_server and bool(team.url)
+
+
+@jobs.register("slack_command")
+def run_command(team_pk, command, team_domain, channel):
+    team = teams.get(id=team_pk)
+    return _run(team, command, team_domain, channel)
+
+
+def _run(team, command, team_domain, channel):
+    handler, args = router.resolve(command)
+    if handler.needs_server and not team.url:
+        return configure_menu(team, team_domain, default=False)
+    if not handler.accepts(args):
+        return warning(f"Usage: `{handler.usage}`")
+    return handler(team, args, team_domain, channel)
+
+
+@router.command("help", arity=(0,), usage="/pass help", needs_server=False)
+def show_help(team, args, team_domain, channel):
+    return HELP.render()
+
+
+@router.command(
+    "configure",
+    arity=(0, 1),
+    usage="/pass configure <private_server_url>",
+    needs_server=False,
+)
+def configure(team, args, team_domain, channel):
+    if not args:
+        return configure_menu(team, team_domain)
+
+    url = args[0]
+    if not validators.url(url):
+        return error("Invalid URL format, use: https://<domain>")
+
+    if team.url:
+        return ALREADY_CONFIGURED.render(url=url)
+
+    if not team.register_server(url):
+        return error("Unable to retrieve the _public_key_ from the server")
+
+    return success(f"{team_domain} team successfully configured!")
+
+
+def configure_menu(team, team_domain, default=True):
+    color = "warning"
+    if team.url:
+        msg = (
+            f"*{team.team_name}* team already have a server configured, if you want to "
+            f"swap select some of the options below"
+        )
+    elif default:
+        color = "good"
+        msg = "What type of server do you want to use?"
+    else:
+        msg = (
+            f"*{team_domain}* team does not have a slashpass server configured, select "
+            f"one of the options below to start."
         )
+    return CONFIGURE_MENU.render(msg=msg, color=color)
 
-    if command[0] == "remove" and len(command) == 2:
-        app = command[1]
-        if cmd.remove(team, channel, app):
-            return success(f"The secret *{app}* was removed successfully.")
+
+@router.command("list", "", arity=(0,), usage="/pass list")
+def list_secrets(team, args, team_domain, channel):
+    try:
+        dir_ls = cmd.list(team, channel)
+    except SlashpassError as e:
+        return error(f"_{e.message}_")
+
+    if not dir_ls:
         return warning(
-            f"Looks like the secret *{app}* is not in your repository "
-            f":thinking_face: use the command `/pass list` "
+            "You have not created any passwords for this channel, use "
+            "`/pass insert <secret>` to create the first one!"
+        )
+
+    with tracing.span("format"):
+        return PASSWORD_STORE.render(dir_ls=dir_ls, text=f"Password Store\n{dir_ls}")
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _truncate(lines, limit=MAX_TEXT):
+    """Lines joined within `limit` characters, whole lines are dropped from
+    the end and counted in a last one."""
+    text = "\n".join(lines)
+    if len(text) <= limit:
+        return text
+    budget = limit - len(f"\n_{len(lines)} more not shown_")
+    kept = []
+    for line in lines:
+        budget -= len(line) + 1
+        if budget < 0:
+            break
+        kept.append(line)
+    if not kept:
+        return text[: limit - 1] + "…"
+    return "\n".join(kept + [f"_{len(lines) - len(kept)} more not shown_"])
+
+
+def _batch(text, links, footer, notes=(), color="good"):
+    """Single attachment for the result of a command over several secrets,
+    links are buttons while they fit and a list in the text otherwise."""
+    lines = [text] if text else []
+    actions = []
+    if len(links) <= MAX_BUTTONS:
+        actions = [
+            {"text": name, "style": "primary", "type": "button", "url": url}
+            for name, url in links
+        ]
+    else:
+        lines += [f"• <{url}|{_escape(name)}>" for name, url in links]
+    lines += notes
+    return BATCH.render(
+        fallback=_truncate(lines[:1] + [f"{name}: {url}" for name, url in links]),
+        text=_truncate(lines),
+        footer=footer if links else "",
+        color=color if links else "warning",
+        actions=actions,
+    )
+
+
+def _names(apps):
+    return ", ".join(f"*{app}*" for app in apps)
+
+
+# the editor links only need Redis, they are never deferred
+@router.command(
+    "insert",
+    arity=BATCH_ARITY,
+    usage="/pass insert <secret> [<secret> ...]",
+    calls_server=False,
+)
+def insert(team, args, team_domain, channel):
+    if len(args) > 1:
+        tokens = cmd.generate_insert_tokens(team, channel, args)
+        return _batch(
+            f"Adding passwords for {_names(args)} in this channel",
+            [
+                (app, f"{SLACK_SERVER}/insert/{token}")
+                for app, token in zip(args, tokens)
+            ],
+            footer="These editors will be valid for 15 minutes",
+        )
+
+    app = args[0]
+    token = cmd.generate_insert_token(team, channel, app)
+
+    return INSERT_EDITOR.render(
+        msg=f"Adding password for *{app}* in this channel",
+        url=f"{SLACK_SERVER}/insert/{token}",
+    )
+
+
+@router.command(
+    "remove", arity=BATCH_ARITY, usage="/pass remove <secret> [<secret> ...]"
+)
+def remove(team, args, team_domain, channel):
+    if len(args) > 1:
+        return _remove_many(team, args, channel)
+
+    app = args[0]
+    try:
+        removed = cmd.remove(team, channel, app)
+    except SlashpassError as e:
+        return error(f"_{e.message}_")
+
+    if removed:
+        return success(f"The secret *{app}* was removed successfully.")
+    return warning(
+        f"Looks like the secret *{app}* is not in your repository "
+        f":thinking_face: use the command `/pass list` "
+        f"to verify your storage."
+    )
+
+
+def _remove_many(team, apps, channel):
+    results = cmd.remove_many(team, channel, apps)
+    removed = [app for app, result in zip(apps, results) if result is True]
+    failed = [
+        f"*{app}*: _{result.message}_"
+        for app, result in zip(apps, results)
+        if isinstance(result, SlashpassError)
+    ]
+    missing = [app for app, result in zip(apps, results) if result is False]
+
+    lines = []
+    if removed:
+        lines.append(f"The secrets {_names(removed)} were removed successfully.")
+    if missing:
+        lines.append(
+            f"{_names(missing)} not found, use the command `/pass list` "
             f"to verify your storage."
         )
+    lines += failed
+    if not (missing or failed):
+        return success("\n".join(lines))
+    if removed:
+        return warning("\n".join(lines))
+    return error("\n".join(lines))
 
-    app = command[1] if command[0] == "show" and len(command) == 2 else command[0]
-    if onetime_link := cmd.show(team, channel, app):
-        return jsonify(
-            {
-                "attachments": [
-                    {
-                        "fallback": f"Password: {onetime_link}",
-                        "text": f"Password for *{app}*",
-                        "footer": "This secret will be valid for 15 minutes",
-                        "color": "good",
-                        "actions": [
-                            {
-                                "text": "Open secret",
-                                "style": "primary",
-                                "type": "button",
-                                "url": onetime_link,
-                            }
-                        ],
-                    }
-                ]
-            }
+
+@router.command(
+    "show",
+    default=True,
+    arity=BATCH_ARITY,
+    usage="/pass show <secret> [<secret> ...]",
+)
+def show(team, args, team_domain, channel):
+    if len(args) > 1:
+        return _show_many(team, args, channel)
+
+    app = args[0]
+    try:
+        onetime_link = cmd.show(team, channel, app)
+    except SlashpassError as e:
+        return error(f"_{e.message}_")
+
+    if onetime_link:
+        return SECRET_LINK.render(
+            fallback=f"Password: {onetime_link}",
+            text=f"Password for *{app}*",
+            url=onetime_link,
         )
     else:
         return warning(f"*{app}* is not in the password store.")
+
+
+def _show_many(team, apps, channel):
+    results = cmd.show_many(team, channel, apps)
+    links = [(app, link) for app, link in zip(apps, results) if isinstance(link, str)]
+    notes = [
+        (
+            f"*{app}*: _{result.message}_"
+            if isinstance(result, SlashpassError)
+            else f"*{app}* is not in the password store."
+        )
+        for app, result in zip(apps, results)
+        if not isinstance(result, str)
+    ]
+    return _batch(
+        f"Passwords for {_names(app for app, _ in links)}" if links else "",
+        links,
+        footer="These secrets will be valid for 15 minutes",
+        notes=notes,
+        color="good" if not notes else "warning",
+    )
+
+
+router.add_hook(lambda verb, seconds: metrics.commands.labels(verb).observe(seconds))
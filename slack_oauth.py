@@ -3,8 +3,14 @@ from urllib.parse import urlencode
 import requests
 from flask import Blueprint, abort, render_template, request
 
-from environ import SLACK_CLIENT_ID, SLACK_CLIENT_SECRET, SUCCESS_PAGE
+from environ import (
+    SLACK_CLIENT_ID,
+    SLACK_CLIENT_SECRET,
+    SUCCESS_PAGE,
+    UPSTREAM_TIMEOUT,
+)
 from server import Team, db, sentry
+from team_cache import teams
 
 view = Blueprint("slack_oauth", __name__)
 
@@ -24,7 +30,11 @@ def slack_oauth():
             }
         ),
     )
-    response = requests.get(oauth_access_url).json()
+    try:
+        response = requests.get(oauth_access_url, timeout=UPSTREAM_TIMEOUT).json()
+    except requests.exceptions.RequestException:
+        sentry.captureException()
+        abort(504)
 
     if not response.get("ok", False):
         sentry.captureMessage(response)
@@ -42,7 +52,7 @@ def slack_oauth():
     team_id = response["team"]["id"]
     team_name = response["team"]["name"]
 
-    if not db.session.query(Team).filter_by(team_id=team_id).first():
+    if not teams.get(team_id=team_id):
         new_team = Team(
             access_token=access_token,
             authed_user=authed_user,
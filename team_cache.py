@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from environ import TEAM_CACHE_SIZE, TEAM_CACHE_TTL
+from server import Team, cache, db
+
+CHANNEL = "slashpass:teams:invalidate"
+
+logger = logging.getLogger(__name__)
+
+
+class TeamSnapshot(namedtuple("TeamSnapshot", Team.__table__.columns.keys())):
+    """Read only copy of a Team row, safe to share between requests."""
+
+    __slots__ = ()
+
+    api = Team.api
+
+    def register_server(self, url):
+        return db.session.get(Team, self.id).register_server(url)
+
+    @classmethod
+    def from_model(cls, team):
+        return cls(*(getattr(team, field) for field in cls._fields))
+
+
+class TeamCache(object):
+    """LRU of TeamSnapshot by `team_id` and primary key with a TTL. Every
+    process drops its copy when any of them commits a change to the team
+    (broadcast over Redis pub/sub)."""
+
+    def get(self, **filters):
+        """Same as `Team.query.filter_by(**filters).first()` for `id` or
+        `team_id`, returns the Team model itself when caching is disabled."""
+        if not self.ttl:
+            return db.session.query(Team).filter_by(**filters).first()
+
+        self._listen()
+        key = next(iter(filters.items()))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        team = db.session.query(Team).filter_by(**filters).first()
+        if team is None:
+            return None
+
+        snapshot = TeamSnapshot.from_model(team)
+        with self._lock:
+            for key in (("id", snapshot.id), ("team_id", snapshot.team_id)):
+                self._entries[key] = (now + self.ttl, snapshot)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return snapshot
+
+    def invalidate(self, id, team_id):
+        with self._lock:
+            self._entries.pop(("id", id), None)
+            self._entries.pop(("team_id", team_id), None)
+            self.invalidations += 1
+
+    def publish(self, id, team_id):
+        self.invalidate(id, team_id)
+        if not self.ttl:
+            return
+        try:
+            cache.publish(CHANNEL, json.dumps([id, team_id]))
+        except RedisError:
+            # other processes keep their copy until the TTL expires
+            logger.exception("Unable to publish team invalidation")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _listen(self):
+        # one subscription per process, started after the fork
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._entries.clear()
+            self._listener_pid = os.getpid()
+        # snapshots published while disconnected may be stale
+        cache.subscribe(CHANNEL, self._on_message, on_error=self.clear)
+
+    def _on_message(self, message):
+        self.invalidate(*json.loads(message))
+
+    def __init__(self, ttl=TEAM_CACHE_TTL, size=TEAM_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+
+teams = TeamCache()
+
+
+@event.listens_for(Team, "after_insert")
+@event.listens_for(Team, "after_update")
+def _team_changed(mapper, connection, team):
+    session = Session.object_session(team)
+    session.info.setdefault("changed_teams", set()).add((team.id, team.team_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    for id, team_id in session.info.pop("changed_teams", ()):
+        teams.publish(id, team_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("changed_teams", None)
@@ -0,0 +1,37 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from benchmarks.suite import ENVIRONMENT, compare, document, offline
+
+
+def test_compare():
+    baseline = {"list": 1.0, "show": 1.0, "removed case": 1.0}
+    results = {"list": 1.3, "show": 1.2, "new case": 9.0}
+
+    assert compare(results, baseline, tolerance=0.25) == [("list", 1.0, 1.3)]
+    assert compare(results, baseline, tolerance=0.5) == []
+
+
+def test_document():
+    data = document({"list": 0.001})
+
+    assert data["results"] == {"list": 0.001}
+    assert {"python", "machine"} <= set(data)
+
+
+def test_offline_overrides_the_shell():
+    environment = {"DATABASE_URL": "postgresql://prod/slashpass"}
+    with patch.dict(os.environ, environment), patch.dict(sys.modules):
+        sys.modules.pop("server", None)
+        offline()
+
+        assert {key: os.environ[key] for key in ENVIRONMENT} == ENVIRONMENT
+
+
+def test_offline_after_the_application_import():
+    with patch.dict(sys.modules, {"server": object()}):
+        with pytest.raises(RuntimeError):
+            offline()
@@ -0,0 +1,267 @@
+import re
+import socket
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+import redis
+
+from cache_backend import (
+    CacheBackend,
+    MemoryBackend,
+    RedisBackend,
+    create_cache,
+    nodes,
+    redis_client,
+)
+
+
+def test_incomplete_backend_fails_on_construction():
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+def test_memory_get_set_delete():
+    cache = MemoryBackend()
+
+    assert cache.set("key", "value")
+    assert cache.get("key") == b"value"
+    cache.delete("key")
+    assert cache.get("key") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "expired": 0}
+
+
+def test_memory_set_nx():
+    cache = MemoryBackend()
+
+    assert cache.set("key", b"first", nx=True)
+    assert not cache.set("key", b"second", nx=True)
+    assert cache.get("key") == b"first"
+
+
+def test_memory_set_if():
+    cache = MemoryBackend()
+
+    assert cache.set_if("key", "first", "guard", "")
+    cache.set("guard", "g1")
+    assert not cache.set_if("key", "second", "guard", "")
+    assert cache.set_if("key", "third", "guard", "g1", ex=10)
+    assert cache.get("key") == b"third"
+
+
+def test_redis_set_if():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    cache = RedisBackend(fakeredis.FakeStrictRedis())
+
+    assert cache.set_if("key", b"first", "guard", "")
+    cache.set("guard", "g1")
+    assert not cache.set_if("key", b"second", "guard", "")
+    assert cache.set_if("key", b"third", "guard", "g1", ex=10)
+    assert cache.get("key") == b"third"
+    assert 0 < cache.redis.ttl("key") <= 10
+
+
+def test_memory_set_many():
+    cache = MemoryBackend()
+    cache.set("taken", b"0")
+
+    stored = cache.set_many([("new", b"1"), ("taken", b"2")], ex=60, nx=True)
+
+    assert stored == [True, False]
+    assert cache.get("taken") == b"0"
+
+
+def test_memory_expiry():
+    cache = MemoryBackend()
+
+    with patch("cache_backend.time.monotonic", return_value=100):
+        cache.set("short", b"1", ex=10)
+        cache.set("long", b"2", ex=60)
+        cache.set("forever", b"3")
+
+    with patch("cache_backend.time.monotonic", return_value=110):
+        assert cache.get("short") is None
+        assert cache.get("long") == b"2"
+        assert cache.get("forever") == b"3"
+        assert cache.set("short", b"again", nx=True)
+        assert cache.stats()["expired"] == 1
+
+
+def test_memory_overwrite_keeps_new_expiry():
+    cache = MemoryBackend()
+
+    with patch("cache_backend.time.monotonic", return_value=100):
+        cache.set("key", b"old", ex=10)
+        cache.set("key", b"new", ex=60)
+
+    with patch("cache_backend.time.monotonic", return_value=120):
+        assert cache.get("key") == b"new"
+        assert cache.stats()["expired"] == 0
+
+
+def test_memory_publish():
+    cache = MemoryBackend()
+    callback = MagicMock()
+
+    cache.subscribe("channel", callback)
+    cache.publish("channel", "message")
+    cache.publish("other", "ignored")
+
+    callback.assert_called_once_with("message")
+
+
+def test_redis_get_counts_hits():
+    client = redis_client()
+    client.get = MagicMock(side_effect=[b"value", None])
+    client.info = MagicMock(return_value={"expired_keys": 7})
+    cache = RedisBackend(client)
+
+    assert cache.get("key") == b"value"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"]) == (1, 1, 7)
+    client.info.assert_called_once_with("stats")
+
+
+def test_redis_stats_unavailable():
+    client = redis_client()
+    client.info = MagicMock(side_effect=redis.exceptions.ConnectionError)
+    cache = RedisBackend(client)
+
+    assert cache.stats()["expired"] is None
+
+
+def test_redis_set():
+    client = MagicMock()
+    client.set.return_value = None
+    cache = RedisBackend(client)
+
+    assert not cache.set("key", b"value", ex=60, nx=True)
+    client.set.assert_called_once_with("key", b"value", ex=60, nx=True)
+
+
+def test_create_cache():
+    assert isinstance(create_cache("memory"), MemoryBackend)
+    assert isinstance(create_cache("redis", host="cache"), RedisBackend)
+    with pytest.raises(ValueError):
+        create_cache("memcached")
+
+
+def test_redis_set_many_pipeline():
+    client = MagicMock()
+    client.pipeline.return_value.execute.return_value = [True, None]
+    cache = RedisBackend(client)
+
+    stored = cache.set_many([("a", b"1"), ("b", b"2")], ex=60, nx=True)
+
+    assert stored == [True, False]
+    client.pipeline.assert_called_once_with(transaction=False)
+    assert client.pipeline.return_value.set.call_count == 2
+    client.set.assert_not_called()
+
+
+def test_nodes():
+    assert list(nodes("a:26379, b:26380,")) == [("a", 26379), ("b", 26380)]
+    assert list(nodes("")) == []
+
+
+def test_redis_client_standalone():
+    client = redis_client(
+        host="cache", port=6380, max_connections=8, health_check_interval=10
+    )
+    kwargs = client.connection_pool.connection_kwargs
+
+    assert (kwargs["host"], kwargs["port"]) == ("cache", 6380)
+    assert kwargs["health_check_interval"] == 10
+    assert client.connection_pool.max_connections == 8
+
+
+def test_redis_client_unix_socket():
+    client = redis_client(socket="/run/redis.sock")
+
+    assert client.connection_pool.connection_kwargs["path"] == "/run/redis.sock"
+
+
+def test_redis_client_sentinel():
+    client = redis_client(
+        mode="sentinel", startup_nodes="s1:26379,s2:26379", service="cache"
+    )
+
+    assert client.connection_pool.service_name == "cache"
+    sentinels = client.connection_pool.sentinel_manager.sentinels
+    assert [s.connection_pool.connection_kwargs["host"] for s in sentinels] == [
+        "s1",
+        "s2",
+    ]
+
+
+def test_redis_client_unknown_mode():
+    with pytest.raises(ValueError):
+        redis_client(mode="proxy")
+
+
+# handshake replies, redis-py 5 pings and 6+ negotiates RESP3 with HELLO
+REPLIES = {b"HELLO": b"%1\r\n+proto\r\n:3\r\n", b"PING": b"+PONG\r\n"}
+
+
+@pytest.fixture
+def fake_redis():
+    """Port of a server completing the handshake and answering OK to any
+    other command."""
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def serve(connection):
+        with connection:
+            while data := connection.recv(65536):
+                for command in re.split(rb"(?:^|\r\n)(?=\*)", data):
+                    if command:
+                        connection.sendall(
+                            REPLIES.get(command.split(b"\r\n")[2], b"+OK\r\n")
+                        )
+
+    def accept():
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve, args=(connection,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield server.getsockname()[1]
+    server.close()
+
+
+def test_redis_connections(fake_redis):
+    cache = RedisBackend(redis_client(port=fake_redis, max_connections=4))
+    pool = cache.redis.connection_pool
+
+    in_use = [pool.get_connection(), pool.get_connection(), pool.get_connection()]
+    pool.release(in_use.pop())
+
+    assert cache.connections() == {
+        "max": 4,
+        "created": 3,
+        "in_use": 2,
+        "available": 1,
+        "saturation": 0.5,
+    }
+
+
+def test_redis_connections_unknown_pool():
+    cache = RedisBackend(redis_client(max_connections=4))
+    pool = MagicMock(spec=["max_connections"], max_connections=4)
+
+    with patch.object(cache, "_pools", return_value=[pool]):
+        assert cache.connections() == {
+            "max": 4,
+            "created": None,
+            "in_use": None,
+            "available": None,
+            "saturation": None,
+        }
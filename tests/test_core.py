@@ -1,10 +1,14 @@
-import pickle
-from unittest.mock import MagicMock, patch
+import threading
+import time
+from unittest.mock import ANY, MagicMock, patch
 
 import pytest
+import requests
 from rsa import encrypt, generate_key
 
+from cache_backend import MemoryBackend
 from core import SlashpassCMD, SlashpassError
+from tokens import PREFIX, InsertToken, encode
 
 secret_key = generate_key("test+key")
 
@@ -39,7 +43,7 @@ def test_list_success(slashpass, mock_team):
     decrypted_data = f"{channel}/app1\n{channel}/app2"
     encrypted_data = encrypt(decrypted_data, public_key)
 
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.text = encrypted_data
         mock_post.return_value.status_code = 200
 
@@ -47,15 +51,160 @@ def test_list_success(slashpass, mock_team):
 
         assert "├─ app1" in result
         assert "└─ app2" in result
-        mock_post.assert_called_once_with(mock_team.api(f"list/{channel}"))
+        mock_post.assert_called_once_with(
+            mock_team.api(f"list/{channel}"), stream=True, timeout=ANY
+        )
+
+
+def test_list_streaming(mock_cache, mock_team):
+    slashpass = SlashpassCMD(cache=mock_cache, private_key=private_key, streaming=True)
+    channel = "test_channel"
+    encrypted_data = encrypt(f"{channel}/app1\n{channel}/app2", public_key)
+    blocks = [encrypted_data[i : i + 100] for i in range(0, len(encrypted_data), 100)]
+
+    with patch("requests.Session.post") as mock_post:
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.iter_content.return_value = iter(blocks)
+
+        result = slashpass.list(mock_team, channel)
+
+        assert "├─ app1" in result
+        assert "└─ app2" in result
+        mock_post.assert_called_once_with(
+            mock_team.api(f"list/{channel}"), stream=True, timeout=ANY
+        )
+
+
+def test_list_coalescing(mock_team):
+    slashpass = SlashpassCMD(
+        cache=MemoryBackend(), private_key=private_key, coalescing=True
+    )
+    channel = "test_channel"
+
+    with patch("requests.Session.post") as mock_post:
+        mock_post.return_value.text = encrypt(f"{channel}/app1", public_key)
+        mock_post.return_value.status_code = 200
+
+        assert slashpass.list(mock_team, channel) == "└─ app1"
+        assert slashpass.flights.stats()["led"] == 1
+
+
+@pytest.fixture
+def cached(mock_team):
+    slashpass = SlashpassCMD(
+        cache=MemoryBackend(), private_key=private_key, listing_ttl=10
+    )
+    slashpass.listings.set(mock_team.id, "test_channel", b"test_channel/cached", "")
+    return slashpass
+
+
+def test_list_cached(cached, mock_team):
+    with patch("requests.Session.post") as mock_post:
+        assert cached.list(mock_team, "test_channel") == "└─ cached"
+
+    mock_post.assert_not_called()
+
+
+def test_list_stale_refreshes_in_background(cached, mock_team):
+    channel = "test_channel"
+
+    with patch("requests.Session.post") as mock_post, patch(
+        "listing_cache.time.time", return_value=time.time() + 11
+    ):
+        mock_post.return_value.text = encrypt(f"{channel}/fresh", public_key)
+        mock_post.return_value.status_code = 200
+
+        assert cached.list(mock_team, channel) == "└─ cached"
+        cached.pool.shutdown(wait=True)
+
+    assert cached.list(mock_team, channel) == "└─ fresh"
+    mock_post.assert_called_once()
+
+
+def test_remove_invalidates_listing(cached, mock_team):
+    with patch("requests.Session.post") as mock_post:
+        mock_post.return_value.status_code = 200
+        cached.remove(mock_team, "test_channel", "cached")
+
+    assert cached.listings.get(mock_team.id, "test_channel") is None
+
+
+def test_remove_during_refresh(cached, mock_team):
+    channel = "test_channel"
+
+    def post(url, **kwargs):
+        if url.endswith("/remove"):
+            return MagicMock(status_code=200)
+        # the app is removed while its listing is being fetched
+        assert cached.remove(mock_team, channel, "cached")
+        return MagicMock(status_code=200, text=encrypt(f"{channel}/cached", public_key))
+
+    with patch("requests.Session.post", side_effect=post), patch(
+        "listing_cache.time.time", return_value=time.time() + 11
+    ):
+        assert cached.list(mock_team, channel) == "└─ cached"
+        cached.pool.shutdown(wait=True)
+
+    assert cached.listings.get(mock_team.id, channel) is None
+
+
+def test_remove_during_coalesced_fetch(mock_team):
+    slashpass = SlashpassCMD(
+        cache=MemoryBackend(), private_key=private_key, listing_ttl=10, coalescing=True
+    )
+    channel = "test_channel"
+    started = threading.Event()
+    release = threading.Event()
+
+    def post(url, **kwargs):
+        if url.endswith("/remove"):
+            return MagicMock(status_code=200)
+        if not started.is_set():
+            # the first fetch answers with the listing from before the remove
+            started.set()
+            release.wait(5)
+            text = f"{channel}/removed\n{channel}/kept"
+        else:
+            text = f"{channel}/kept"
+        return MagicMock(status_code=200, text=encrypt(text, public_key))
+
+    results = []
+    with patch("requests.Session.post", side_effect=post):
+        first = threading.Thread(
+            target=lambda: results.append(slashpass.list(mock_team, channel))
+        )
+        first.start()
+        started.wait(5)
+        assert slashpass.remove(mock_team, channel, "removed")
+        # misses after the remove must not join the flight started before it
+        assert slashpass.list(mock_team, channel) == "└─ kept"
+        release.set()
+        first.join(5)
+
+    assert results == ["├─ removed\n└─ kept"]
+    assert slashpass.listings.get(mock_team.id, channel) == (
+        f"{channel}/kept".encode(),
+        True,
+    )
+
+
+def test_insert_invalidates_listing(cached, mock_team):
+    token = cached.generate_insert_token(mock_team, "test_channel", "new")
+
+    with patch("requests.Session.post") as mock_post:
+        mock_post.return_value.status_code = 200
+        cached.insert(token, "secret")
+
+    assert cached.listings.get(mock_team.id, "test_channel") is None
 
 
 def test_list_decryption_error(slashpass, mock_team):
     channel = "test_channel"
 
     # Mock the response from `requests.post`
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.text = "invalid encrypted data"
+        mock_post.return_value.status_code = 200
 
         with pytest.raises(SlashpassError, match="Decryption error"):
             slashpass.list(mock_team, channel)
@@ -75,11 +224,11 @@ def test_generate_insert_token(slashpass, mock_cache, mock_team):
 def test_insert_success(slashpass, mock_cache):
     token = "ABC123"
     secret = "supersecret"
-    mock_cache.__getitem__.return_value = pickle.dumps(
-        {"path": "test_channel/app", "url": "https://example.com/insert"}
+    mock_cache.get.return_value = encode(
+        InsertToken("test_channel/app", "team123", "https://example.com/insert")
     )
 
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.status_code = 200
 
         slashpass.insert(token, secret)
@@ -87,36 +236,51 @@ def test_insert_success(slashpass, mock_cache):
         mock_post.assert_called_once_with(
             "https://example.com/insert",
             data={"path": "test_channel/app", "secret": secret},
+            stream=True,
+            timeout=ANY,
         )
-        mock_cache.delete.assert_called_once_with(token)
+        mock_cache.delete.assert_called_once_with(PREFIX + token)
 
 
 def test_insert_error(slashpass, mock_cache):
     token = "ABC123"
     secret = "supersecret"
-    mock_cache.__getitem__.return_value = pickle.dumps(
-        {"path": "test_channel/app", "url": "https://example.com/insert"}
+    mock_cache.get.return_value = encode(
+        InsertToken("test_channel/app", "team123", "https://example.com/insert")
     )
 
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.status_code = 500
 
         with pytest.raises(SlashpassError, match="Error 500"):
             slashpass.insert(token, secret)
 
 
+def test_insert_expired_token(slashpass, mock_cache):
+    mock_cache.get.return_value = None
+
+    with patch("requests.Session.post") as mock_post:
+        with pytest.raises(SlashpassError, match="expired"):
+            slashpass.insert("ABC123", "supersecret")
+
+        mock_post.assert_not_called()
+
+
 def test_remove_success(slashpass, mock_team):
     channel = "test_channel"
     app = "test_app"
 
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.status_code = 200
 
         result = slashpass.remove(mock_team, channel, app)
 
         assert result is True
         mock_post.assert_called_once_with(
-            mock_team.api("remove"), data={"channel": channel, "app": app}
+            mock_team.api("remove"),
+            data={"channel": channel, "app": app},
+            stream=True,
+            timeout=ANY,
         )
 
 
@@ -124,7 +288,7 @@ def test_remove_failure(slashpass, mock_team):
     channel = "test_channel"
     app = "test_app"
 
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.status_code = 400
 
         result = slashpass.remove(mock_team, channel, app)
@@ -132,13 +296,21 @@ def test_remove_failure(slashpass, mock_team):
         assert result is False
 
 
+def test_remove_connection_error(slashpass, mock_team):
+    with patch("requests.Session.post") as mock_post:
+        mock_post.side_effect = requests.exceptions.ConnectTimeout()
+
+        with pytest.raises(SlashpassError, match="Timeout"):
+            slashpass.remove(mock_team, "test_channel", "test_app")
+
+
 def test_show_success(slashpass, mock_team):
     channel = "test_channel"
     app = "test_app"
     decrypted_data = "onetime link"
     encrypted_data = encrypt(decrypted_data, public_key)
 
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.text = encrypted_data
         mock_post.return_value.status_code = 200
 
@@ -151,7 +323,7 @@ def test_show_not_found(slashpass, mock_team):
     channel = "test_channel"
     app = "test_app"
 
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.status_code = 404
 
         result = slashpass.show(mock_team, channel, app)
@@ -163,8 +335,55 @@ def test_show_unexpected_error(slashpass, mock_team):
     channel = "test_channel"
     app = "test_app"
 
-    with patch("requests.post") as mock_post:
+    with patch("requests.Session.post") as mock_post:
         mock_post.return_value.status_code = 500
 
         with pytest.raises(SlashpassError, match="Unexpected error"):
             slashpass.show(mock_team, channel, app)
+
+
+def test_show_many_fan_out(slashpass, mock_team):
+    def post(url, data, **kwargs):
+        response = MagicMock()
+        app = data["secret"].split("/")[1]
+        response.status_code = {"found": 200, "missing": 404}.get(app, 500)
+        response.text = encrypt(f"link {app}", public_key)
+        return response
+
+    with patch("requests.Session.post", side_effect=post):
+        found, missing, failed = slashpass.show_many(
+            mock_team, "test_channel", ["found", "missing", "broken"]
+        )
+
+    assert found == "link found"
+    assert missing is None
+    assert isinstance(failed, SlashpassError)
+
+
+def test_remove_many(slashpass, mock_team):
+    with patch("requests.Session.post") as mock_post:
+        mock_post.return_value.status_code = 200
+
+        result = slashpass.remove_many(mock_team, "test_channel", ["a", "b"])
+
+    assert result == [True, True]
+    assert mock_post.call_count == 2
+
+
+def test_batch_deadline(slashpass, mock_team):
+    def post(url, data, **kwargs):
+        if data["app"].startswith("slow"):
+            time.sleep(0.5)
+        return MagicMock(status_code=200)
+
+    slashpass.batch_timeout = 0.2
+    apps = ["fast", "slow1", "slow2", "slow3", "slow4", "late"]
+    start = time.monotonic()
+    with patch("requests.Session.post", side_effect=post):
+        results = slashpass.remove_many(mock_team, "test_channel", apps)
+
+    assert time.monotonic() - start < 0.4
+    assert results[0] is True
+    assert all(isinstance(result, SlashpassError) for result in results[1:])
+    assert results[-1].message.startswith("Timeout")
+    slashpass.pool.shutdown(wait=True)
@@ -0,0 +1,97 @@
+import pytest
+from Crypto.PublicKey import RSA
+from rsa import encrypt, generate_key
+
+from crypto import Decryptor, SecretBox
+
+secret_key = generate_key("test+key")
+
+private_key = secret_key.exportKey("PEM")
+public_key = secret_key.publickey().exportKey("PEM")
+
+
+@pytest.fixture
+def payload():
+    return b"".join(encrypt(f"channel/app{i}\n", public_key) for i in range(8))
+
+
+def test_decrypt_chunks_serial(payload):
+    decryptor = Decryptor(private_key, workers=0)
+
+    result = decryptor.decrypt_chunks(payload.decode())
+
+    assert result == b"".join(f"channel/app{i}\n".encode() for i in range(8))
+
+
+def test_decrypt_chunks_parallel(payload):
+    decryptor = Decryptor(private_key, workers=2, threshold=0)
+    try:
+        result = decryptor.decrypt_chunks(payload.decode())
+    finally:
+        decryptor.shutdown()
+
+    assert result == Decryptor(private_key, workers=0).decrypt_chunks(payload)
+
+
+def test_decrypt_chunks_parallel_error(payload):
+    decryptor = Decryptor(private_key, workers=2, threshold=0)
+    corrupted = payload.decode()[:-344] + "x" * 344
+    try:
+        result = decryptor.decrypt_chunks(corrupted)
+    finally:
+        decryptor.shutdown()
+
+    assert result is None
+
+
+def test_decrypt_chunks_below_threshold_skips_pool(payload):
+    decryptor = Decryptor(private_key, workers=2, threshold=len(payload) + 1)
+
+    assert decryptor.decrypt_chunks(payload.decode()) is not None
+    assert decryptor._pool is None
+
+
+def test_decrypt_stream_unaligned_blocks(payload):
+    decryptor = Decryptor(private_key, workers=0)
+    blocks = [payload[i : i + 100] for i in range(0, len(payload), 100)]
+
+    assert decryptor.decrypt_stream(blocks) == decryptor.decrypt_chunks(payload)
+
+
+def test_decrypt_stream_error(payload):
+    decryptor = Decryptor(private_key, workers=0)
+
+    assert decryptor.decrypt_stream([payload[:344], b"x" * 344]) is None
+
+
+def test_decrypt_chunks_3072_bits_key():
+    key = RSA.generate(3072)
+    public = key.publickey().exportKey("PEM")
+    payload = b"".join(encrypt(f"channel/app{i}\n", public) for i in range(3))
+
+    decryptor = Decryptor(key.exportKey("PEM"), workers=0)
+
+    assert decryptor.chunk_size == 512
+    assert (
+        decryptor.decrypt_chunks(payload)
+        == b"channel/app0\nchannel/app1\nchannel/app2\n"
+    )
+
+
+def test_secret_box_roundtrip():
+    box = SecretBox(RSA.importKey(private_key))
+
+    sealed = box.seal(b"channel/app", "list:1:C1")
+
+    assert b"channel/app" not in sealed
+    assert box.open(sealed, "list:1:C1") == b"channel/app"
+
+
+def test_secret_box_rejects_other_context_and_tampering():
+    box = SecretBox(RSA.importKey(private_key))
+    sealed = box.seal(b"channel/app", "list:1:C1")
+
+    assert box.open(sealed, "list:1:C2") is None
+    assert box.open(sealed[:-1] + bytes([sealed[-1] ^ 1]), "list:1:C1") is None
+    assert box.open(b"short", "list:1:C1") is None
+    assert SecretBox(RSA.generate(2048)).open(sealed, "list:1:C1") is None
@@ -0,0 +1,113 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask import Flask, jsonify
+
+sys.modules["raven"] = MagicMock()
+sys.modules["raven.contrib.flask"] = MagicMock()
+
+from deferred import DeferredExecutor
+from slack_command import view
+
+
+@pytest.fixture
+def response_url():
+    """Local stand-in for Slack's response_url endpoint."""
+    received = []
+    done = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            received.append(json.loads(self.rfile.read(length)))
+            self.send_response(200)
+            self.end_headers()
+            done.set()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/response", received, done
+    httpd.shutdown()
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def test_submit_posts_result(app, response_url):
+    url, received, done = response_url
+    executor = DeferredExecutor(enabled=True, workers=1)
+
+    with app.app_context():
+        assert executor.submit(url, "T1", lambda text: jsonify({"text": text}), "done")
+
+    executor.shutdown()
+    assert done.is_set()
+    assert received == [{"text": "done"}]
+    stats = executor.stats()
+    assert stats["completed"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_submit_posts_error_on_failure(app, response_url):
+    url, received, done = response_url
+    executor = DeferredExecutor(enabled=True, workers=1)
+
+    def broken():
+        raise RuntimeError()
+
+    with app.app_context():
+        executor.submit(url, "T1", broken)
+
+    executor.shutdown()
+    assert done.is_set()
+    assert received[0]["attachments"][0]["color"] == "danger"
+    assert executor.stats()["failed"] == 1
+
+
+def test_submit_rejected_when_queue_full(app):
+    executor = DeferredExecutor(enabled=True, workers=1, queue_size=0)
+
+    with app.app_context():
+        assert not executor.submit("http://127.0.0.1:1/", "T1", jsonify)
+
+    assert executor.stats()["rejected"] == 1
+
+
+@patch("slack_command.executor")
+@patch("team_cache.db.session.query")
+@patch("slack_command.valid_slack_request", return_value=True)
+@patch("slack_command.cmd.list")
+def test_api_list_deferred(cmd_list_mock, valid_mock, query_mock, executor_mock):
+    executor_mock.enabled = True
+    executor_mock.submit.return_value = True
+    mock_team = MagicMock()
+    mock_team.id = 1
+    query_mock.return_value.filter_by.return_value.first.return_value = mock_team
+
+    app = Flask(__name__)
+    app.register_blueprint(view, url_prefix="/slack/command")
+    response = app.test_client().post(
+        "/slack/command",
+        data={
+            "text": "list",
+            "team_id": "T12345",
+            "team_domain": "testdomain",
+            "channel_id": "C12345",
+            "response_url": "https://hooks.slack.com/commands/1",
+        },
+    )
+
+    assert "Working on it" in response.get_json()["attachments"][0]["text"]
+    cmd_list_mock.assert_not_called()
+    executor_mock.submit.assert_called_once()
+    assert executor_mock.submit.call_args[0][0] == "https://hooks.slack.com/commands/1"
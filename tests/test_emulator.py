@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+import requests
+from rsa import generate_key
+from werkzeug.serving import make_server
+
+from cache_backend import MemoryBackend
+from core import SlashpassCMD, SlashpassError
+from emulator import create_app
+
+secret_key = generate_key("test+key")
+
+private_key = secret_key.exportKey("PEM")
+public_key = secret_key.publickey().exportKey("PEM")
+
+
+def serve(app):
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+class Team(object):
+    id = 1
+
+    def api(self, path):
+        return f"{self.url}/{path}"
+
+    def __init__(self, url):
+        self.url = url
+
+
+@pytest.fixture
+def emulator():
+    app = create_app(proxy_key=public_key, channels=2, per_channel=12)
+    server = serve(app)
+    app.url = f"http://127.0.0.1:{server.server_port}"
+    yield app
+    server.shutdown()
+
+
+@pytest.fixture
+def slashpass():
+    return SlashpassCMD(cache=MemoryBackend(), private_key=private_key)
+
+
+def test_list_many_chunks(emulator, slashpass):
+    listing = slashpass.list(Team(emulator.url), "C00000001")
+
+    # twelve secrets do not fit in a single RSA block
+    assert listing.count("secret") == 12
+    assert listing.endswith("└─ secret9")
+    assert slashpass.list(Team(emulator.url), "C99999999") == ""
+
+
+def test_show_onetime_link(emulator, slashpass):
+    link = slashpass.show(Team(emulator.url), "C00000000", "secret3")
+
+    assert requests.get(link).text == emulator.store.secrets["C00000000/secret3"]
+    assert requests.get(link).status_code == 404
+    assert slashpass.show(Team(emulator.url), "C00000000", "missing") is None
+
+
+def test_insert_and_remove(emulator, slashpass):
+    team = Team(emulator.url)
+    token = slashpass.generate_insert_token(team, "C00000000", "new")
+
+    slashpass.insert(token, "hunter2")
+
+    assert emulator.store.secrets["C00000000/new"] == "hunter2"
+    assert "new" in slashpass.list(team, "C00000000")
+    assert slashpass.remove(team, "C00000000", "new")
+    assert not slashpass.remove(team, "C00000000", "new")
+
+
+def test_error_rate():
+    app = create_app(proxy_key=public_key, error_rate=1.0)
+    server = serve(app)
+    try:
+        team = Team(f"http://127.0.0.1:{server.server_port}")
+        slashpass = SlashpassCMD(cache=MemoryBackend(), private_key=private_key)
+
+        with pytest.raises(SlashpassError):
+            slashpass.show(team, "C00000000", "secret0")
+        assert requests.get(team.api("public_key")).status_code == 200
+    finally:
+        server.shutdown()
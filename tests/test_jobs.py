@@ -0,0 +1,202 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from flask import Flask, jsonify
+from redis.exceptions import ConnectionError
+
+import jobs
+from jobs import JobQueue, Worker
+
+
+@pytest.fixture
+def queue():
+    return MagicMock()
+
+
+@pytest.fixture
+def worker(queue):
+    return Worker(Flask(__name__), queue, MagicMock(), "failure")
+
+
+@pytest.fixture
+def handler():
+    calls = []
+
+    @jobs.register("test_handler")
+    def handler(*args):
+        calls.append(args)
+        return jsonify({"text": "done"})
+
+    yield calls
+    del jobs.handlers["test_handler"]
+
+
+def job(**kwargs):
+    return {
+        "id": "1",
+        "handler": "test_handler",
+        "args": ["T1", "list"],
+        "team": "T1",
+        "response_url": "https://hooks.slack.com/1",
+        "attempts": 0,
+        **kwargs,
+    }
+
+
+def test_worker_runs_and_acks(worker, queue, handler):
+    queue.take.return_value = job()
+
+    assert worker.run_once()
+
+    assert handler == [("T1", "list")]
+    queue.ack.assert_called_once()
+    worker.post.assert_called_once()
+    assert json.loads(worker.post.call_args[0][1]) == {"text": "done"}
+
+
+def test_worker_idle(worker, queue):
+    queue.take.return_value = None
+
+    assert not worker.run_once()
+
+
+def test_worker_retries_failed_job(worker, queue):
+    @jobs.register("broken")
+    def broken():
+        raise RuntimeError()
+
+    queue.take.return_value = job(handler="broken", args=[])
+    queue.retry.return_value = True
+
+    worker.run_once()
+
+    queue.retry.assert_called_once()
+    queue.ack.assert_not_called()
+    worker.post.assert_not_called()
+    del jobs.handlers["broken"]
+
+
+def test_worker_reports_exhausted_job(worker, queue):
+    queue.take.return_value = job(handler="missing")
+    queue.retry.return_value = False
+
+    worker.run_once()
+
+    worker.post.assert_called_once_with("https://hooks.slack.com/1", "failure")
+
+
+def test_worker_survives_queue_errors(worker, queue):
+    queue.take.side_effect = ConnectionError()
+
+    assert not worker.run_once()
+
+
+def test_worker_survives_failed_failure_post(worker, queue):
+    queue.take.return_value = job(handler="missing")
+    queue.retry.return_value = False
+    worker.post.side_effect = requests.exceptions.ConnectionError()
+
+    assert worker.run_once()
+
+
+def test_worker_loop_survives_errors(worker, queue, handler):
+    # a Redis error while acking, then a failed Slack post, then stop
+    def take():
+        if queue.take.call_count == 3:
+            worker.stop()
+        return job()
+
+    queue.take.side_effect = take
+    queue.ack.side_effect = [ConnectionError(), None, None]
+    worker.post.side_effect = requests.exceptions.ConnectionError()
+    worker.poll_interval = 0
+
+    worker.run()
+
+    assert queue.take.call_count == 3
+
+
+def test_retry_backoff():
+    redis = MagicMock()
+    queue = JobQueue(redis, max_attempts=3, backoff=2)
+    pipe = redis.pipeline.return_value
+
+    assert queue.retry(job(attempts=1))
+    assert json.loads(pipe.set.call_args[0][1])["attempts"] == 2
+    pipe.zadd.assert_called_once()
+
+    assert not queue.retry(job(attempts=2))
+
+
+@pytest.fixture
+def redis_queue():
+    # the scripts run on the Lua interpreter embedded by fakeredis
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return JobQueue(fakeredis.FakeStrictRedis(), visibility_timeout=30, backoff=2)
+
+
+def submit(queue, team, *args):
+    fn = MagicMock(job_name="test_handler")
+    queue.submit(f"https://hooks.slack.com/{team}", team, fn, *args)
+
+
+def test_queue_round_robin(redis_queue):
+    submit(redis_queue, "T1", "show", "a")
+    submit(redis_queue, "T1", "show", "b")
+    submit(redis_queue, "T2", "show", "c")
+
+    taken = [redis_queue.take() for _ in range(4)]
+
+    assert [job and job["args"] for job in taken] == [
+        ["show", "a"],
+        ["show", "c"],
+        ["show", "b"],
+        None,
+    ]
+    assert redis_queue.stats() == {"teams": 0, "inflight": 3, "delayed": 0}
+    for job in taken[:3]:
+        redis_queue.ack(job)
+    assert redis_queue.stats() == {"teams": 0, "inflight": 0, "delayed": 0}
+    assert redis_queue.redis.keys() == []
+
+
+def test_queue_retry_delayed(redis_queue):
+    submit(redis_queue, "T1", "remove", "a")
+
+    with patch("jobs.time.time", return_value=1000):
+        assert redis_queue.retry(redis_queue.take())
+        assert redis_queue.take() is None
+    with patch("jobs.time.time", return_value=1003):
+        job = redis_queue.take()
+
+    assert job["args"] == ["remove", "a"]
+    assert job["attempts"] == 1
+    assert redis_queue.stats() == {"teams": 0, "inflight": 1, "delayed": 0}
+
+
+def test_queue_redelivers_after_visibility_timeout(redis_queue):
+    submit(redis_queue, "T1", "remove", "a")
+
+    with patch("jobs.time.time", return_value=1000):
+        first = redis_queue.take()
+    with patch("jobs.time.time", return_value=1029):
+        assert redis_queue.take() is None
+    with patch("jobs.time.time", return_value=1031):
+        second = redis_queue.take()
+
+    assert second == first
+
+
+def test_queue_drops_acknowledged_due_jobs(redis_queue):
+    submit(redis_queue, "T1", "remove", "a")
+
+    with patch("jobs.time.time", return_value=1000):
+        job = redis_queue.take()
+    redis_queue.redis.delete(redis_queue._data(job["id"]))
+    with patch("jobs.time.time", return_value=1031):
+        assert redis_queue.take() is None
+
+    assert redis_queue.stats() == {"teams": 0, "inflight": 0, "delayed": 0}
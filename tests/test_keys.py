@@ -0,0 +1,65 @@
+import os
+import stat
+from unittest.mock import patch
+
+import pytest
+import rsa
+
+from keys import chunk_size, fingerprint, generate_key, load_key
+
+
+def test_generate_key_matches_rsa_package():
+    assert generate_key("test+key") == rsa.generate_key("test+key")
+
+
+def test_generate_key_unsupported_size():
+    with pytest.raises(ValueError):
+        generate_key("test+key", 1024)
+
+
+@pytest.mark.parametrize("bits,size", [(2048, 344), (3072, 512), (4096, 684)])
+def test_chunk_size(bits, size):
+    class Key:
+        def size_in_bytes(self):
+            return bits // 8
+
+    assert chunk_size(Key()) == size
+
+
+def test_load_key_without_file():
+    assert load_key("test+key") == rsa.generate_key("test+key")
+
+
+def test_load_key_stores_protected_copy(tmp_path):
+    path = tmp_path / "key.pem"
+
+    key = load_key("test+key", path=str(path))
+
+    assert key == rsa.generate_key("test+key")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert b"ENCRYPTED PRIVATE KEY" in path.read_bytes()
+    with patch("keys.generate_key") as generate_key_mock:
+        assert load_key("test+key", path=str(path)) == key
+        generate_key_mock.assert_not_called()
+
+
+def test_load_key_fingerprint_mismatch(tmp_path):
+    path = tmp_path / "key.pem"
+    path.write_bytes(fingerprint("other seed", 2048).encode() + b"\nPEM")
+
+    with patch("keys.generate_key", side_effect=generate_key) as generate_key_mock:
+        assert load_key("test+key", path=str(path)) == generate_key("test+key")
+        generate_key_mock.assert_called_once_with("test+key", 2048)
+
+
+def test_load_key_unwritable_path(tmp_path):
+    path = tmp_path / "missing" / "key.pem"
+
+    assert load_key("test+key", path=str(path)) == generate_key("test+key")
+    assert not path.parent.exists()
+
+    with patch("keys.os.replace", side_effect=PermissionError):
+        assert load_key("test+key", path=str(tmp_path / "key.pem")) == generate_key(
+            "test+key"
+        )
+    assert os.listdir(tmp_path) == []
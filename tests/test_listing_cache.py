@@ -0,0 +1,111 @@
+from unittest.mock import MagicMock, patch
+
+from Crypto.PublicKey import RSA
+from redis.exceptions import ConnectionError
+
+from cache_backend import MemoryBackend
+from crypto import SecretBox
+from listing_cache import PREFIX, ListingCache
+
+box = SecretBox(RSA.generate(2048))
+
+
+def test_roundtrip_encrypted_at_rest():
+    cache = MemoryBackend()
+    listings = ListingCache(cache, box, ttl=10, stale=60)
+
+    listings.set(42, "C1", b"C1/app1\nC1/app2", "")
+
+    assert listings.get(42, "C1") == (b"C1/app1\nC1/app2", True)
+    assert b"app1" not in cache.get(PREFIX + "{42:C1}")
+    assert listings.get(42, "C2") is None
+    assert listings.stats()["hits"] == 1 and listings.stats()["misses"] == 1
+
+
+def test_entry_is_bound_to_its_key():
+    cache = MemoryBackend()
+    listings = ListingCache(cache, box, ttl=10, stale=60)
+    listings.set(42, "C1", b"C1/app1", "")
+
+    cache.set(PREFIX + "{42:C2}", cache.get(PREFIX + "{42:C1}"))
+
+    assert listings.get(42, "C2") is None
+
+
+def test_stale_entry():
+    listings = ListingCache(MemoryBackend(), box, ttl=10, stale=60)
+
+    with patch("listing_cache.time.time", return_value=1000):
+        listings.set(42, "C1", b"C1/app1", "")
+    with patch("listing_cache.time.time", return_value=1011):
+        assert listings.get(42, "C1") == (b"C1/app1", False)
+
+    assert listings.stats()["stale_hits"] == 1
+
+
+def test_invalidate():
+    listings = ListingCache(MemoryBackend(), box, ttl=10, stale=60)
+    listings.set(42, "C1", b"C1/app1", "")
+
+    listings.invalidate("42", "C1")
+
+    assert listings.get(42, "C1") is None
+
+
+def test_invalidated_during_the_fetch():
+    listings = ListingCache(MemoryBackend(), box, ttl=10, stale=60)
+
+    generation = listings.generation(42, "C1")
+    listings.invalidate(42, "C1")
+    listings.set(42, "C1", b"C1/removed", generation)
+    assert listings.get(42, "C1") is None
+
+    listings.set(42, "C1", b"C1/app1", listings.generation(42, "C1"))
+    assert listings.get(42, "C1") == (b"C1/app1", True)
+
+
+def test_invalidated_during_the_write():
+    listings = ListingCache(MemoryBackend(), box, ttl=10, stale=60)
+    seal = box.seal
+
+    def invalidating_seal(data, key):
+        # lands after the listing was fetched, before it is written
+        listings.invalidate(42, "C1")
+        return seal(data, key)
+
+    generation = listings.generation(42, "C1")
+    with patch.object(listings, "box", MagicMock(seal=invalidating_seal)):
+        listings.set(42, "C1", b"C1/removed", generation)
+
+    assert listings.get(42, "C1") is None
+
+
+def test_unknown_generation_not_stored():
+    listings = ListingCache(MemoryBackend(), box, ttl=10, stale=60)
+
+    listings.set(42, "C1", b"C1/app1", None)
+
+    assert listings.get(42, "C1") is None
+
+
+def test_claim_once():
+    listings = ListingCache(MemoryBackend(), box, ttl=10, stale=60)
+
+    assert listings.claim(42, "C1")
+    assert not listings.claim(42, "C1")
+    listings.release(42, "C1")
+    assert listings.claim(42, "C1")
+
+
+def test_cache_errors_are_misses():
+    cache = MagicMock()
+    cache.get.side_effect = ConnectionError
+    cache.set.side_effect = ConnectionError
+    cache.set_if.side_effect = ConnectionError
+    cache.delete.side_effect = ConnectionError
+    listings = ListingCache(cache, box, ttl=10, stale=60)
+
+    assert listings.generation(42, "C1") is None
+    listings.set(42, "C1", b"C1/app1", "")
+    listings.invalidate(42, "C1")
+    assert listings.get(42, "C1") is None
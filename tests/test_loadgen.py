@@ -0,0 +1,102 @@
+import threading
+from urllib.parse import parse_qs
+
+import pytest
+from flask import Flask, request
+from werkzeug.serving import make_server
+
+from loadgen import LoadGenerator, percentile, signed
+from signature import verify
+
+SECRET = "loadgen-secret"
+
+COMMAND = {
+    "kind": "command",
+    "verb": "list",
+    "text": "list",
+    "team_id": "T-recorded",
+    "team_domain": "team-recorded",
+    "channel_id": "C1",
+}
+ACTION = {
+    "kind": "action",
+    "verb": "no_configure",
+    "payload": {"team": {"id": "T-recorded"}, "actions": [{"name": "no_configure"}]},
+}
+
+
+@pytest.fixture
+def proxy():
+    app = Flask(__name__)
+    app.received = []
+
+    @app.route("/slack/<kind>", methods=["POST"])
+    def slack(kind):
+        valid = verify(
+            SECRET,
+            request.headers["X-Slack-Request-Timestamp"],
+            request.get_data(cache=True),
+            request.headers["X-Slack-Signature"],
+        )
+        app.received.append((kind, request.form.to_dict()))
+        return ("", 200) if valid else ("", 403)
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.url = f"http://127.0.0.1:{server.server_port}"
+    yield app
+    server.shutdown()
+
+
+def test_signed_verifies():
+    path, body, headers = signed(COMMAND, SECRET)
+
+    assert path == "/slack/command"
+    assert verify(
+        SECRET, headers["X-Slack-Request-Timestamp"], body, headers["X-Slack-Signature"]
+    )
+    assert parse_qs(body.decode())["text"] == ["list"]
+
+
+def test_signed_team_override():
+    _, body, _ = signed(COMMAND, SECRET, team=("T12345", "acme"))
+    _, action_body, _ = signed(ACTION, SECRET, team=("T12345", "acme"))
+
+    assert parse_qs(body.decode())["team_id"] == ["T12345"]
+    assert "T12345" in parse_qs(action_body.decode())["payload"][0]
+
+
+def test_identical_entries_get_distinct_signatures():
+    first = signed(COMMAND, SECRET)[2]["X-Slack-Signature"]
+    second = signed(COMMAND, SECRET)[2]["X-Slack-Signature"]
+
+    assert first != second
+
+
+def test_percentile():
+    samples = list(range(1, 101))
+
+    assert percentile(samples, 0.5) == 50
+    assert percentile(samples, 0.99) == 99
+    assert percentile([7], 0.95) == 7
+
+
+def test_closed_loop(proxy):
+    generator = LoadGenerator(proxy.url, SECRET)
+
+    results, elapsed = generator.run([COMMAND, ACTION], concurrency=3, total=10)
+
+    rows = {row["verb"]: row for row in results.report(elapsed)}
+    assert rows["total"]["requests"] == 10 and rows["total"]["errors"] == 0
+    assert rows["list"]["requests"] == 5
+    assert rows["no_configure"]["requests"] == 5
+    assert len(proxy.received) == 10
+
+
+def test_open_loop_counts_errors(proxy):
+    generator = LoadGenerator(proxy.url, "wrong-secret")
+
+    results, elapsed = generator.run([COMMAND], rate=200, total=4)
+
+    row, total = results.report(elapsed)
+    assert row["requests"] == 4 and row["errors"] == 4
@@ -0,0 +1,217 @@
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from flask import Flask
+
+sys.modules["raven"] = MagicMock()
+sys.modules["raven.contrib.flask"] = MagicMock()
+
+import metrics
+from metrics import Registry
+from upstream import SessionPool, UpstreamClient
+
+
+def test_counter_and_histogram_rendered():
+    registry = Registry(directory=None)
+    calls = registry.counter("calls_total", "Calls", ("result",))
+    latency = registry.histogram("latency_seconds", "Latency", ("verb",), (0.1, 1))
+
+    calls.labels("hit").inc()
+    calls.labels("hit").inc(2)
+    latency.labels("list").observe(0.05)
+    latency.labels("list").observe(0.5)
+    latency.labels("list").observe(5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE calls_total counter" in lines
+    assert 'calls_total{result="hit"} 3' in lines
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{verb="list",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{verb="list",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{verb="list",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{verb="list"} 5.55' in lines
+    assert 'latency_seconds_count{verb="list"} 3' in lines
+
+
+def test_label_values_escaped():
+    registry = Registry(directory=None)
+    registry.counter("calls_total", "Calls", ("name",)).labels('a "b"\n').inc()
+
+    assert 'calls_total{name="a \\"b\\"\\n"} 1' in registry.render()
+
+
+def test_timer():
+    registry = Registry(directory=None)
+    latency = registry.histogram("latency_seconds", "Latency", ("verb",))
+
+    with latency.labels("show").time():
+        pass
+
+    assert latency.samples[("show",)][-1] == 1
+
+
+def test_processes_merged(tmp_path):
+    # another worker, the file is what it would have flushed
+    other = Registry(directory=str(tmp_path))
+    other.counter("calls_total", "Calls", ("result",)).labels("hit").inc(5)
+    other.histogram("latency_seconds", "Latency", ("verb",), (1,)).labels(
+        "list"
+    ).observe(0.5)
+    other.flush()
+    os.replace(tmp_path / f"{os.getpid()}-{other._token}.json", tmp_path / "1-a.json")
+
+    registry = Registry(directory=str(tmp_path))
+    calls = registry.counter("calls_total", "Calls", ("result",))
+    latency = registry.histogram("latency_seconds", "Latency", ("verb",), (1,))
+    calls.labels("hit").inc(2)
+    calls.labels("miss").inc()
+    latency.labels("list").observe(2)
+
+    lines = registry.render().splitlines()
+    assert 'calls_total{result="hit"} 7' in lines
+    assert 'calls_total{result="miss"} 1' in lines
+    assert 'latency_seconds_bucket{verb="list",le="1.0"} 1' in lines
+    assert 'latency_seconds_count{verb="list"} 2' in lines
+    assert sorted(os.listdir(tmp_path)) == [
+        "1-a.json",
+        f"{os.getpid()}-{registry._token}.json",
+    ]
+
+
+def test_exited_processes_folded(tmp_path):
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    other = Registry(directory=str(tmp_path))
+    other.counter("calls_total", "Calls", ("result",)).labels("hit").inc(5)
+    other.flush()
+    os.replace(
+        tmp_path / f"{os.getpid()}-{other._token}.json",
+        tmp_path / f"{process.pid}-a.json",
+    )
+    (tmp_path / metrics.EXITED).write_text(json.dumps({"calls_total": {'["hit"]': 3}}))
+
+    registry = Registry(directory=str(tmp_path))
+    registry.counter("calls_total", "Calls", ("result",)).labels("hit").inc()
+
+    assert 'calls_total{result="hit"} 9' in registry.render()
+    assert 'calls_total{result="hit"} 9' in registry.render()
+    assert sorted(os.listdir(tmp_path)) == [
+        f"{os.getpid()}-{registry._token}.json",
+        metrics.EXITED,
+        "fold.lock",
+    ]
+
+
+def test_reused_pid_keeps_the_file(tmp_path):
+    registry = Registry(directory=str(tmp_path))
+    calls = registry.counter("calls_total", "Calls", ("result",))
+    calls.labels("hit").inc(2)
+    registry.flush()
+
+    # a worker started later with the same pid
+    registry._forked()
+    calls.labels("hit").inc()
+
+    assert 'calls_total{result="hit"} 3' in registry.render()
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_unreadable_files_skipped(tmp_path):
+    (tmp_path / "1.json").write_text("{")
+    registry = Registry(directory=str(tmp_path))
+    registry.counter("calls_total", "Calls", ("result",)).labels("hit").inc()
+
+    assert 'calls_total{result="hit"} 1' in registry.render()
+
+
+def test_forked_child_starts_empty(tmp_path):
+    registry = Registry(directory=str(tmp_path))
+    calls = registry.counter("calls_total", "Calls", ("result",))
+    calls.labels("hit").inc()
+
+    registry._forked()
+
+    assert calls.samples == {}
+
+
+def test_clear(tmp_path):
+    (tmp_path / "1.json").write_text("{}")
+    Registry(directory=str(tmp_path)).clear()
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_collector():
+    registry = Registry(directory=None)
+    registry.collector("expired_keys", "Expired", "counter", lambda: 42)
+    registry.collector("unknown", "Unavailable", "gauge", lambda: None)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE expired_keys counter" in lines
+    assert "expired_keys 42" in lines
+    assert "unknown" not in registry.render()
+
+
+def test_upstream_latency_by_origin_and_status():
+    client = UpstreamClient(SessionPool())
+    response = MagicMock(status_code=503)
+    before = metrics.upstream.snapshot()
+
+    with patch.object(requests.Session, "post", return_value=response):
+        client.post("https://metrics.example.com/list/C1")
+    with patch.object(
+        requests.Session, "post", side_effect=requests.exceptions.ConnectTimeout
+    ):
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            client.post("https://metrics.example.com/list/C1")
+
+    after = metrics.upstream.snapshot()
+    for status in ("503", "error"):
+        key = json.dumps(["https://metrics.example.com", status])
+        count = before.get(key, [0])[-1]
+        assert after[key][-1] == count + 1
+
+
+def test_insert_tokens_counted():
+    from tokens import TokenStore
+
+    store = TokenStore(MagicMock(get=MagicMock(return_value=None)))
+    before = metrics.tokens.snapshot().get(json.dumps(["miss"]), 0)
+
+    assert store.get("missing") is None
+    assert metrics.tokens.snapshot()[json.dumps(["miss"])] == before + 1
+
+
+@pytest.fixture
+def client():
+    from exporter import view
+
+    app = Flask(__name__)
+    app.register_blueprint(view, url_prefix="/metrics")
+    app.testing = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_endpoint(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE slashpass_command_seconds histogram" in response.text
+
+
+@patch("exporter.METRICS_TOKEN", "secret")
+def test_endpoint_token(client):
+    assert client.get("/metrics").status_code == 403
+    assert (
+        client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code
+        == 403
+    )
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
@@ -0,0 +1,108 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from flask import Blueprint, Flask
+
+import profiling
+from profiling import HEADER, Profiler, install, tag, view
+
+
+def hot_function():
+    return sum(i * i for i in range(1000))
+
+
+def create_app(profiler):
+    commands = Blueprint("slack_command", __name__)
+
+    @commands.route("", methods=["POST"])
+    def command():
+        tag("list")
+        hot_function()
+        return "ok"
+
+    app = Flask(__name__)
+    app.register_blueprint(commands, url_prefix="/slack/command")
+    app.register_blueprint(view, url_prefix="/admin/profiles")
+    install(app, profiler)
+    app.testing = True
+    return app
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    return Profiler(directory=str(tmp_path), sample=0, token="secret", keep=3)
+
+
+def test_header_selects_request(profiler, tmp_path):
+    client = create_app(profiler).test_client()
+
+    client.post("/slack/command")
+    client.post("/slack/command", headers={HEADER: "wrong"})
+    assert os.listdir(tmp_path) == []
+
+    client.post("/slack/command", headers={HEADER: "secret"})
+    (name,) = os.listdir(tmp_path)
+    assert name.endswith(f"-{os.getpid()}-slack_command-list.prof")
+
+
+def test_sampled_requests(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), sample=1, token=None)
+    client = create_app(profiler).test_client()
+
+    client.post("/slack/command")
+
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_disabled():
+    profiler = Profiler(directory=None, sample=1, token="secret")
+
+    assert not profiler.selected("secret")
+
+
+def test_rotation(profiler, tmp_path):
+    client = create_app(profiler).test_client()
+
+    for _ in range(5):
+        client.post("/slack/command", headers={HEADER: "secret"})
+
+    assert len(profiler.files()) == 3
+
+
+def test_report(profiler):
+    client = create_app(profiler).test_client()
+    client.post("/slack/command", headers={HEADER: "secret"})
+    client.post("/slack/command", headers={HEADER: "secret"})
+
+    report = profiler.report(top=5, verb="list")
+    assert report.startswith("2 profiles")
+    assert "hot_function" in report
+    assert profiler.report(verb="show") == "No profiles\n"
+    assert profiler.report(blueprint="slack_action") == "No profiles\n"
+
+
+def test_report_endpoint(profiler):
+    client = create_app(profiler).test_client()
+    client.post("/slack/command", headers={HEADER: "secret"})
+
+    with patch.object(profiling, "profiler", profiler):
+        assert client.get("/admin/profiles").status_code == 404
+        headers = {"Authorization": "Bearer wrong"}
+        assert client.get("/admin/profiles", headers=headers).status_code == 404
+
+        headers = {"Authorization": "Bearer secret"}
+        response = client.get("/admin/profiles?top=5&sort=tottime", headers=headers)
+        assert response.status_code == 200
+        assert "test_profiling.py" in response.text
+        response = client.get("/admin/profiles?sort=unknown", headers=headers)
+        assert response.status_code == 400
+
+
+def test_report_endpoint_without_token(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), sample=1, token=None)
+    client = create_app(profiler).test_client()
+
+    with patch.object(profiling, "profiler", profiler):
+        headers = {"Authorization": "Bearer "}
+        assert client.get("/admin/profiles", headers=headers).status_code == 404
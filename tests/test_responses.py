@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from flask import Flask
+
+from responses import Field, Template, render
+
+
+@pytest.fixture(autouse=True)
+def app_context():
+    with Flask(__name__).app_context():
+        yield
+
+
+def test_static_template():
+    payload = {"attachments": [{"text": "*_Usage:_*", "short": True}]}
+
+    response = Template(payload).render()
+
+    assert response.mimetype == "application/json"
+    assert response.get_json() == payload
+
+
+def test_template_fields():
+    template = Template(
+        {"attachments": [{"fallback": Field("msg"), "text": Field("msg"), "n": 1}]}
+    )
+
+    msg = 'quotes " backslash \\ newline \n ├─ unicode'
+    response = template.render(msg=msg)
+
+    assert response.get_json() == {
+        "attachments": [{"fallback": msg, "text": msg, "n": 1}]
+    }
+
+
+def test_template_missing_field():
+    with pytest.raises(KeyError):
+        Template({"text": Field("msg")}).render()
+
+
+def test_render():
+    assert json.loads(render({"text": "└─ app"}).get_data()) == {"text": "└─ app"}
@@ -0,0 +1,66 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from router import Router, tokenize
+
+
+@pytest.fixture
+def router():
+    router = Router()
+
+    @router.command("list", "", arity=(0,))
+    def list_secrets(*args):
+        return "list"
+
+    @router.command("show", default=True, arity=(1,), usage="/pass show <secret>")
+    def show(*args):
+        return "show"
+
+    return router
+
+
+def test_tokenize():
+    assert tokenize("  insert \t app  ") == ["insert", "app"]
+    assert tokenize("") == [""]
+
+
+def test_resolve_verb(router):
+    command, args = router.resolve(["show", "app"])
+
+    assert command.name == "show"
+    assert args == ["app"]
+
+
+def test_resolve_alias(router):
+    command, args = router.resolve([""])
+
+    assert command.name == "list"
+    assert args == []
+
+
+def test_resolve_default(router):
+    command, args = router.resolve(["app", "extra"])
+
+    assert command.name == "show"
+    assert args == ["app"]
+
+
+def test_arity(router):
+    command, _ = router.resolve(["show"])
+
+    assert not command.accepts([])
+    assert command.accepts(["app"])
+
+
+def test_hooks_and_stats(router):
+    hook = MagicMock()
+    router.add_hook(hook)
+    command, args = router.resolve(["list"])
+
+    assert command(args) == "list"
+
+    hook.assert_called_once()
+    assert hook.call_args[0][0] == "list"
+    assert router.stats()["list"]["calls"] == 1
+    assert router.stats()["show"]["calls"] == 0
@@ -0,0 +1,122 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask import Flask, request
+from redis.exceptions import ConnectionError
+
+from signature import VERIFIED, SlackSignatureMiddleware, sign, verify
+from utils import valid_slack_request
+
+SECRET = "8f742231b10e8888abcd99yyyzzz85a5"
+BODY = b"token=xyz&team_id=T1&text=list"
+
+
+@pytest.fixture
+def cache():
+    seen = set()
+    cache = MagicMock()
+
+    def set_nx(key, value, nx, ex):
+        if key in seen:
+            return None
+        seen.add(key)
+        return True
+
+    cache.set.side_effect = set_nx
+    return cache
+
+
+@pytest.fixture
+def client(cache):
+    app = Flask(__name__)
+
+    @app.route("/slack/command", methods=["POST"])
+    def command():
+        return f"{request.environ.get(VERIFIED)} {request.form['text']}"
+
+    @app.route("/insert/<token>")
+    def insert(token):
+        return token
+
+    app.wsgi_app = SlackSignatureMiddleware(
+        app.wsgi_app, ["/slack/command"], SECRET, cache, max_body=1024
+    )
+    return app.test_client()
+
+
+def signed_headers(body=BODY, timestamp=None):
+    timestamp = str(int(timestamp or time.time()))
+    return {
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": sign(SECRET, timestamp, body),
+        "Content-Type": "application/x-www-form-urlencoded",
+    }
+
+
+def test_verify():
+    timestamp = str(int(time.time()))
+    signature = sign(SECRET, timestamp, BODY)
+
+    assert verify(SECRET, timestamp, BODY, signature)
+    assert not verify(SECRET, timestamp, BODY + b"x", signature)
+    assert not verify(SECRET, "not a number", BODY, signature)
+    assert not verify(SECRET, None, BODY, signature)
+
+
+def test_verify_stale_timestamp():
+    timestamp = str(int(time.time()) - 120)
+
+    assert not verify(SECRET, timestamp, BODY, sign(SECRET, timestamp, BODY))
+
+
+def test_middleware_accepts_signed_request(client):
+    response = client.post("/slack/command", data=BODY, headers=signed_headers())
+
+    assert response.status_code == 200
+    assert response.data == b"True list"
+
+
+def test_middleware_rejects_invalid_signature(client):
+    headers = signed_headers(body=b"something else")
+
+    response = client.post("/slack/command", data=BODY, headers=headers)
+
+    assert response.status_code == 403
+
+
+def test_middleware_rejects_replay(client):
+    headers = signed_headers()
+
+    assert client.post("/slack/command", data=BODY, headers=headers).status_code == 200
+    assert client.post("/slack/command", data=BODY, headers=headers).status_code == 403
+
+
+def test_middleware_rejects_oversized_body(client):
+    body = b"text=" + b"x" * 2048
+
+    response = client.post("/slack/command", data=body, headers=signed_headers(body))
+
+    assert response.status_code == 413
+
+
+def test_middleware_ignores_other_paths(client):
+    assert client.get("/insert/ABC123").data == b"ABC123"
+
+
+def test_middleware_replay_cache_unavailable(client, cache):
+    cache.set.side_effect = ConnectionError()
+
+    response = client.post("/slack/command", data=BODY, headers=signed_headers())
+
+    assert response.status_code == 200
+
+
+@patch("utils.SIGNING_SECRET", SECRET)
+def test_valid_slack_request_raw_body():
+    app = Flask(__name__)
+    with app.test_request_context(
+        "/slack/command", method="POST", data=BODY, headers=signed_headers()
+    ):
+        assert valid_slack_request(request)
+        assert request.form["text"] == "list"
@@ -0,0 +1,191 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from Crypto.PublicKey import RSA
+from redis.exceptions import ConnectionError
+
+from cache_backend import MemoryBackend
+from crypto import SecretBox
+from singleflight import PREFIX, FlightTimeout, SingleFlight
+
+box = SecretBox(RSA.generate(2048))
+
+
+def blocking(result=b"listing"):
+    """fn that waits for `release` and records its calls."""
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return result
+
+    return fn, started, release, calls
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.001)
+
+
+def run(flight, key, fn, results):
+    thread = threading.Thread(target=lambda: results.append(flight.do(key, fn)))
+    thread.start()
+    return thread
+
+
+def test_in_process_followers_share_the_call():
+    flight = SingleFlight()
+    fn, started, release, calls = blocking()
+    results = []
+
+    leader = run(flight, "list:1:C1", fn, results)
+    started.wait(5)
+    followers = [run(flight, "list:1:C1", fn, results) for _ in range(4)]
+    wait_for(lambda: flight.stats()["waited"] == 4)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == [b"listing"] * 5
+    assert len(calls) == 1
+
+
+def test_in_process_error_reaches_followers():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def fn():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream")
+
+    def call():
+        try:
+            flight.do("key", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    wait_for(lambda: flight.stats()["waited"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+
+    assert flight.do("list:1:C1", lambda: b"one") == b"one"
+    assert flight.do("list:1:C2", lambda: b"two") == b"two"
+
+
+def test_cross_process_handoff():
+    cache = MemoryBackend()
+    worker_a = SingleFlight(cache, box, timeout=5)
+    worker_b = SingleFlight(cache, box, timeout=5)
+    fn, started, release, calls = blocking()
+    results = []
+
+    leader = run(worker_a, "list:1:C1", fn, results)
+    started.wait(5)
+    follower = run(worker_b, "list:1:C1", MagicMock(), results)
+    # the follower waits for the leader's message once the result is missing
+    wait_for(lambda: cache.stats()["misses"] >= 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == [b"listing", b"listing"]
+    assert len(calls) == 1
+    assert worker_b.stats()["followed"] == 1
+    assert cache.get(PREFIX + "list:1:C1") is None
+    # the handoff never stores the plaintext
+    assert all(b"listing" not in value for value, _ in cache._data.values())
+
+
+def test_follower_takes_over_failed_leader():
+    cache = MemoryBackend()
+    worker_a = SingleFlight(cache, box, timeout=5)
+    worker_b = SingleFlight(cache, box, timeout=5)
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream")
+
+    leader = threading.Thread(
+        target=lambda: pytest.raises(ValueError, worker_a.do, "key", failing)
+    )
+    leader.start()
+    started.wait(5)
+    results = []
+    follower = run(worker_b, "key", lambda: b"own", results)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == [b"own"]
+
+
+def test_follower_woken_by_the_leader():
+    cache = MemoryBackend()
+    worker_a = SingleFlight(cache, box, timeout=5)
+    worker_b = SingleFlight(cache, box, timeout=5)
+    fn, started, release, calls = blocking()
+    results = []
+
+    leader = run(worker_a, "list:1:C1", fn, results)
+    started.wait(5)
+    follower = run(worker_b, "list:1:C1", MagicMock(), results)
+    wait_for(lambda: cache.stats()["misses"] >= 1)
+    time.sleep(0.3)
+    reads = cache.stats()["hits"] + cache.stats()["misses"]
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    # no polling while the leader works, one read once it is done
+    assert reads <= 3
+    assert results == [b"listing", b"listing"]
+
+
+def test_follower_times_out_without_calling():
+    cache = MemoryBackend()
+    worker_a = SingleFlight(cache, box, timeout=5)
+    worker_b = SingleFlight(cache, box, timeout=0.2)
+    fn, started, release, calls = blocking()
+    own = MagicMock()
+
+    leader = run(worker_a, "list:1:C1", fn, [])
+    started.wait(5)
+    with pytest.raises(FlightTimeout):
+        worker_b.do("list:1:C1", own)
+    release.set()
+    leader.join(5)
+
+    own.assert_not_called()
+
+
+def test_cache_errors_fall_back_to_direct_call():
+    cache = MagicMock()
+    cache.set.side_effect = ConnectionError
+
+    assert SingleFlight(cache, box).do("key", lambda: b"direct") == b"direct"
@@ -22,7 +22,7 @@ def client():
 
 
 @patch("slack_action.valid_slack_request", return_value=True)
-@patch("slack_action.db.session.query")
+@patch("team_cache.db.session.query")
 def test_no_actions(mock_query, mock_valid, client):
     """Test case for missing 'actions' in payload."""
     payload = {"callback_id": "configure_password_server"}
@@ -49,7 +49,7 @@ def test_invalid_callback_id(mock_valid, client):
 
 
 @patch("slack_action.valid_slack_request", return_value=True)
-@patch("slack_action.db.session.query")
+@patch("team_cache.db.session.query")
 def test_no_reconfigure(mock_query, mock_valid, client):
     """Test case for 'no_reconfigure' action."""
     payload = {
@@ -62,7 +62,7 @@ def test_no_reconfigure(mock_query, mock_valid, client):
 
 
 @patch("slack_action.valid_slack_request", return_value=True)
-@patch("slack_action.db.session.query")
+@patch("team_cache.db.session.query")
 @patch("slack_action.validators.url", return_value=True)
 def test_reconfigure_server_success(mock_valid_url, mock_query, mock_valid, client):
     """Test case for 'reconfigure_server' action with valid URL."""
@@ -81,7 +81,7 @@ def test_reconfigure_server_success(mock_valid_url, mock_query, mock_valid, clie
 
 
 @patch("slack_action.valid_slack_request", return_value=True)
-@patch("slack_action.db.session.query")
+@patch("team_cache.db.session.query")
 def test_use_demo_server_failure(mock_query, mock_valid, client):
     """Test case for 'use_demo_server' action when registration fails."""
     mock_team = MagicMock()
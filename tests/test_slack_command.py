@@ -7,7 +7,9 @@ from flask import Flask
 sys.modules["raven"] = MagicMock()
 sys.modules["raven.contrib.flask"] = MagicMock()
 
-from slack_command import view
+from core import SlashpassError
+from router import tokenize
+from slack_command import MAX_SECRETS, MAX_TEXT, _arity, _batch, _is_slow, view
 
 
 @pytest.fixture
@@ -19,7 +21,20 @@ def client():
         yield client
 
 
-@patch("slack_command.db.session.query")
+def _command(client, text, **fields):
+    return client.post(
+        "/api/slack_command",
+        data={
+            "text": text,
+            "team_id": "T12345",
+            "team_domain": "testdomain",
+            "channel_id": "C12345",
+            **fields,
+        },
+    )
+
+
+@patch("team_cache.db.session.query")
 @patch("slack_command.valid_slack_request")
 def test_api_help(valid_slack_request_mock, query_mock, client):
     valid_slack_request_mock.return_value = True
@@ -28,15 +43,7 @@ def test_api_help(valid_slack_request_mock, query_mock, client):
     mock_team.team_id = "T12345"
     query_mock.return_value.filter_by.return_value.first.return_value = mock_team
 
-    response = client.post(
-        "/api/slack_command",
-        data={
-            "text": "help",
-            "team_id": "T12345",
-            "team_domain": "testdomain",
-            "channel_id": "C12345",
-        },
-    )
+    response = _command(client, "help")
 
     assert response.status_code == 200
     assert response.is_json
@@ -49,35 +56,19 @@ def test_api_help(valid_slack_request_mock, query_mock, client):
 def test_api_invalid_request(valid_slack_request_mock, client):
     valid_slack_request_mock.return_value = False
 
-    response = client.post(
-        "/api/slack_command",
-        data={
-            "text": "help",
-            "team_id": "T12345",
-            "team_domain": "testdomain",
-            "channel_id": "C12345",
-        },
-    )
+    response = _command(client, "help")
 
     assert response.status_code == 403
 
 
-@patch("slack_command.db.session.query")
+@patch("team_cache.db.session.query")
 @patch("slack_command.valid_slack_request")
 def test_api_no_team(valid_slack_request_mock, query_mock, client):
     valid_slack_request_mock.return_value = True
 
     query_mock.return_value.filter_by.return_value.first.return_value = None
 
-    response = client.post(
-        "/api/slack_command",
-        data={
-            "text": "help",
-            "team_id": "T12345",
-            "team_domain": "testdomain",
-            "channel_id": "C12345",
-        },
-    )
+    response = _command(client, "help")
 
     assert response.status_code == 200
     assert response.is_json
@@ -88,10 +79,10 @@ def test_api_no_team(valid_slack_request_mock, query_mock, client):
     )
 
 
-@patch("slack_command.db.session.query")
+@patch("team_cache.db.session.query")
 @patch("slack_command.valid_slack_request")
 @patch("slack_command.validators.url")
-@patch("slack_command.Team.register_server")
+@patch("server.Team.register_server")
 def test_api_configure_new_server(
     register_server_mock, url_mock, valid_slack_request_mock, query_mock, client
 ):
@@ -103,15 +94,7 @@ def test_api_configure_new_server(
     mock_team.url = None
     query_mock.return_value.filter_by.return_value.first.return_value = mock_team
 
-    response = client.post(
-        "/api/slack_command",
-        data={
-            "text": "configure https://example.com",
-            "team_id": "T12345",
-            "team_domain": "testdomain",
-            "channel_id": "C12345",
-        },
-    )
+    response = _command(client, "configure https://example.com")
 
     assert response.status_code == 200
     assert response.is_json
@@ -119,7 +102,7 @@ def test_api_configure_new_server(
     assert "successfully configured" in json_data["attachments"][0]["text"].lower()
 
 
-@patch("slack_command.db.session.query")
+@patch("team_cache.db.session.query")
 @patch("slack_command.valid_slack_request")
 @patch("slack_command.cmd.list")
 def test_api_list_passwords(
@@ -131,15 +114,7 @@ def test_api_list_passwords(
     mock_team = MagicMock()
     query_mock.return_value.filter_by.return_value.first.return_value = mock_team
 
-    response = client.post(
-        "/api/slack_command",
-        data={
-            "text": "list",
-            "team_id": "T12345",
-            "team_domain": "testdomain",
-            "channel_id": "C12345",
-        },
-    )
+    response = _command(client, "list")
 
     assert response.status_code == 200
     assert response.is_json
@@ -148,7 +123,7 @@ def test_api_list_passwords(
     assert "password2" in json_data["attachments"][0]["text"]
 
 
-@patch("slack_command.db.session.query")
+@patch("team_cache.db.session.query")
 @patch("slack_command.valid_slack_request")
 @patch("slack_command.cmd.generate_insert_token")
 def test_api_insert_secret(
@@ -160,15 +135,7 @@ def test_api_insert_secret(
     mock_team = MagicMock()
     query_mock.return_value.filter_by.return_value.first.return_value = mock_team
 
-    response = client.post(
-        "/api/slack_command",
-        data={
-            "text": "insert mysecret",
-            "team_id": "T12345",
-            "team_domain": "testdomain",
-            "channel_id": "C12345",
-        },
-    )
+    response = _command(client, "insert mysecret")
 
     assert response.status_code == 200
     assert response.is_json
@@ -179,7 +146,7 @@ def test_api_insert_secret(
     assert "mock-token" in json_data["attachments"][0]["actions"][0]["url"]
 
 
-@patch("slack_command.db.session.query")
+@patch("team_cache.db.session.query")
 @patch("slack_command.valid_slack_request")
 @patch("slack_command.cmd.remove")
 def test_api_remove_secret(
@@ -191,15 +158,7 @@ def test_api_remove_secret(
     mock_team = MagicMock()
     query_mock.return_value.filter_by.return_value.first.return_value = mock_team
 
-    response = client.post(
-        "/api/slack_command",
-        data={
-            "text": "remove mysecret",
-            "team_id": "T12345",
-            "team_domain": "testdomain",
-            "channel_id": "C12345",
-        },
-    )
+    response = _command(client, "remove mysecret")
 
     assert response.status_code == 200
     assert response.is_json
@@ -210,7 +169,7 @@ def test_api_remove_secret(
     )
 
 
-@patch("slack_command.db.session.query")
+@patch("team_cache.db.session.query")
 @patch("slack_command.valid_slack_request")
 @patch("slack_command.cmd.show")
 def test_api_show_secret(cmd_show_mock, valid_slack_request_mock, query_mock, client):
@@ -220,18 +179,148 @@ def test_api_show_secret(cmd_show_mock, valid_slack_request_mock, query_mock, cl
     mock_team = MagicMock()
     query_mock.return_value.filter_by.return_value.first.return_value = mock_team
 
-    response = client.post(
-        "/api/slack_command",
-        data={
-            "text": "show mysecret",
-            "team_id": "T12345",
-            "team_domain": "testdomain",
-            "channel_id": "C12345",
-        },
-    )
+    response = _command(client, "show mysecret")
 
     assert response.status_code == 200
     assert response.is_json
     json_data = response.get_json()
     assert "mock-secret-link" in json_data["attachments"][0]["actions"][0]["url"]
     assert "password for *mysecret*" in json_data["attachments"][0]["text"].lower()
+
+
+@patch("team_cache.db.session.query")
+@patch("slack_command.valid_slack_request")
+@patch("slack_command.cmd.generate_insert_token")
+def test_api_insert_usage(
+    generate_insert_token_mock, valid_slack_request_mock, query_mock, client
+):
+    valid_slack_request_mock.return_value = True
+    query_mock.return_value.filter_by.return_value.first.return_value = MagicMock()
+
+    response = _command(client, "insert")
+
+    assert response.status_code == 200
+    assert "/pass insert <secret>" in response.get_json()["attachments"][0]["text"]
+    generate_insert_token_mock.assert_not_called()
+
+
+@patch("team_cache.db.session.query")
+@patch("slack_command.valid_slack_request")
+@patch("slack_command.cmd.generate_insert_tokens")
+def test_api_insert_many(
+    generate_insert_tokens_mock, valid_slack_request_mock, query_mock, client
+):
+    valid_slack_request_mock.return_value = True
+    generate_insert_tokens_mock.return_value = ["TOKEN1", "TOKEN2"]
+    query_mock.return_value.filter_by.return_value.first.return_value = MagicMock()
+
+    attachments = _command(client, "insert db api").get_json()["attachments"]
+
+    assert len(attachments) == 1
+    assert generate_insert_tokens_mock.call_args[0][1:] == ("C12345", ["db", "api"])
+    assert [action["text"] for action in attachments[0]["actions"]] == ["db", "api"]
+    assert attachments[0]["actions"][1]["url"].endswith("/insert/TOKEN2")
+
+
+@patch("team_cache.db.session.query")
+@patch("slack_command.valid_slack_request")
+@patch("slack_command.cmd.show_many")
+def test_api_show_many_as_links(
+    show_many_mock, valid_slack_request_mock, query_mock, client
+):
+    valid_slack_request_mock.return_value = True
+    apps = [f"app{i}" for i in range(6)] + ["<missing>"]
+    show_many_mock.return_value = [f"https://x.co/{app}" for app in apps[:6]] + [None]
+    query_mock.return_value.filter_by.return_value.first.return_value = MagicMock()
+
+    attachment = _command(client, "show " + " ".join(apps)).get_json()["attachments"][0]
+
+    assert attachment["actions"] == []
+    assert "• <https://x.co/app5|app5>" in attachment["text"]
+    assert "*<missing>* is not in the password store." in attachment["text"]
+    assert attachment["color"] == "warning"
+
+
+@patch("team_cache.db.session.query")
+@patch("slack_command.valid_slack_request")
+@patch("slack_command.cmd.remove_many")
+def test_api_remove_many(
+    remove_many_mock, valid_slack_request_mock, query_mock, client
+):
+    valid_slack_request_mock.return_value = True
+    remove_many_mock.return_value = [True, False, SlashpassError("Timeout")]
+    query_mock.return_value.filter_by.return_value.first.return_value = MagicMock()
+
+    attachment = _command(client, "remove a b c").get_json()["attachments"][0]
+
+    assert "*a* were removed successfully" in attachment["text"]
+    assert "*b* not found" in attachment["text"]
+    assert "*c*: _Timeout_" in attachment["text"]
+    assert attachment["color"] == "warning"
+
+
+@patch("team_cache.db.session.query")
+@patch("slack_command.valid_slack_request")
+def test_api_too_many_secrets(valid_slack_request_mock, query_mock, client):
+    valid_slack_request_mock.return_value = True
+    query_mock.return_value.filter_by.return_value.first.return_value = MagicMock()
+
+    text = _command(client, "show " + " ".join("x" * 11)).get_json()["attachments"][0][
+        "text"
+    ]
+
+    assert text.startswith("Usage:")
+
+
+def test_batch_size_clamped():
+    assert _arity(10) == tuple(range(1, 11))
+    assert _arity(1000)[-1] == MAX_SECRETS
+    assert _arity(0) == (1,)
+
+
+def test_batch_text_truncated():
+    links = [(f"app{i}", f"https://x.co/{'x' * 200}/{i}") for i in range(MAX_SECRETS)]
+
+    attachment = _batch("Passwords", links, footer="").get_json()["attachments"][0]
+
+    lines = attachment["text"].split("\n")
+    assert len(attachment["text"]) <= MAX_TEXT
+    assert lines[0] == "Passwords"
+    assert lines[1] == f"• <{links[0][1]}|app0>"
+    assert lines[-1] == f"_{MAX_SECRETS + 1 - (len(lines) - 1)} more not shown_"
+    assert len(attachment["fallback"]) <= MAX_TEXT
+
+    long_line = _batch("x" * (MAX_TEXT + 1), [], footer="").get_json()["attachments"][0]
+    assert len(long_line["text"]) == MAX_TEXT
+
+
+def test_only_server_calls_are_slow():
+    team = MagicMock(url="https://example.com")
+
+    assert _is_slow(team, tokenize("list"))
+    assert _is_slow(team, tokenize("show db"))
+    assert _is_slow(team, tokenize("remove db"))
+    assert not _is_slow(team, tokenize("insert db"))
+    assert not _is_slow(team, tokenize("insert db api"))
+    assert not _is_slow(team, tokenize("help"))
+    # usage errors are answered inline
+    assert not _is_slow(team, tokenize("remove"))
+    assert not _is_slow(team, tokenize("list extra"))
+
+
+@patch("team_cache.db.session.query")
+@patch("slack_command.valid_slack_request", return_value=True)
+@patch("slack_command.cmd.generate_insert_token", return_value="TOKEN")
+@patch("slack_command.executor")
+def test_api_insert_not_deferred(
+    executor_mock, token_mock, valid_mock, query_mock, client
+):
+    executor_mock.enabled = True
+    query_mock.return_value.filter_by.return_value.first.return_value = MagicMock(
+        url="https://example.com"
+    )
+
+    response = _command(client, "insert db", response_url="https://hooks.slack.com/1")
+
+    assert "TOKEN" in response.get_data(as_text=True)
+    executor_mock.submit.assert_not_called()
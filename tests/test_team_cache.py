@@ -0,0 +1,99 @@
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask import Flask
+
+sys.modules["raven"] = MagicMock()
+sys.modules["raven.contrib.flask"] = MagicMock()
+
+from server import Team, db
+from team_cache import CHANNEL, TeamCache, TeamSnapshot, teams
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        for team_id in ["T1", "T2"]:
+            db.session.add(
+                Team(
+                    access_token="token",
+                    authed_user="U1",
+                    bot_user_id="B1",
+                    enterprise_id=None,
+                    enterprise_name=None,
+                    is_enterprise_install=False,
+                    scope="commands",
+                    team_id=team_id,
+                    team_name=f"Team {team_id}",
+                )
+            )
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def team_cache():
+    with patch.object(TeamCache, "_listen"):
+        yield TeamCache(ttl=60, size=16)
+
+
+def test_disabled_returns_model(app):
+    assert isinstance(TeamCache(ttl=0).get(team_id="T1"), Team)
+
+
+def test_snapshot_cached_by_team_id_and_pk(app, team_cache):
+    snapshot = team_cache.get(team_id="T1")
+
+    assert isinstance(snapshot, TeamSnapshot)
+    assert snapshot.team_name == "Team T1"
+    assert team_cache.get(id=snapshot.id) is snapshot
+    assert team_cache.get(team_id="T1") is snapshot
+    assert team_cache.stats()["hits"] == 2
+    assert team_cache.stats()["misses"] == 1
+
+
+def test_missing_team_not_cached(app, team_cache):
+    assert team_cache.get(team_id="T404") is None
+    assert team_cache.get(team_id="T404") is None
+    assert team_cache.stats()["misses"] == 2
+
+
+def test_expired_snapshot_reloaded(app, team_cache):
+    with patch("team_cache.time.monotonic", return_value=100):
+        first = team_cache.get(team_id="T1")
+    with patch("team_cache.time.monotonic", return_value=161):
+        assert team_cache.get(team_id="T1") is not first
+
+
+def test_least_recently_used_evicted(app, team_cache):
+    team_cache.size = 2
+
+    team_cache.get(team_id="T1")
+    team_cache.get(team_id="T2")
+
+    assert team_cache.stats()["size"] == 2
+    assert team_cache.stats()["evictions"] == 2
+
+
+def test_snapshot_api(app, team_cache):
+    db.session.query(Team).filter_by(team_id="T1").first().url = "https://x.co/p"
+    db.session.commit()
+
+    assert team_cache.get(team_id="T1").api("list/C1") == "https://x.co/p/list/C1"
+
+
+@patch("team_cache.cache")
+def test_commit_publishes_invalidation(cache_mock, app, team_cache):
+    team = db.session.query(Team).filter_by(team_id="T1").first()
+    with patch.object(teams, "ttl", 60), patch.object(teams, "invalidate") as inv:
+        team.url = "https://example.com"
+        db.session.commit()
+
+    inv.assert_called_once_with(team.id, "T1")
+    cache_mock.publish.assert_called_once_with(CHANNEL, f'[{team.id}, "T1"]')
@@ -0,0 +1,99 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from tokens import PREFIX, TTL, InsertToken, TokenStore, decode, encode
+
+
+@pytest.fixture
+def team():
+    team = MagicMock()
+    team.id = 42
+    team.api.return_value = "https://pass.example.com/insert"
+    return team
+
+
+def test_encode_roundtrip():
+    token = InsertToken("C1/ñandú", "42", "https://pass.example.com/insert")
+
+    assert decode(encode(token)) == token
+
+
+def test_decode_unknown_format():
+    assert decode(None) is None
+    assert decode(b"\x80\x04legacy pickle") is None
+    # truncated, garbage and trailing bytes
+    value = encode(InsertToken("C1/app", "1", "https://example.com/insert"))
+    assert decode(b"\x01\x00") is None
+    assert decode(b"\x01\x00\x02\xff\xfe") is None
+    assert decode(value[:-1]) is None
+    assert decode(value + b"x") is None
+    assert decode(value) is not None
+
+
+def test_create_single_set(team):
+    cache = MagicMock()
+    store = TokenStore(cache)
+
+    token = store.create(team, "C1", "app")
+
+    assert len(token) == 6 and token.isalnum()
+    key, value = cache.set.call_args[0]
+    assert key == PREFIX + token
+    assert cache.set.call_args[1] == {"ex": TTL, "nx": True}
+    assert decode(value) == InsertToken("C1/app", "42", team.api.return_value)
+
+
+def test_create_retries_on_collision(team):
+    cache = MagicMock()
+    cache.set.side_effect = [None, True]
+
+    TokenStore(cache).create(team, "C1", "app")
+
+    assert cache.set.call_count == 2
+
+
+def test_create_many_single_round_trip(team):
+    cache = MagicMock()
+    cache.set_many.return_value = [True, True, True]
+
+    tokens = TokenStore(cache).create_many(team, "C1", ["a", "b", "c"])
+
+    cache.set_many.assert_called_once()
+    items = cache.set_many.call_args[0][0]
+    assert [key for key, _ in items] == [PREFIX + token for token in tokens]
+    assert [decode(value).path for _, value in items] == ["C1/a", "C1/b", "C1/c"]
+    assert cache.set_many.call_args[1] == {"ex": TTL, "nx": True}
+
+
+def test_create_many_retries_collisions(team):
+    cache = MagicMock()
+    cache.set_many.side_effect = [[True, False, True], [True]]
+
+    tokens = TokenStore(cache).create_many(team, "C1", ["a", "b", "c"])
+
+    retried = cache.set_many.call_args_list[1][0][0]
+    assert [decode(value).path for _, value in retried] == ["C1/b"]
+    assert tokens[1] == retried[0][0][len(PREFIX) :]
+    assert None not in tokens
+
+
+def test_get_single_round_trip():
+    cache = MagicMock()
+    cache.get.return_value = encode(InsertToken("C1/app", 42, "https://x.co/insert"))
+    store = TokenStore(cache)
+
+    obj = store.get("ABC123")
+
+    cache.get.assert_called_once_with(PREFIX + "ABC123")
+    assert obj.editor_url("ABC123") == "https://x.co/insert/ABC123"
+    assert store.stats() == {"hits": 1, "misses": 0}
+
+
+def test_get_missing():
+    cache = MagicMock()
+    cache.get.return_value = None
+    store = TokenStore(cache)
+
+    assert store.get("ABC123") is None
+    assert store.stats() == {"hits": 0, "misses": 1}
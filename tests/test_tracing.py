@@ -0,0 +1,156 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import tracing
+from tracing import NOOP, Tracer, TracingMiddleware, annotate, span, traced
+
+
+def read(path):
+    with open(path) as traces:
+        return [json.loads(line) for line in traces]
+
+
+def test_noop_outside_of_a_trace():
+    assert span("decrypt") is NOOP
+    annotate(verb="list")  # ignored
+
+    with span("decrypt") as current:
+        current.set(blocks=3)
+
+
+def test_disabled_tracer_starts_nothing():
+    assert Tracer(path=None).start("POST /slack/command") is None
+
+
+def test_slow_trace_written(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path), sample=0, slow=0)
+
+    trace = tracer.start("POST /slack/command")
+    annotate(verb="list")
+    with span("cmd.list"):
+        with span("upstream.post", server="https://example.com") as current:
+            current.set(status=200)
+        with span("decrypt"):
+            pass
+    tracer.finish(trace)
+
+    (record,) = read(path)
+    assert record["name"] == "POST /slack/command"
+    assert record["attrs"] == {"verb": "list"}
+    names = [(s["name"], s["parent"]) for s in record["spans"]]
+    assert names == [("cmd.list", None), ("upstream.post", 0), ("decrypt", 0)]
+    assert record["spans"][1]["attrs"] == {
+        "server": "https://example.com",
+        "status": 200,
+    }
+    assert all(s["duration"] <= record["duration"] for s in record["spans"])
+    assert span("decrypt") is NOOP
+
+
+def test_fast_trace_dropped_unless_sampled(tmp_path):
+    path = tmp_path / "traces.jsonl"
+
+    tracer = Tracer(str(path), sample=0, slow=60)
+    tracer.finish(tracer.start("GET /"))
+    assert not path.exists()
+
+    tracer = Tracer(str(path), sample=1, slow=60)
+    tracer.finish(tracer.start("GET /"))
+    assert len(read(path)) == 1
+
+
+def test_error_recorded(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path), sample=1)
+
+    trace = tracer.start("POST /slack/command")
+    with pytest.raises(ValueError):
+        with span("decrypt"):
+            raise ValueError()
+    tracer.finish(trace)
+
+    assert read(path)[0]["spans"][0]["attrs"] == {"error": "ValueError"}
+
+
+def test_spans_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "MAX_SPANS", 2)
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path), sample=1)
+
+    trace = tracer.start("POST /slack/command")
+    for _ in range(5):
+        with span("decrypt.block"):
+            pass
+    tracer.finish(trace)
+
+    (record,) = read(path)
+    assert len(record["spans"]) == 2
+    assert record["dropped"] == 3
+
+
+def test_traced(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path), sample=1)
+
+    @traced("cmd.show")
+    def show():
+        return "link"
+
+    assert show() == "link"
+    trace = tracer.start("POST /slack/command")
+    assert show() == "link"
+    tracer.finish(trace)
+
+    assert [s["name"] for s in read(path)[0]["spans"]] == ["cmd.show"]
+
+
+def test_database_spans(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path), sample=1)
+    engine = create_engine("sqlite://")
+
+    trace = tracer.start("POST /slack/command")
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        with pytest.raises(Exception):
+            connection.execute(text("SELECT * FROM missing"))
+        connection.execute(text("SELECT 2"))
+    tracer.finish(trace)
+
+    spans = read(path)[0]["spans"]
+    assert [s["name"] for s in spans] == ["db.select"] * 3
+    assert [s["parent"] for s in spans] == [None] * 3
+    assert "error" in spans[1]["attrs"]
+
+
+def test_middleware(tmp_path):
+    path = tmp_path / "traces.jsonl"
+
+    def app(environ, start_response):
+        with span("handler"):
+            start_response("200 OK", [])
+        return [b"ok"]
+
+    middleware = TracingMiddleware(app, Tracer(str(path), sample=1))
+    body = middleware(
+        {"REQUEST_METHOD": "POST", "PATH_INFO": "/slack/command"},
+        lambda status, headers: None,
+    )
+
+    assert body == [b"ok"]
+    (record,) = read(path)
+    assert record["name"] == "POST /slack/command"
+    assert record["attrs"] == {"status": "200 OK"}
+    assert record["spans"][0]["name"] == "handler"
+
+
+def test_middleware_disabled():
+    def app(environ, start_response):
+        assert span("handler") is NOOP
+        return [b"ok"]
+
+    middleware = TracingMiddleware(app, Tracer(path=None))
+    assert middleware({}, None) == [b"ok"]
@@ -0,0 +1,75 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from traffic import EXAMPLE_URL, Recorder, form, read
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    return Recorder(path=str(tmp_path / "corpus.jsonl"), sample=1)
+
+
+def test_command_is_anonymized(recorder):
+    recorder.command("show", ["prod-db"], "T12345", "acme", "C12345")
+    recorder.command("show", ["prod-db"], "T12345", "acme", "C99999")
+
+    first, second = read(recorder.path)
+    assert first["verb"] == "show"
+    assert "prod-db" not in first["text"] and "T12345" not in first["team_id"]
+    # pseudonyms are stable
+    assert first["text"] == second["text"] and first["team_id"] == second["team_id"]
+    assert first["channel_id"] != second["channel_id"]
+
+
+def test_configure_url_is_replaced(recorder):
+    recorder.command("configure", ["https://vault.acme.com"], "T1", "acme", "C1")
+
+    (entry,) = read(recorder.path)
+    assert entry["text"] == f"configure {EXAMPLE_URL}"
+
+
+def test_action(recorder):
+    payload = {
+        "callback_id": "configure_password_server",
+        "team": {"id": "T12345", "domain": "acme"},
+        "user": {"id": "U1", "name": "alice"},
+        "response_url": "https://hooks.slack.com/actions/secret",
+        "actions": [{"name": "reconfigure_server", "value": "https://vault.acme.com"}],
+    }
+
+    recorder.action("reconfigure_server", payload)
+
+    (entry,) = read(recorder.path)
+    recorded = json.dumps(entry)
+    for private in ("T12345", "alice", "hooks.slack.com", "vault.acme.com"):
+        assert private not in recorded
+    assert json.loads(form(entry)["payload"])["actions"][0]["value"] == EXAMPLE_URL
+
+
+def test_sampling(recorder):
+    recorder.sample = 0.5
+    with patch("traffic.random.random", side_effect=[0.7, 0.2]):
+        recorder.command("list", [], "T1", "acme", "C1")
+        recorder.command("help", [], "T1", "acme", "C1")
+
+    assert [entry["verb"] for entry in read(recorder.path)] == ["help"]
+
+
+def test_disabled():
+    Recorder(path=None).command("list", [], "T1", "acme", "C1")
+
+
+def test_command_form():
+    entry = {
+        "kind": "command",
+        "verb": "list",
+        "text": "list",
+        "team_id": "T1",
+        "team_domain": "acme",
+        "channel_id": "C1",
+    }
+
+    assert form(entry)["text"] == "list"
+    assert form(entry)["channel_id"] == "C1"
@@ -0,0 +1,250 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from upstream import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    SessionPool,
+    UpstreamClient,
+    origin,
+)
+
+
+def test_origin():
+    assert origin("https://example.com:8443/api/list/C1") == "https://example.com:8443"
+
+
+def test_session_reused_per_origin():
+    pool = SessionPool()
+
+    first = pool.session("https://example.com/list/C1")
+    second = pool.session("https://example.com/onetime_link")
+    other = pool.session("https://other.example.com/list/C1")
+
+    assert first is second
+    assert first is not other
+    assert pool.stats() == {"hosts": 2, "hits": 1, "misses": 2, "evictions": 0}
+
+
+def test_least_recently_used_host_evicted():
+    pool = SessionPool(max_hosts=2)
+
+    first = pool.session("https://a.example.com/")
+    pool.session("https://b.example.com/")
+    pool.session("https://a.example.com/")
+    pool.session("https://c.example.com/")
+
+    assert pool.session("https://a.example.com/") is first
+    assert pool.stats()["evictions"] == 1
+    assert pool.stats()["hosts"] == 2
+
+
+def test_idle_sessions_evicted():
+    pool = SessionPool(idle_timeout=30)
+
+    with patch("upstream.time.monotonic", return_value=100):
+        first = pool.session("https://example.com/")
+    with patch("upstream.time.monotonic", return_value=131):
+        second = pool.session("https://example.com/")
+
+    assert first is not second
+    assert pool.stats()["evictions"] == 1
+
+
+@patch("requests.Session.post")
+def test_post(mock_post):
+    pool = SessionPool()
+
+    pool.post("https://example.com/remove", data={"app": "app"})
+
+    mock_post.assert_called_once_with("https://example.com/remove", data={"app": "app"})
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+
+    with patch("upstream.time.monotonic", return_value=100):
+        breaker.failure()
+    with patch("upstream.time.monotonic", return_value=131):
+        assert breaker.allow()
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow()
+
+    breaker.success()
+    assert breaker.state == CLOSED
+    assert breaker.transitions == {CLOSED: 1, OPEN: 1, HALF_OPEN: 1}
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0)
+    for _ in range(3):
+        breaker.failure()
+
+    assert breaker.allow()
+    breaker.failure()
+
+    assert breaker.state == OPEN
+
+
+@patch("requests.Session.post")
+def test_client_fails_fast_while_open(mock_post):
+    mock_post.side_effect = requests.exceptions.ConnectTimeout()
+    client = UpstreamClient(SessionPool(), failure_threshold=2, reset_timeout=30)
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            client.post("https://example.com/list/C1")
+    with pytest.raises(CircuitOpenError):
+        client.post("https://example.com/list/C1")
+
+    assert mock_post.call_count == 2
+    assert client.stats()["states"] == {CLOSED: 0, OPEN: 1, HALF_OPEN: 0}
+
+
+@patch("requests.Session.post")
+def test_client_server_errors_count_as_failures(mock_post):
+    mock_post.return_value.status_code = 502
+    client = UpstreamClient(SessionPool(), failure_threshold=1)
+
+    assert client.post("https://example.com/remove").status_code == 502
+    assert client.breaker("https://example.com/").state == OPEN
+
+
+@patch("requests.Session.post")
+def test_client_breaker_per_team(mock_post):
+    mock_post.return_value.status_code = 502
+    client = UpstreamClient(SessionPool(), failure_threshold=1)
+
+    client.post("https://demo.example.com/remove", team_id=1)
+
+    with pytest.raises(CircuitOpenError):
+        client.post("https://demo.example.com/remove", team_id=1)
+    mock_post.return_value.status_code = 200
+    assert client.post("https://demo.example.com/remove", team_id=2).status_code == 200
+    assert client.breaker("https://demo.example.com/").state == CLOSED
+
+
+@patch("requests.Session.post")
+def test_client_probe_outcome_always_recorded(mock_post):
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.iter_content.side_effect = ValueError("decode")
+    client = UpstreamClient(SessionPool(), failure_threshold=1, reset_timeout=30)
+    breaker = client.breaker("https://example.com/")
+
+    with patch("upstream.time.monotonic", return_value=100):
+        breaker.failure()
+    with patch("upstream.time.monotonic", return_value=131):
+        with pytest.raises(ValueError):
+            client.post("https://example.com/list/C1")
+    assert breaker.state == OPEN
+
+    mock_post.return_value.iter_content.side_effect = None
+    mock_post.return_value.iter_content.return_value = iter([b"ok"])
+    with patch("upstream.time.monotonic", return_value=162):
+        assert client.post("https://example.com/list/C1").status_code == 200
+    assert breaker.state == CLOSED
+
+
+@patch("requests.Session.get")
+def test_client_sets_deadline(mock_get):
+    mock_get.return_value.status_code = 200
+    client = UpstreamClient(SessionPool(), timeout=2.5, connect_timeout=1)
+
+    client.get("https://example.com/public_key")
+
+    # connect and read add up to the deadline
+    mock_get.assert_called_once_with(
+        "https://example.com/public_key", stream=True, timeout=(1, 1.5)
+    )
+
+
+@pytest.fixture
+def trickling_server():
+    """Answers every request with one byte every 0.1 seconds for 2 seconds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "20")
+            self.end_headers()
+            for _ in range(20):
+                try:
+                    self.wfile.write(b"x")
+                    self.wfile.flush()
+                except OSError:
+                    return
+                time.sleep(0.1)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_client_deadline_covers_the_body(trickling_server):
+    client = UpstreamClient(SessionPool(), timeout=0.5, connect_timeout=0.2)
+
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.post(f"{trickling_server}/list/C1")
+
+    assert time.monotonic() - start < 1
+    assert client.breaker(trickling_server).failures == 1
+
+
+def test_client_reads_the_body(trickling_server):
+    client = UpstreamClient(SessionPool(), timeout=5)
+
+    response = client.post(f"{trickling_server}/list/C1")
+
+    assert response.content == b"x" * 20
+    assert response.text == "x" * 20
+
+
+def test_client_deadline_covers_streams(trickling_server):
+    client = UpstreamClient(SessionPool(), timeout=0.5, connect_timeout=0.2)
+    blocks = []
+
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        with client.stream("post", f"{trickling_server}/list/C1") as body:
+            blocks.extend(body)
+
+    assert time.monotonic() - start < 1
+    assert 0 < len(b"".join(blocks)) < 20
+    assert client.breaker(trickling_server).failures == 1
+
+
+def test_client_stream_success_after_the_body(trickling_server):
+    client = UpstreamClient(SessionPool(), timeout=5, failure_threshold=1)
+    breaker = client.breaker(trickling_server)
+    breaker.failure()
+    breaker.reset_timeout = 0
+
+    with client.stream("post", f"{trickling_server}/list/C1") as body:
+        assert breaker.state == HALF_OPEN
+        assert b"".join(body) == b"x" * 20
+
+    assert breaker.state == CLOSED
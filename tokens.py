@@ -0,0 +1,115 @@
+import random
+import string
+import struct
+import threading
+from collections import namedtuple
+
+import metrics
+
+PREFIX = "slashpass:token:"
+TTL = 900  # editor links expire in 15 minutes
+VERSION = 1
+
+_LENGTH = struct.Struct(">H")
+
+
+class InsertToken(namedtuple("InsertToken", ["path", "team_id", "url"])):
+    __slots__ = ()
+
+    def editor_url(self, token):
+        return f"{self.url}/{token}"
+
+
+def encode(token):
+    """Version byte followed by every field as a length prefixed UTF-8
+    string."""
+    data = bytearray((VERSION,))
+    for field in token:
+        value = str(field).encode("utf-8")
+        data += _LENGTH.pack(len(value))
+        data += value
+    return bytes(data)
+
+
+def decode(data):
+    """InsertToken of an `encode`d value, None for anything else including
+    truncated or corrupted values."""
+    if not data or data[0] != VERSION:
+        return None
+    fields = []
+    offset = 1
+    try:
+        for _ in InsertToken._fields:
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            if offset + length > len(data):
+                return None
+            fields.append(data[offset : offset + length].decode("utf-8"))
+            offset += length
+    except (struct.error, UnicodeDecodeError):
+        return None
+    if offset != len(data):
+        return None
+    return InsertToken(*fields)
+
+
+def _token():
+    return "".join(
+        random.SystemRandom().choice(string.ascii_uppercase + string.digits)
+        for _ in range(6)
+    )
+
+
+class TokenStore(object):
+    """Insert tokens stored as a single compact value per key, creating and
+    resolving a token are one cache command each."""
+
+    def create(self, team, channel, app):
+        value = encode(InsertToken(f"{channel}/{app}", team.id, team.api("insert")))
+        while True:
+            token = _token()
+            if self.cache.set(PREFIX + token, value, ex=TTL, nx=True):
+                metrics.tokens.labels("created").inc()
+                return token
+
+    def create_many(self, team, channel, apps):
+        """Tokens for several secrets of a channel, written in one round trip
+        plus one more for every batch of colliding tokens."""
+        url = team.api("insert")
+        values = [encode(InsertToken(f"{channel}/{app}", team.id, url)) for app in apps]
+        tokens = [None] * len(apps)
+        pending = list(range(len(apps)))
+        while pending:
+            candidates = {i: _token() for i in pending}
+            stored = self.cache.set_many(
+                [(PREFIX + candidates[i], values[i]) for i in pending], ex=TTL, nx=True
+            )
+            for i, ok in zip(pending, stored):
+                if ok:
+                    tokens[i] = candidates[i]
+            pending = [i for i, ok in zip(pending, stored) if not ok]
+        metrics.tokens.labels("created").inc(len(tokens))
+        return tokens
+
+    def get(self, token):
+        obj = decode(self.cache.get(PREFIX + token))
+        with self._lock:
+            if obj is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.tokens.labels("miss" if obj is None else "hit").inc()
+        return obj
+
+    def delete(self, token):
+        self.cache.delete(PREFIX + token)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
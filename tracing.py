@@ -0,0 +1,225 @@
+"""Timing breakdown of single requests.
+
+With TRACE_FILE set every request collects its spans (signature check,
+team lookup, database and Redis commands, password server calls, RSA
+decryption and formatting) and is appended as one JSON line when it is
+slower than TRACE_SLOW seconds or picked by TRACE_SAMPLE:
+
+    {"trace": "9f2c...", "name": "POST /slack/command", "start": 1718000000.1,
+     "duration": 1.32, "attrs": {"verb": "list", "status": "200 OK"},
+     "spans": [{"name": "team.lookup", "parent": null, "start": 0.0021,
+                "duration": 0.004, "attrs": {}}, ...]}
+
+`start` of a span is the offset from the start of the request and
+`parent` the index of the enclosing span. Without TRACE_FILE `span()` does
+a single context variable lookup and returns a shared no-op.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import random
+import secrets
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from environ import TRACE_FILE, TRACE_SAMPLE, TRACE_SLOW
+
+MAX_SPANS = 512  # a listing decrypts one block per span
+
+_current = contextvars.ContextVar("slashpass_trace", default=None)
+
+
+class _Noop(object):
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NOOP = _Noop()
+
+
+class Span(object):
+    def set(self, **attrs):
+        self.record["attrs"].update(attrs)
+
+    def __enter__(self):
+        trace = self.trace
+        self.start = time.perf_counter()
+        self.record["parent"] = trace.stack[-1] if trace.stack else None
+        self.record["start"] = self.start - trace.start
+        trace.stack.append(len(trace.spans))
+        trace.spans.append(self.record)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.record["duration"] = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.record["attrs"]["error"] = exc_type.__name__
+        self.trace.stack.pop()
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.record = {"name": name, "attrs": attrs, "duration": None}
+
+
+class Trace(object):
+    def span(self, name, attrs):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return NOOP
+        return Span(self, name, attrs)
+
+    def record(self, duration):
+        record = {
+            "trace": self.id,
+            "name": self.name,
+            "start": self.started,
+            "duration": duration,
+            "attrs": self.attrs,
+            "spans": self.spans,
+        }
+        if self.dropped:
+            record["dropped"] = self.dropped
+        return record
+
+    def __init__(self, name, sampled):
+        self.id = secrets.token_hex(8)
+        self.name = name
+        self.sampled = sampled
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.attrs = {}
+        self.spans = []
+        self.stack = []
+        self.dropped = 0
+
+
+class Tracer(object):
+    """Writes the traces of the requests slower than `slow` seconds plus a
+    `sample` fraction of all of them to a JSONL file at `path`."""
+
+    def start(self, name):
+        """Trace made current until `finish`, None when disabled."""
+        if self.path is None:
+            return None
+        trace = Trace(name, random.random() < self.sample)
+        trace.token = _current.set(trace)
+        return trace
+
+    def finish(self, trace):
+        _current.reset(trace.token)
+        duration = time.perf_counter() - trace.start
+        if trace.sampled or duration >= self.slow:
+            self._write(trace.record(duration))
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            # appends of one line are atomic between the gunicorn workers
+            if self._pid != os.getpid():
+                self._file = open(self.path, "a", buffering=1)
+                self._pid = os.getpid()
+            self._file.write(line)
+
+    def __init__(self, path=TRACE_FILE, sample=TRACE_SAMPLE, slow=TRACE_SLOW):
+        self.path = path
+        self.sample = sample
+        self.slow = slow
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+
+class TracingMiddleware(object):
+    """Traces every request of the wrapped WSGI application, named by the
+    method and path and tagged with the response status."""
+
+    def __call__(self, environ, start_response):
+        method = environ.get("REQUEST_METHOD", "GET")
+        trace = self.tracer.start(f"{method} {environ.get('PATH_INFO', '/')}")
+        if trace is None:
+            return self.app(environ, start_response)
+
+        def traced_start_response(status, headers, *args):
+            trace.attrs["status"] = status
+            return start_response(status, headers, *args)
+
+        try:
+            return self.app(environ, traced_start_response)
+        finally:
+            self.tracer.finish(trace)
+
+    def __init__(self, app, tracer):
+        self.app = app
+        self.tracer = tracer
+
+
+def span(name, **attrs):
+    """Span of the current request, a no-op outside of a traced one."""
+    trace = _current.get()
+    if trace is None:
+        return NOOP
+    return trace.span(name, attrs)
+
+
+def annotate(**attrs):
+    """Adds attributes to the current request's trace."""
+    trace = _current.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def traced(name):
+    """Decorator running every call of the function in a span."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return fn(*args, **kwargs)
+            with trace.span(name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+tracer = Tracer()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    trace = _current.get()
+    if trace is None:
+        return
+    verb = statement.split(None, 1)[0].lower() if statement.strip() else "unknown"
+    current = trace.span(f"db.{verb}", {})
+    current.__enter__()
+    conn.info.setdefault("slashpass_spans", []).append(current)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    spans = conn.info.get("slashpass_spans")
+    if spans:
+        spans.pop().__exit__(None, None, None)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    connection = context.connection
+    spans = connection.info.get("slashpass_spans") if connection is not None else None
+    if spans:
+        spans.pop().__exit__(type(context.original_exception), None, None)
@@ -0,0 +1,115 @@
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import threading
+
+from environ import SIGNING_SECRET, TRAFFIC_RECORD_FILE, TRAFFIC_RECORD_SAMPLE
+
+EXAMPLE_URL = "https://password-server.example.com"
+
+
+def read(path):
+    """Entries of a JSONL corpus, one slash command or action per line:
+
+    {"kind": "command", "verb": "show", "text": "show secret-1a2b",
+     "team_id": "T1", "team_domain": "acme", "channel_id": "C1"}
+    {"kind": "action", "verb": "use_demo_server", "payload": {...}}
+    """
+    with open(path) as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def form(entry):
+    """Form fields of the request Slack sends for a corpus entry."""
+    if entry["kind"] == "action":
+        return {"payload": json.dumps(entry["payload"])}
+    return {
+        "command": "/pass",
+        "text": entry["text"],
+        "team_id": entry["team_id"],
+        "team_domain": entry["team_domain"],
+        "channel_id": entry["channel_id"],
+    }
+
+
+class Recorder(object):
+    """Appends anonymized slash commands and actions to a JSONL corpus.
+    Identifiers and secret names are replaced by keyed hashes, so the same
+    team, channel or secret keeps the same pseudonym in every process while
+    the real names can not be recovered; URLs are replaced by EXAMPLE_URL."""
+
+    def command(self, verb, args, team_id, team_domain, channel):
+        if not self._sampled():
+            return
+        args = [
+            EXAMPLE_URL if verb == "configure" else self._pseudonym("secret", arg)
+            for arg in args
+        ]
+        self._write(
+            {
+                "kind": "command",
+                "verb": verb,
+                "text": " ".join([verb] + args),
+                "team_id": self._pseudonym("T", team_id),
+                "team_domain": self._pseudonym("team", team_domain),
+                "channel_id": self._pseudonym("C", channel),
+            }
+        )
+
+    def action(self, verb, payload):
+        if not self._sampled():
+            return
+        actions = [
+            {
+                "name": option.get("name"),
+                "type": option.get("type"),
+                # the only free text value is the url of reconfigure_server
+                "value": (
+                    EXAMPLE_URL if verb == "reconfigure_server" else option["value"]
+                ),
+            }
+            for option in payload["actions"]
+        ]
+        self._write(
+            {
+                "kind": "action",
+                "verb": verb,
+                "payload": {
+                    "callback_id": payload.get("callback_id"),
+                    "team": {"id": self._pseudonym("T", payload["team"]["id"])},
+                    "actions": actions,
+                },
+            }
+        )
+
+    def _pseudonym(self, prefix, value):
+        digest = hmac.new(self.key, value.encode(), hashlib.sha256).hexdigest()
+        return f"{prefix}-{digest[:10]}"
+
+    def _sampled(self):
+        return self.path is not None and random.random() < self.sample
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            # a file per process would need merging, appends of one line are
+            # atomic between the gunicorn workers
+            if self._pid != os.getpid():
+                self._file = open(self.path, "a", buffering=1)
+                self._pid = os.getpid()
+            self._file.write(line)
+
+    def __init__(self, path=TRAFFIC_RECORD_FILE, sample=TRAFFIC_RECORD_SAMPLE):
+        self.path = path
+        self.sample = sample
+        secret = (SIGNING_SECRET or secrets.token_hex(32)).encode()
+        self.key = hmac.new(secret, b"slashpass traffic", hashlib.sha256).digest()
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+
+recorder = Recorder()
@@ -0,0 +1,306 @@
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+import metrics
+import tracing
+from environ import (
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_FAILURE_THRESHOLD,
+    UPSTREAM_IDLE_TIMEOUT,
+    UPSTREAM_MAX_HOSTS,
+    UPSTREAM_POOL_SIZE,
+    UPSTREAM_RESET_TIMEOUT,
+    UPSTREAM_TIMEOUT,
+)
+
+CHUNK_SIZE = 8192
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    pass
+
+
+def origin(url):
+    parts = urlparse(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _read(response, deadline):
+    """Loads the body of a streamed response within `deadline`."""
+    # what `response.content` would have stored
+    response._content = b"".join(_blocks(response, deadline))
+    response._content_consumed = True
+
+
+def _blocks(response, deadline):
+    """Body of a streamed response as it arrives. The read timeout restarts
+    on every socket read, so a server trickling bytes is only stopped by
+    checking the deadline before each read."""
+    raw = response.raw
+    if isinstance(raw, urllib3.response.BaseHTTPResponse) and hasattr(raw, "read1"):
+        yield from _read_available(raw, deadline)
+        return
+    # urllib3 < 2.3 (or another transport) blocks until a whole chunk
+    for chunk in response.iter_content(CHUNK_SIZE):
+        if time.monotonic() > deadline:
+            response.close()
+            raise requests.exceptions.ReadTimeout("Deadline exceeded")
+        yield chunk
+
+
+def _read_available(raw, deadline):
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raw.close()
+                raise requests.exceptions.ReadTimeout("Deadline exceeded")
+            sock = getattr(getattr(raw, "connection", None), "sock", None)
+            if sock is not None:
+                sock.settimeout(remaining)
+            chunk = raw.read1(CHUNK_SIZE, decode_content=True)
+            if not chunk:
+                break
+            yield chunk
+    except urllib3.exceptions.ReadTimeoutError as e:
+        raise requests.exceptions.ReadTimeout(e) from e
+    except urllib3.exceptions.HTTPError as e:
+        raise requests.exceptions.ConnectionError(e) from e
+    raw.release_conn()
+
+
+class SessionPool(object):
+    """Keep-alive `requests.Session` per password server origin, sessions
+    idle for longer than `idle_timeout` seconds are closed and the least
+    recently used one is dropped once `max_hosts` is reached."""
+
+    def session(self, url):
+        key = origin(url)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            session, _ = self._sessions.pop(key, (None, None))
+            if session is None:
+                self.misses += 1
+                session = self._new_session()
+            else:
+                self.hits += 1
+            self._sessions[key] = (session, now)
+
+            while len(self._sessions) > self.max_hosts:
+                _, (evicted, _) = self._sessions.popitem(last=False)
+                evicted.close()
+                self.evictions += 1
+        return session
+
+    def get(self, url, **kwargs):
+        return self.session(url).get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session(url).post(url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hosts": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def _evict_idle(self, now):
+        while self._sessions:
+            key, (session, last_used) = next(iter(self._sessions.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._sessions[key]
+            session.close()
+            self.evictions += 1
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def __init__(
+        self,
+        pool_size=UPSTREAM_POOL_SIZE,
+        idle_timeout=UPSTREAM_IDLE_TIMEOUT,
+        max_hosts=UPSTREAM_MAX_HOSTS,
+    ):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.max_hosts = max_hosts
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+
+class CircuitBreaker(object):
+    """Opens after `failure_threshold` consecutive failures, after
+    `reset_timeout` seconds a single probe request is let through
+    (half-open) and its outcome closes or re-opens the circuit."""
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._transition(HALF_OPEN)
+                self._probing = False
+
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        self.transitions[state] += 1
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.transitions = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        self._probing = False
+        self._lock = threading.Lock()
+
+
+class UpstreamClient(object):
+    """Password server calls bounded by `timeout` seconds (to fit in the
+    3 seconds Slack waits for a slash command) and guarded by a circuit
+    breaker per team, or per server origin for calls made for no team.
+
+    The connect and read timeouts add up to `timeout` and the body is read
+    against the same deadline, a server trickling bytes can not hold a call
+    longer. A call only counts for the breaker once its body is read."""
+
+    def request(self, method, url, team_id=None, **kwargs):
+        deadline = time.monotonic() + self.timeout
+        with self._call(method, url, team_id, kwargs) as response:
+            _read(response, deadline)
+        return response
+
+    @contextlib.contextmanager
+    def stream(self, method, url, team_id=None, **kwargs):
+        """Iterator of the body blocks as they arrive, to be consumed inside
+        the `with` block."""
+        deadline = time.monotonic() + self.timeout
+        with self._call(method, url, team_id, kwargs) as response, response:
+            yield _blocks(response, deadline)
+
+    @contextlib.contextmanager
+    def _call(self, method, url, team_id, kwargs):
+        breaker = self.breaker(url, team_id)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {origin(url)}")
+
+        connect_timeout = min(self.connect_timeout, self.timeout / 2)
+        kwargs.setdefault("timeout", (connect_timeout, self.timeout - connect_timeout))
+        start = time.perf_counter()
+        status = "error"
+        failed = True
+        try:
+            with tracing.span(f"upstream.{method}", server=origin(url)) as span:
+                send = getattr(self.sessions.session(url), method)
+                response = send(url, stream=True, **kwargs)
+                span.set(status=response.status_code)
+                yield response
+            status = response.status_code
+            failed = status >= 500
+        finally:
+            # every outcome is recorded, a half-open breaker waits for its probe
+            self._observe(url, status, start)
+            if failed:
+                breaker.failure()
+            else:
+                breaker.success()
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("post", url, **kwargs)
+
+    def breaker(self, url, team_id=None):
+        key = origin(url) if team_id is None else team_id
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+            return self._breakers[key]
+
+    def _observe(self, url, status, start):
+        elapsed = time.perf_counter() - start
+        metrics.upstream.labels(origin(url), status).observe(elapsed)
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        states = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        transitions = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        for breaker in breakers:
+            states[breaker.state] += 1
+            for state, count in breaker.transitions.items():
+                transitions[state] += count
+        return {"states": states, "transitions": transitions}
+
+    def __init__(
+        self,
+        sessions,
+        timeout=UPSTREAM_TIMEOUT,
+        connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+        failure_threshold=UPSTREAM_FAILURE_THRESHOLD,
+        reset_timeout=UPSTREAM_RESET_TIMEOUT,
+    ):
+        self.sessions = sessions
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+
+sessions = SessionPool()
+client = UpstreamClient(sessions)
@@ -1,15 +1,19 @@
-import hmac
-import hashlib
-import time
-import urllib
-
-from flask import jsonify
-
 from environ import SIGNING_SECRET
+from responses import Field, Template
+from signature import VERIFIED, verify
+
+_COLORED_MSG = Template(
+    {
+        "attachments": [
+            {"fallback": Field("msg"), "text": Field("msg"), "color": Field("color")}
+        ]
+    }
+)
+_MSG = Template({"attachments": [{"fallback": Field("msg"), "text": Field("msg")}]})
 
 
 def _slack_msg(msg, color):
-    return jsonify({"attachments": [{"fallback": msg, "text": msg, "color": color}]})
+    return _COLORED_MSG.render(msg=msg, color=color)
 
 
 def warning(msg):
@@ -25,30 +29,17 @@ def error(msg):
 
 
 def info(msg):
-    return jsonify({"attachments": [{"fallback": msg, "text": msg}]})
+    return _MSG.render(msg=msg)
 
 
 def valid_slack_request(request):
-    slack_signing_secret = SIGNING_SECRET
-    timestamp = request.headers["X-Slack-Request-Timestamp"]
-
-    request_body = urllib.parse.urlencode(dict(request.form))
-
-    sig_basestring = f"v0:{timestamp}:{request_body}"
-
-    if abs(time.time() - float(timestamp)) > 60:
-        # The request timestamp is more than one minutes from local time.
-        # It could be a replay attack, so let's ignore it.
-        return False
-
-    signature = (
-        "v0="
-        + hmac.new(
-            bytes(slack_signing_secret, "UTF-8"),
-            bytes(sig_basestring, "UTF-8"),
-            hashlib.sha256,
-        ).hexdigest()
+    if request.environ.get(VERIFIED):
+        # already checked by signature.SlackSignatureMiddleware
+        return True
+
+    return verify(
+        SIGNING_SECRET,
+        request.headers.get("X-Slack-Request-Timestamp"),
+        request.get_data(cache=True),
+        request.headers.get("X-Slack-Signature"),
     )
-
-    slack_signature = request.headers["X-Slack-Signature"]
-    return signature == slack_signature
@@ -1,9 +1,7 @@
-import pickle
-
 from flask import Blueprint, abort, render_template
 
 from environ import HOMEPAGE
-from server import Team, cache, db
+from server import tokens
 
 root_view = Blueprint("root", __name__)
 insert_view = Blueprint("insert_view", __name__)
@@ -17,9 +15,7 @@ def root():
 @insert_view.route("/<token>", methods=["GET"])
 def insert(token):
     token = str(token)
-    if token not in cache:
+    obj = tokens.get(token)
+    if obj is None:
         abort(404)
-    obj = pickle.loads(cache[token])
-    team_id = obj["team_id"]
-    team = db.session.query(Team).filter_by(id=team_id).first()
-    return render_template("redirect.html", redirect_url=f"{team.url}/insert/{token}")
+    return render_template("redirect.html", redirect_url=obj.editor_url(token))
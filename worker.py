@@ -0,0 +1,34 @@
+import signal
+import threading
+
+from deferred import FAILURE_BODY, executor, post_response
+from environ import WORKER_THREADS
+from jobs import JobQueue, Worker
+from routes import server
+
+
+def main():
+    if not isinstance(executor, JobQueue):
+        raise SystemExit("The worker requires DEFERRED_BACKEND=redis")
+
+    workers = [
+        Worker(server, executor, post_response, FAILURE_BODY)
+        for _ in range(WORKER_THREADS)
+    ]
+
+    def stop(signum, frame):
+        for worker in workers:
+            worker.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    threads = [threading.Thread(target=worker.run) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()